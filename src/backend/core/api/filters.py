@@ -41,14 +41,15 @@ class AccentInsensitiveCharFilter(django_filters.CharFilter):
 
 class DocumentFilter(django_filters.FilterSet):
     """
-    Custom filter for filtering documents on title (accent and case insensitive).
+    Custom filter for filtering documents on title (accent and case insensitive),
+    served by the trigram index on the unaccented titles.
     """
 
     title = AccentInsensitiveCharFilter(
-        field_name="title", lookup_expr="unaccent__icontains", label=_("Title")
+        field_name="title", lookup_expr="unaccent_icontains", label=_("Title")
     )
     q = AccentInsensitiveCharFilter(
-        field_name="title", lookup_expr="unaccent__icontains", label=_("Search")
+        field_name="title", lookup_expr="unaccent_icontains", label=_("Search")
     )
 
     class Meta:
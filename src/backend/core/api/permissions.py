@@ -11,8 +11,12 @@ from core.models import DocumentAccess, RoleChoices, get_trashbin_cutoff
 
 ACTION_FOR_METHOD_TO_PERMISSION = {
     "versions_detail": {"DELETE": "versions_destroy", "GET": "versions_retrieve"},
+    "versions_content": {"GET": "versions_retrieve"},
     "children": {"GET": "children_list", "POST": "children_create"},
     "content": {"PATCH": "content_patch", "GET": "content_retrieve"},
+    "attachment_upload_multipart": {"POST": "attachment_upload"},
+    "attachment_upload_complete": {"POST": "attachment_upload"},
+    "media_check_batch": {"POST": "media_check"},
 }
 
 
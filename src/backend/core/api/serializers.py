@@ -307,6 +307,13 @@ class SearchDocumentSerializer(ListDocumentSerializer):
         fields = ListDocumentSerializer.Meta.fields + ["parent"]
         read_only_fields = ListDocumentSerializer.Meta.read_only_fields + ["parent"]
 
+    def to_representation(self, instance):
+        """Add the snippet highlighting the words found, if the indexer computed one."""
+        data = super().to_representation(instance)
+        if highlight := getattr(instance, "highlight", None):
+            data["highlight"] = highlight
+        return data
+
 
 class DocumentContentSerializer(serializers.Serializer):
     """Serializer for updating only the raw content of a document stored in S3."""
@@ -638,6 +645,53 @@ class DocumentDuplicationSerializer(serializers.Serializer):
         raise NotImplementedError("This serializer does not support updating.")
 
 
+def get_attachment_file_type(file_name, head):
+    """
+    Determine the type of an attachment from its name and its first bytes.
+
+    Returns a dict with the extension under which the file should be stored, its
+    MIME type as detected by magic and whether it should be considered unsafe.
+    """
+    extension = file_name.rpartition(".")[-1] if "." in file_name else None
+
+    # Use the first few bytes to determine the MIME type accurately
+    mime = magic.Magic(mime=True)
+    magic_mime_type = mime.from_buffer(head)
+    is_unsafe = False
+    if settings.DOCUMENT_ATTACHMENT_CHECK_UNSAFE_MIME_TYPES_ENABLED:
+        is_unsafe = magic_mime_type in settings.DOCUMENT_UNSAFE_MIME_TYPES
+
+        extension_mime_type, _ = mimetypes.guess_type(file_name)
+
+        # Try guessing a coherent extension from the mimetype
+        if extension_mime_type != magic_mime_type:
+            is_unsafe = True
+
+    guessed_ext = mimetypes.guess_extension(magic_mime_type)
+    # Missing extensions or extensions longer than 5 characters (it's as long as an extension
+    # can be) are replaced by the extension we eventually guessed from mimetype.
+    if (extension is None or len(extension) > 5) and guessed_ext:
+        extension = guessed_ext[1:]
+
+    if extension is None:
+        raise serializers.ValidationError("Could not determine file extension.")
+
+    return {
+        "expected_extension": extension,
+        "is_unsafe": is_unsafe,
+        "content_type": magic_mime_type,
+    }
+
+
+def validate_attachment_size(size):
+    """Check the size of an attachment against the maximum size allowed."""
+    if size > settings.DOCUMENT_IMAGE_MAX_SIZE:
+        max_size = settings.DOCUMENT_IMAGE_MAX_SIZE // (1024 * 1024)
+        raise serializers.ValidationError(
+            f"File size exceeds the maximum limit of {max_size:d} MB."
+        )
+
+
 # Suppress the warning about not implementing `create` and `update` methods
 # since we don't use a model and only rely on the serializer for validation
 # pylint: disable=abstract-method
@@ -648,42 +702,12 @@ class FileUploadSerializer(serializers.Serializer):
 
     def validate_file(self, file):
         """Add file size and type constraints as defined in settings."""
-        # Validate file size
-        if file.size > settings.DOCUMENT_IMAGE_MAX_SIZE:
-            max_size = settings.DOCUMENT_IMAGE_MAX_SIZE // (1024 * 1024)
-            raise serializers.ValidationError(
-                f"File size exceeds the maximum limit of {max_size:d} MB."
-            )
-
-        extension = file.name.rpartition(".")[-1] if "." in file.name else None
+        validate_attachment_size(file.size)
 
-        # Read the first few bytes to determine the MIME type accurately
-        mime = magic.Magic(mime=True)
-        magic_mime_type = mime.from_buffer(file.read(1024))
+        file_type = get_attachment_file_type(file.name, file.read(1024))
         file.seek(0)  # Reset file pointer to the beginning after reading
-        self.context["is_unsafe"] = False
-        if settings.DOCUMENT_ATTACHMENT_CHECK_UNSAFE_MIME_TYPES_ENABLED:
-            self.context["is_unsafe"] = (
-                magic_mime_type in settings.DOCUMENT_UNSAFE_MIME_TYPES
-            )
 
-            extension_mime_type, _ = mimetypes.guess_type(file.name)
-
-            # Try guessing a coherent extension from the mimetype
-            if extension_mime_type != magic_mime_type:
-                self.context["is_unsafe"] = True
-
-        guessed_ext = mimetypes.guess_extension(magic_mime_type)
-        # Missing extensions or extensions longer than 5 characters (it's as long as an extension
-        # can be) are replaced by the extension we eventually guessed from mimetype.
-        if (extension is None or len(extension) > 5) and guessed_ext:
-            extension = guessed_ext[1:]
-
-        if extension is None:
-            raise serializers.ValidationError("Could not determine file extension.")
-
-        self.context["expected_extension"] = extension
-        self.context["content_type"] = magic_mime_type
+        self.context.update(file_type)
         self.context["file_name"] = file.name
 
         return file
@@ -697,6 +721,72 @@ class FileUploadSerializer(serializers.Serializer):
         return attrs
 
 
+class AttachmentUploadInitSerializer(serializers.Serializer):
+    """Receive requests to upload a file directly to the object storage."""
+
+    file_name = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(min_value=1)
+
+    def validate_size(self, size):
+        """The size declared by the client is checked again once uploaded."""
+        validate_attachment_size(size)
+        return size
+
+    def validate(self, attrs):
+        """
+        Guess the type of the file from its name. It is verified on the uploaded
+        content when the upload is completed.
+        """
+        file_name = attrs["file_name"]
+        content_type = mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+
+        extension = file_name.rpartition(".")[-1] if "." in file_name else None
+        guessed_ext = mimetypes.guess_extension(content_type)
+        if (extension is None or len(extension) > 5) and guessed_ext:
+            extension = guessed_ext[1:]
+
+        if extension is None:
+            raise serializers.ValidationError(
+                {"file_name": "Could not determine file extension."}
+            )
+
+        attrs["expected_extension"] = extension
+        attrs["content_type"] = content_type
+        return attrs
+
+
+class AttachmentUploadPartSerializer(serializers.Serializer):
+    """A part uploaded by the client during a multipart upload."""
+
+    part_number = serializers.IntegerField(min_value=1, max_value=10000)
+    etag = serializers.CharField(max_length=255)
+
+
+class AttachmentUploadCompleteSerializer(serializers.Serializer):
+    """Receive requests to complete a direct upload to the object storage."""
+
+    upload_id = serializers.CharField(max_length=1024)
+    parts = AttachmentUploadPartSerializer(many=True, allow_empty=False)
+
+
+class MediaCheckBatchSerializer(serializers.Serializer):
+    """Receive requests to check the status of several attachments at once."""
+
+    keys = serializers.ListField(
+        child=serializers.CharField(max_length=1024),
+        allow_empty=False,
+    )
+
+    def validate_keys(self, value):
+        """Limit the number of attachments checked in a single request."""
+        max_keys = settings.MEDIA_CHECK_BATCH_MAX_KEYS
+        if len(value) > max_keys:
+            raise serializers.ValidationError(
+                f"Ensure this field has no more than {max_keys:d} elements."
+            )
+        return value
+
+
 class InvitationSerializer(serializers.ModelSerializer):
     """Serialize invitations."""
 
@@ -1007,6 +1097,12 @@ class ThreadSerializer(serializers.ModelSerializer):
         return {}
 
 
+class TypeaheadQueryParamSerializer(serializers.Serializer):
+    """Serializer for typeahead requests of the search box"""
+
+    q = serializers.CharField(required=True, allow_blank=True, trim_whitespace=True)
+
+
 class SearchQueryParamDocumentSerializer(serializers.Serializer):
     """Serializer for fulltext search requests through Find application"""
 
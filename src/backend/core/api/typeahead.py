@@ -0,0 +1,220 @@
+"""Typeahead of the titles of the documents readable by a user.
+
+Each keystroke in the search box is answered from a list of candidates cached per
+user: the titles of the documents of the subtrees the user has access to or
+visited, like the search in database. The list is built once, then refreshed
+incrementally with the documents of these subtrees updated since the last refresh,
+at most every TYPEAHEAD_REFRESH_INTERVAL seconds, or built again if these subtrees
+changed. It is invalidated when the accesses or the link traces of the user change,
+or when a document of these subtrees is moved or its link reach changes, and
+expires after TYPEAHEAD_CACHE_TIMEOUT seconds otherwise, e.g. for team accesses.
+
+Queries building or refreshing the list must complete within
+TYPEAHEAD_QUERY_TIMEOUT milliseconds: past it, the list cached is served as is.
+"""
+
+import heapq
+import logging
+import re
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core import models
+from core.api.filters import remove_accents
+from core.api.utils import filter_root_paths
+
+logger = logging.getLogger(__name__)
+
+# Documents updated by transactions committed after a refresh may have an update
+# time earlier than it, so refreshes look back this far
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+
+def normalize(title):
+    """Return a title without accents nor case, as compared to the queries."""
+    return remove_accents(title or "").casefold()
+
+
+@contextmanager
+def statement_timeout(milliseconds):
+    """
+    Cancel the queries run in the block after a timeout, raising an
+    OperationalError. The timeout in force before is restored after the block.
+    """
+    nested = connection.in_atomic_block
+    with transaction.atomic(), connection.cursor() as cursor:
+        if nested:
+            cursor.execute("SELECT current_setting('statement_timeout')")
+            previous = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT set_config('statement_timeout', %s, true)", [f"{milliseconds:d}"]
+        )
+        yield
+        if nested:
+            cursor.execute(
+                "SELECT set_config('statement_timeout', %s, true)", [previous]
+            )
+
+
+def _get_root_paths(user):
+    """Paths of the highest documents the user has access to or visited."""
+    access_documents_ids = models.DocumentAccess.objects.filter(
+        Q(user=user) | Q(team__in=user.teams)
+    ).values("document_id")
+    traced_documents_ids = models.LinkTrace.objects.filter(user=user).values(
+        "document_id"
+    )
+    paths = (
+        models.Document.objects.filter(ancestors_deleted_at__isnull=True)
+        .filter(
+            Q(id__in=access_documents_ids)
+            | (
+                Q(id__in=traced_documents_ids)
+                & ~Q(link_reach=models.LinkReachChoices.RESTRICTED)
+            )
+        )
+        .order_by("path")
+        .values_list("path", flat=True)
+    )
+    return filter_root_paths(list(paths), skip_sorting=True)
+
+
+def _get_subtrees(root_paths):
+    """Documents of the subtrees of the given root paths."""
+    path_list = Q()
+    for root_path in root_paths:
+        path_list |= Q(path__startswith=root_path)
+    return models.Document.objects.filter(path_list)
+
+
+def _build_candidates(user):
+    """Build the list of candidates of a user."""
+    refreshed_at = timezone.now()
+    root_paths = _get_root_paths(user)
+    documents = {}
+    if root_paths:
+        for document_id, title, path, updated_at in (
+            _get_subtrees(root_paths)
+            .filter(ancestors_deleted_at__isnull=True, title__isnull=False)
+            .order_by("-updated_at")
+            .values_list("id", "title", "path", "updated_at")[
+                : settings.TYPEAHEAD_MAX_CANDIDATES
+            ]
+        ):
+            documents[str(document_id)] = (
+                title,
+                path,
+                normalize(title),
+                updated_at.timestamp(),
+            )
+
+    return {
+        "root_paths": root_paths,
+        "refreshed_at": refreshed_at,
+        "documents": documents,
+    }
+
+
+def _refresh_candidates(user, candidates):
+    """
+    Update a list of candidates with the documents updated since it was, or build
+    it again if the documents the user has access to or visited changed. Like a
+    list built, it keeps the TYPEAHEAD_MAX_CANDIDATES documents updated last.
+    """
+    refreshed_at = timezone.now()
+    if _get_root_paths(user) != candidates["root_paths"]:
+        return _build_candidates(user)
+
+    if candidates["root_paths"]:
+        documents = candidates["documents"]
+        for document_id, title, path, updated_at, ancestors_deleted_at in (
+            _get_subtrees(candidates["root_paths"])
+            .filter(updated_at__gte=candidates["refreshed_at"] - REFRESH_OVERLAP)
+            .values_list("id", "title", "path", "updated_at", "ancestors_deleted_at")
+        ):
+            if ancestors_deleted_at or not title:
+                documents.pop(str(document_id), None)
+            else:
+                documents[str(document_id)] = (
+                    title,
+                    path,
+                    normalize(title),
+                    updated_at.timestamp(),
+                )
+
+        if len(documents) > settings.TYPEAHEAD_MAX_CANDIDATES:
+            candidates["documents"] = dict(
+                heapq.nlargest(
+                    settings.TYPEAHEAD_MAX_CANDIDATES,
+                    documents.items(),
+                    key=lambda item: item[1][3],
+                )
+            )
+
+    candidates["refreshed_at"] = refreshed_at
+    return candidates
+
+
+def get_candidates(user):
+    """
+    Return the cached list of candidates of a user, built or refreshed if needed.
+    """
+    cache_key = models.get_typeahead_cache_key(user.id)
+    candidates = cache.get(cache_key)
+    refresh_interval = timedelta(seconds=settings.TYPEAHEAD_REFRESH_INTERVAL)
+    if (
+        candidates is not None
+        and timezone.now() - candidates["refreshed_at"] < refresh_interval
+    ):
+        return candidates
+
+    try:
+        with statement_timeout(settings.TYPEAHEAD_QUERY_TIMEOUT):
+            candidates = (
+                _build_candidates(user)
+                if candidates is None
+                else _refresh_candidates(user, candidates)
+            )
+    except OperationalError as err:
+        logger.warning(
+            "Typeahead candidates of user %s not refreshed: %s", user.id, err
+        )
+        return candidates or {"documents": {}}
+
+    cache.set(cache_key, candidates, settings.TYPEAHEAD_CACHE_TIMEOUT)
+    return candidates
+
+
+def search(candidates, query, limit):
+    """
+    Return the candidates whose title has a word starting with the query, those
+    whose title starts with it first, then the most recently updated.
+    """
+    query = normalize(query).strip()
+    if not query:
+        return []
+
+    word_start = re.compile(rf"\b{re.escape(query)}")
+    matches = []
+    documents = candidates["documents"]
+    for document_id, (title, path, normalized, updated_at) in documents.items():
+        if normalized.startswith(query):
+            rank = 0
+        elif word_start.search(normalized):
+            rank = 1
+        else:
+            continue
+        matches.append((rank, -updated_at, document_id, title, path))
+
+    return [
+        {"id": document_id, "title": title, "path": path}
+        for _rank, _updated_at, document_id, title, path in heapq.nsmallest(
+            limit, matches
+        )
+    ]
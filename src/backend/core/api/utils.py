@@ -9,11 +9,14 @@ from django.core.cache import cache
 from django.core.files.storage import default_storage
 from django.utils.decorators import method_decorator
 
-import botocore
+from botocore.exceptions import ClientError
 from lasuite.oidc_login.decorators import refresh_oidc_access_token
 from rest_framework.throttling import BaseThrottle
 
-from core.utils.s3 import get_s3_client, get_unsigned_s3_client
+from core.utils.s3 import get_s3_authorization_signer, get_s3_client
+from core.utils.single_flight import SingleFlight, cache_single_flight
+
+_CONTENT_FETCHES = SingleFlight()
 
 
 def nest_tree(flat_list, steplen):
@@ -77,23 +80,11 @@ def generate_s3_authorization_headers(key):
       with cookies)
     - access control is truly realtime
     - the object storage service does not need to be exposed on internet
-    """
-    url = get_unsigned_s3_client().generate_presigned_url(
-        "get_object",
-        ExpiresIn=0,
-        Params={"Bucket": default_storage.bucket_name, "Key": key},
-    )
-    request = botocore.awsrequest.AWSRequest(method="get", url=url)
 
-    s3_client = get_s3_client()
-    # pylint: disable=protected-access
-    credentials = s3_client._request_signer._credentials  # noqa: SLF001
-    frozen_credentials = credentials.get_frozen_credentials()
-    region = s3_client.meta.region_name
-    auth = botocore.auth.S3SigV4Auth(frozen_credentials, "s3", region)
-    auth.add_auth(request)
-
-    return request
+    The signature is computed by a process-global signer caching everything that
+    does not depend on the key (see ``core.utils.sigv4``).
+    """
+    return get_s3_authorization_signer().sign(key)
 
 
 def conditional_refresh_oidc_token(func):
@@ -204,6 +195,122 @@ def get_content_metadata_cache_key(document_id):
     return f"docs:content-metadata:{document_id!s}"
 
 
+def get_attachment_upload_cache_key(upload_id):
+    """Return the cache key under which a pending direct upload is remembered."""
+    return f"docs:attachment-upload:{upload_id:s}"
+
+
+def get_content_single_flight_cache_key(document_id, etag):
+    """
+    Return the cache key used to share a content fetched by another worker.
+
+    The key includes the etag of the content so a fetch started before the content
+    is saved again can't publish the previous body for the new version.
+    """
+    etag = etag.strip('"')
+    return f"docs:content-single-flight:{document_id!s}:{etag:s}"
+
+
+def get_content_head_single_flight_cache_key(file_key):
+    """
+    Return the cache key used to share the metadata of a content read by another
+    worker.
+    """
+    return f"docs:content-head-single-flight:{file_key:s}"
+
+
+def get_content_head(file_key):
+    """
+    Return the etag, last modification date and size of a document content in the
+    object storage, without its body, or None if the file does not exist.
+    """
+    try:
+        s3_response = get_s3_client().head_object(
+            Bucket=default_storage.bucket_name, Key=file_key
+        )
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] in ("NoSuchKey", "404"):
+            return None
+        raise
+
+    return {
+        "etag": s3_response["ETag"],
+        "last_modified": s3_response["LastModified"],
+        "size": s3_response["ContentLength"],
+    }
+
+
+def _get_content_body(file_key, etag):
+    """
+    Read the body of a document content from object storage, raising a ClientError
+    if its etag changed since it was read.
+    """
+    s3_response = get_s3_client().get_object(
+        Bucket=default_storage.bucket_name, Key=file_key, IfMatch=etag
+    )
+    return s3_response["Body"].read()
+
+
+def fetch_content_head_single_flight(file_key):
+    """
+    Return the metadata of a document content like `get_content_head`, coalescing
+    concurrent calls the same way as `fetch_content_single_flight` so a reconnect
+    stampede makes one object storage call.
+    """
+    cache_key = get_content_head_single_flight_cache_key(file_key)
+    # A missing file is shared as an empty dict: None means "not published yet"
+    head = _CONTENT_FETCHES.do(
+        cache_key,
+        lambda: cache_single_flight(
+            cache_key,
+            lambda: get_content_head(file_key) or {},
+            lock_timeout=settings.CONTENT_SINGLE_FLIGHT_TIMEOUT,
+            wait_timeout=settings.CONTENT_SINGLE_FLIGHT_TIMEOUT,
+            result_timeout=settings.CONTENT_SINGLE_FLIGHT_RESULT_TIMEOUT,
+        ),
+    )
+    return head or None
+
+
+def fetch_content_single_flight(document, etag):
+    """
+    Fetch the body of the version of a document content with the given etag,
+    coalescing concurrent fetches.
+
+    Concurrent requests of the same process share one in-flight object storage
+    call and, across workers, followers wait for the content published in the
+    cache by the worker holding a short lock instead of stampeding the object
+    storage (e.g. when hundreds of clients reconnect to the same room). Callers
+    must check the size of the content first: its body is read into memory.
+    """
+    cache_key = get_content_single_flight_cache_key(document.id, etag)
+    return _CONTENT_FETCHES.do(
+        cache_key,
+        lambda: cache_single_flight(
+            cache_key,
+            lambda: _get_content_body(document.file_key, etag),
+            lock_timeout=settings.CONTENT_SINGLE_FLIGHT_TIMEOUT,
+            wait_timeout=settings.CONTENT_SINGLE_FLIGHT_TIMEOUT,
+            result_timeout=settings.CONTENT_SINGLE_FLIGHT_RESULT_TIMEOUT,
+        ),
+    )
+
+
+def is_content_not_modified(etag, last_modified, if_none_match, if_modified_since_dt):
+    """
+    Return True if the content identified by its etag and last modification date
+    matches the `If-None-Match` or `If-Modified-Since` conditional headers.
+    """
+    return bool(
+        (if_none_match and if_none_match == etag)
+        or (
+            if_modified_since_dt
+            and last_modified
+            and last_modified <= if_modified_since_dt
+        )
+    )
+
+
 def parse_http_conditional_headers(request):
     """Extract and normalize `If-None-Match` and `If-Modified-Since`.
 
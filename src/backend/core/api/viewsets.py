@@ -15,6 +15,7 @@ from urllib.parse import unquote, urlencode, urlparse
 
 from django.conf import settings
 from django.contrib.postgres.aggregates import ArrayAgg
+from django.contrib.postgres.fields import ArrayField
 from django.contrib.postgres.search import TrigramSimilarity
 from django.core.cache import cache
 from django.core.exceptions import ValidationError
@@ -23,7 +24,7 @@ from django.core.validators import URLValidator
 from django.db import DatabaseError, connection, transaction
 from django.db import models as db
 from django.db.models.expressions import RawSQL
-from django.db.models.functions import Greatest, Left, Length
+from django.db.models.functions import Greatest
 from django.http import Http404, StreamingHttpResponse
 from django.urls import reverse
 from django.utils import timezone
@@ -50,6 +51,7 @@ from treebeard.exceptions import InvalidMoveToDescendant
 
 from core import authentication, choices, enums, models
 from core.api.filters import remove_accents
+from core.lookups import ImmutableUnaccent
 from core.services import mime_types
 from core.services.ai_services.blocknote import AIService
 from core.services.ai_services.legacy import get_legacy_ai_service
@@ -70,17 +72,17 @@ from core.services.search_indexers import (
 )
 from core.tasks.access import reset_service_connections_in_cascade
 from core.tasks.mail import send_ask_for_access_mail
+from core.utils import media_auth as media_auth_cache
 from core.utils.analytics import PosthogEventName, posthog_capture
 from core.utils.dicts import lowercase_keys
-from core.utils.paths import filter_descendants
-from core.utils.s3 import get_s3_client
+from core.utils.s3 import get_public_s3_client, get_s3_client
 from core.utils.s3_response_stream import content_stream
 from core.utils.treebeard import create_tree_node_with_retry
 from core.utils.users import users_sharing_documents_with
-from core.utils.yjs import extract_attachments
+from core.utils.yjs import extract_attachments, extract_new_attachments
 
 from ..enums import FeatureFlag, SearchType
-from . import permissions, serializers, utils
+from . import permissions, serializers, typeahead, utils
 from .filters import (
     DocumentFilter,
     ListDocumentFilter,
@@ -482,6 +484,9 @@ class DocumentViewSet(
 
     7. **Version Detail**: Get or delete a specific document version.
         Example: GET, DELETE /documents/{id}/versions/{version_id}/
+        The raw content of a version can be streamed, with support for partial
+        (Range) and conditional requests.
+        Example: GET /documents/{id}/versions/{version_id}/content/
 
     8. **Favorite**: Get list of favorite documents for a user. Mark or unmark
         a document as favorite.
@@ -1525,6 +1530,31 @@ class DocumentViewSet(
                 request, params.validated_data, *args, **kwargs
             )
 
+    @drf.decorators.action(
+        detail=False,
+        methods=["get"],
+        url_path="typeahead",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def typeahead(self, request, *args, **kwargs):
+        """
+        Returns the id, title and path of the documents readable by the user whose
+        title has a word starting with the query parameter 'q', for the search box.
+
+        Unlike the search, it is answered from a list of candidates cached per user
+        and refreshed incrementally, without annotations nor pagination.
+        """
+        params = serializers.TypeaheadQueryParamSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        return drf.response.Response(
+            typeahead.search(
+                typeahead.get_candidates(request.user),
+                params.validated_data["q"],
+                settings.TYPEAHEAD_MAX_RESULTS,
+            )
+        )
+
     def _get_search_type(self) -> SearchType:
         """
         Returns the search type to use for the search endpoint based on feature flags.
@@ -1538,13 +1568,10 @@ class DocumentViewSet(
             return SearchType.FULL_TEXT
         return SearchType.TITLE
 
-    @staticmethod
-    def _search_using_indexer(indexer, request, params, search_type):
+    def _search_using_indexer(self, indexer, request, params, search_type):
         """
         Returns a list of documents matching the query (q) according to the configured indexer.
         """
-        queryset = models.Document.objects.all()
-
         # The indexer filters descendants by path prefix, so resolve the document
         # id to its path before querying it.
         path = None
@@ -1562,18 +1589,109 @@ class DocumentViewSet(
             search_type=search_type,
             token=request.session.get("oidc_access_token"),
             path=path,
-            visited=get_visited_document_ids_of(queryset, request.user),
+            visited=get_visited_document_ids_of(request.user),
+            user=request.user,
         )
 
+        documents = self._hydrate_search_results(results, request.user)
+        serializer = self.get_serializer(documents, many=True)
+
         return drf_response.Response(
             {
-                "count": len(results),
+                "count": len(documents),
                 "next": None,
                 "previous": None,
-                "results": results,
+                "results": serializer.data,
             }
         )
 
+    @staticmethod
+    def _hydrate_search_results(hits, user):
+        """
+        Load the documents of the search hits in ranking order, dropping those the
+        user can no longer read, and attach to each document its top parent.
+
+        The documents are loaded in a single annotated query and their ancestors in
+        another one, so that link definitions, abilities and top parents are
+        computed in memory instead of querying them for each document.
+        """
+        document_ids = []
+        highlights = {}
+        for hit in hits:
+            try:
+                document_id = uuid.UUID(str(hit["id"]))
+            except KeyError, ValueError:
+                continue
+            document_ids.append(document_id)
+            highlights[document_id] = hit.get("highlight")
+
+        documents_by_id = {
+            document.pk: document
+            for document in models.Document.objects.filter(
+                pk__in=document_ids, ancestors_deleted_at__isnull=True
+            )
+            .select_related("creator")
+            .annotate_user_roles(user)
+            .annotate_is_favorite(user)
+            .annotate_user_has_link_trace(user)
+        }
+
+        steplen = models.Document.steplen
+        ancestor_paths = {
+            document.path[:length]
+            for document in documents_by_id.values()
+            for length in range(steplen, len(document.path), steplen)
+        }
+        ancestors_by_path = {}
+        if ancestor_paths:
+            ancestors_by_path = {
+                ancestor.path: ancestor
+                for ancestor in models.Document.objects.filter(
+                    path__in=ancestor_paths, ancestors_deleted_at__isnull=True
+                )
+                .select_related("creator")
+                .annotate_user_roles(user)
+                .annotate_is_favorite(user)
+                .annotate_user_has_link_trace(user)
+            }
+
+        documents = []
+        for document_id in document_ids:
+            document = documents_by_id.pop(document_id, None)
+            if document is None:
+                continue
+
+            # The top parent is the highest ancestor listed for the user, like in
+            # the search in database: one to which the user has access or that the
+            # user visited if it is not restricted.
+            document.parent = None
+            ancestors_links = []
+            for length in range(steplen, len(document.path), steplen):
+                ancestor = ancestors_by_path.get(document.path[:length])
+                if ancestor is None:
+                    continue
+                ancestor.ancestors_link_definition = (
+                    choices.get_equivalent_link_definition(ancestors_links)
+                )
+                ancestors_links.append(ancestor.link_definition)
+                if document.parent is None and (
+                    ancestor.user_roles
+                    or (
+                        ancestor.user_has_link_trace
+                        and ancestor.link_reach != models.LinkReachChoices.RESTRICTED
+                    )
+                ):
+                    document.parent = ancestor
+
+            document.ancestors_link_definition = choices.get_equivalent_link_definition(
+                ancestors_links
+            )
+            document.highlight = highlights[document_id]
+            if document.get_abilities(user)["retrieve"]:
+                documents.append(document)
+
+        return documents
+
     def _get_response_for_search_queryset(
         self, queryset, candidate_parent_paths, resolve_parents
     ):
@@ -1672,10 +1790,21 @@ class DocumentViewSet(
 
         queryset = filterset.filter_queryset(queryset)
 
-        # Apply ordering only now that everything is filtered and annotated
-        queryset = filters.OrderingFilter().filter_queryset(
-            self.request, queryset, self
-        )
+        # Apply ordering only now that everything is filtered and annotated. Unless
+        # an ordering is requested, rank the documents by similarity of their title.
+        query = filterset.form.cleaned_data.get("q")
+        if query and not request.query_params.get(
+            filters.OrderingFilter.ordering_param
+        ):
+            queryset = queryset.annotate(
+                title_similarity=TrigramSimilarity(
+                    ImmutableUnaccent("title"), remove_accents(query)
+                )
+            ).order_by("-title_similarity", "-updated_at")
+        else:
+            queryset = filters.OrderingFilter().filter_queryset(
+                self.request, queryset, self
+            )
 
         return self._get_response_for_search_queryset(
             queryset,
@@ -1749,14 +1878,8 @@ class DocumentViewSet(
         document = self.get_object()
 
         # Users should not see version history dating from before they gained access to the
-        # document. Filter to get the minimum access date for the logged-in user
-        access_queryset = models.DocumentAccess.objects.filter(
-            db.Q(user=user) | db.Q(team__in=user.teams),
-            document__path=Left(db.Value(document.path), Length("document__path")),
-        ).aggregate(min_date=db.Min("created_at"))
-
-        # Handle the case where the user has no accesses
-        min_datetime = access_queryset["min_date"]
+        # document. Handle the case where the user has no accesses
+        min_datetime = document.get_versions_min_datetime(user)
         if not min_datetime:
             return drf.exceptions.PermissionDenied(
                 "Only users with specific access can see version history"
@@ -1787,16 +1910,9 @@ class DocumentViewSet(
 
         # Don't let users access versions that were created before they were given access
         # to the document
-        user = request.user
-        min_datetime = min(
-            access.created_at
-            for access in models.DocumentAccess.objects.filter(
-                db.Q(user=user) | db.Q(team__in=user.teams),
-                document__path=Left(db.Value(document.path), Length("document__path")),
-            )
-        )
+        min_datetime = document.get_versions_min_datetime(request.user)
 
-        if response["LastModified"] < min_datetime:
+        if not min_datetime or response["LastModified"] < min_datetime:
             raise Http404
 
         if request.method == "DELETE":
@@ -1813,6 +1929,87 @@ class DocumentViewSet(
             }
         )
 
+    @drf.decorators.action(
+        detail=True,
+        methods=["get"],
+        url_path=r"versions/(?P<version_id>[A-Za-z0-9._+\-=~]{1,1024})/content",
+    )
+    # pylint: disable=unused-argument
+    def versions_content(self, request, pk, version_id, *args, **kwargs):
+        """
+        Stream the raw content of a specific version of a document from s3.
+
+        Unlike `versions_detail`, the content is not loaded in memory and wrapped in a
+        JSON payload: the object storage body is streamed as is. Like `content_retrieve`,
+        HTTP cache is implemented with the ETag and Last-Modified headers and partial
+        reads are supported with the Range header. All are forwarded to the object
+        storage get_object operation.
+        """
+        document = self.get_object()
+
+        min_datetime = document.get_versions_min_datetime(request.user)
+        if not min_datetime:
+            raise Http404
+
+        # The S3 call can take time and the database connection is not needed anymore
+        connection.close()
+
+        if_none_match, if_modified_since_dt = utils.parse_http_conditional_headers(
+            request
+        )
+
+        get_object_kwargs = {
+            "Bucket": default_storage.bucket_name,
+            "Key": document.file_key,
+            "VersionId": version_id,
+        }
+        if if_none_match:
+            get_object_kwargs["IfNoneMatch"] = if_none_match
+        if if_modified_since_dt:
+            get_object_kwargs["IfModifiedSince"] = if_modified_since_dt
+        if range_header := request.META.get("HTTP_RANGE"):
+            get_object_kwargs["Range"] = range_header
+
+        try:
+            s3_response = get_s3_client().get_object(**get_object_kwargs)
+        except ClientError as exc:
+            code = exc.response["Error"]["Code"]
+            match code:
+                case "304" | "PreconditionFailed" | "NotModified":
+                    return drf_response.Response(status=status.HTTP_304_NOT_MODIFIED)
+                case "InvalidRange" | "416":
+                    return drf_response.Response(
+                        status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+                    )
+                case _:
+                    raise Http404 from exc
+
+        last_modified = s3_response["LastModified"]
+
+        # Don't let users access versions that were created before they were given access
+        # to the document
+        if last_modified < min_datetime:
+            s3_response["Body"].close()
+            raise Http404
+
+        response = StreamingHttpResponse(
+            streaming_content=content_stream(s3_response["Body"]),
+            content_type="text/plain",
+            status=status.HTTP_206_PARTIAL_CONTENT
+            if "ContentRange" in s3_response
+            else status.HTTP_200_OK,
+        )
+
+        response["Content-Length"] = s3_response["ContentLength"]
+        if "ContentRange" in s3_response:
+            response["Content-Range"] = s3_response["ContentRange"]
+        response["Accept-Ranges"] = "bytes"
+        response["ETag"] = s3_response["ETag"]
+        response["Last-Modified"] = last_modified.strftime("%a, %d %b %Y %H:%M:%S %Z")
+        response["Cache-Control"] = "private, no-cache"
+
+        return response
+
     @drf.decorators.action(detail=True, methods=["put"], url_path="link-configuration")
     def link_configuration(self, request, *args, **kwargs):
         """Update link configuration with specific rights (cf get_abilities)."""
@@ -1825,7 +2022,12 @@ class DocumentViewSet(
         )
         serializer.is_valid(raise_exception=True)
 
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
+            # The computed link reach of the descendants may have changed
+            document.record_indexing_change(include_descendants=True)
+        document.invalidate_media_auth_cache()
+        document.invalidate_typeahead_cache()
 
         # Notify collaboration server about the link updated
         reset_service_connections_in_cascade.delay(str(document.id))
@@ -1868,6 +2070,61 @@ class DocumentViewSet(
             status=drf.status.HTTP_200_OK,
         )
 
+    @staticmethod
+    def _get_attachment_key(document, file_id, extension, is_unsafe):
+        """Generate a generic yet unique key to store an attachment in object storage."""
+        file_unsafe = "-unsafe" if is_unsafe else ""
+        return (
+            f"{document.key_base}/{enums.ATTACHMENTS_FOLDER:s}/"
+            f"{file_id!s}{file_unsafe:s}.{extension:s}"
+        )
+
+    @staticmethod
+    def _get_attachment_extra_args(user, content_type, file_name, is_unsafe):
+        """Prepare the metadata stored with an attachment in object storage."""
+        extra_args = {
+            "Metadata": {
+                "owner": str(user.id),
+                "status": enums.DocumentAttachmentStatus.PROCESSING.value,
+            },
+            "ContentType": content_type,
+            # Only safe images can be displayed inline
+            "ContentDisposition": content_disposition_header(
+                as_attachment=not content_type.startswith("image/") or is_unsafe,
+                filename=file_name,
+            ),
+        }
+        if is_unsafe:
+            extra_args["Metadata"]["is_unsafe"] = "true"
+        return extra_args
+
+    @staticmethod
+    def _create_attachment(document, key, user, content_type, size):
+        """Register an attachment being processed by the malware detection."""
+        models.Attachment.objects.create(
+            key=key,
+            document=document,
+            content_type=content_type,
+            size=size,
+            owner=user if user.is_authenticated else None,
+        )
+
+    @staticmethod
+    def _get_attachment_response(document, key):
+        """Return the url at which the client can check the status of an attachment."""
+        url = reverse(
+            "documents-media-check",
+            kwargs={"pk": document.id},
+        )
+        parameters = urlencode({"key": key})
+
+        return drf.response.Response(
+            {
+                "file": f"{url:s}?{parameters:s}",
+            },
+            status=drf.status.HTTP_201_CREATED,
+        )
+
     @drf.decorators.action(detail=True, methods=["post"], url_path="attachment-upload")
     def attachment_upload(self, request, *args, **kwargs):
         """Upload a file related to a given document"""
@@ -1878,70 +2135,244 @@ class DocumentViewSet(
         serializer = serializers.FileUploadSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        # Generate a generic yet unique filename to store the image in object storage
-        file_id = uuid.uuid4()
-        ext = serializer.validated_data["expected_extension"]
-
-        # Prepare metadata for storage
-        extra_args = {
-            "Metadata": {
-                "owner": str(request.user.id),
-                "status": enums.DocumentAttachmentStatus.PROCESSING.value,
-            },
-            "ContentType": serializer.validated_data["content_type"],
-        }
-        file_unsafe = ""
-        if serializer.validated_data["is_unsafe"]:
-            extra_args["Metadata"]["is_unsafe"] = "true"
-            file_unsafe = "-unsafe"
-
-        key = f"{document.key_base}/{enums.ATTACHMENTS_FOLDER:s}/{file_id!s}{file_unsafe}.{ext:s}"
-
-        file_name = serializer.validated_data["file_name"]
-        if (
-            not serializer.validated_data["content_type"].startswith("image/")
-            or serializer.validated_data["is_unsafe"]
-        ):
-            extra_args.update(
-                {
-                    "ContentDisposition": content_disposition_header(
-                        as_attachment=True, filename=file_name
-                    )
-                }
-            )
-        else:
-            extra_args.update(
-                {
-                    "ContentDisposition": content_disposition_header(
-                        as_attachment=False, filename=file_name
-                    )
-                }
-            )
+        is_unsafe = serializer.validated_data["is_unsafe"]
+        key = self._get_attachment_key(
+            document,
+            uuid.uuid4(),
+            serializer.validated_data["expected_extension"],
+            is_unsafe,
+        )
+        extra_args = self._get_attachment_extra_args(
+            request.user,
+            serializer.validated_data["content_type"],
+            serializer.validated_data["file_name"],
+            is_unsafe,
+        )
 
         file = serializer.validated_data["file"]
         default_storage.connection.meta.client.upload_fileobj(
             file, default_storage.bucket_name, key, ExtraArgs=extra_args
         )
 
+        self._create_attachment(
+            document, key, request.user, extra_args["ContentType"], file.size
+        )
+
         # Make the attachment readable by document readers
         document.attachments.append(key)
         document.save()
 
         malware_detection.analyse_file(key, document_id=document.id)
 
-        url = reverse(
-            "documents-media-check",
-            kwargs={"pk": document.id},
+        return self._get_attachment_response(document, key)
+
+    @drf.decorators.action(
+        detail=True,
+        methods=["post"],
+        url_path="attachment-upload/multipart",
+    )
+    def attachment_upload_multipart(self, request, *args, **kwargs):
+        """
+        Start the upload of a file directly to the object storage.
+
+        A multipart upload is created for a generated key and presigned urls are
+        returned for each part so the file never transits through the backend. The
+        client must then call the `attachment-upload/complete` endpoint with the
+        ETag of each uploaded part.
+        """
+        document = self.get_object()
+
+        serializer = serializers.AttachmentUploadInitSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        file_name = serializer.validated_data["file_name"]
+        size = serializer.validated_data["size"]
+        key = self._get_attachment_key(
+            document,
+            uuid.uuid4(),
+            serializer.validated_data["expected_extension"],
+            False,
+        )
+        extra_args = self._get_attachment_extra_args(
+            request.user, serializer.validated_data["content_type"], file_name, False
+        )
+
+        s3_client = get_s3_client()
+        upload_id = s3_client.create_multipart_upload(
+            Bucket=default_storage.bucket_name, Key=key, **extra_args
+        )["UploadId"]
+
+        expiration = settings.DOCUMENT_ATTACHMENT_UPLOAD_EXPIRATION
+        part_size = settings.DOCUMENT_ATTACHMENT_UPLOAD_PART_SIZE
+        nb_parts = -(-size // part_size)
+        # The urls are used by the browser and sign the length of each part, so the
+        # object storage refuses parts exceeding the size declared
+        public_s3_client = get_public_s3_client()
+        parts = [
+            {
+                "part_number": part_number,
+                "url": public_s3_client.generate_presigned_url(
+                    "upload_part",
+                    Params={
+                        "Bucket": default_storage.bucket_name,
+                        "Key": key,
+                        "UploadId": upload_id,
+                        "PartNumber": part_number,
+                        "ContentLength": min(
+                            part_size, size - (part_number - 1) * part_size
+                        ),
+                    },
+                    ExpiresIn=expiration,
+                ),
+            }
+            for part_number in range(1, nb_parts + 1)
+        ]
+
+        # Remember the upload so that only its initiator can complete it
+        cache.set(
+            utils.get_attachment_upload_cache_key(upload_id),
+            {
+                "document_id": str(document.id),
+                "file_name": file_name,
+                "key": key,
+                "nb_parts": nb_parts,
+                "user_id": str(request.user.id),
+            },
+            expiration,
         )
-        parameters = urlencode({"key": key})
 
         return drf.response.Response(
             {
-                "file": f"{url:s}?{parameters:s}",
+                "key": key,
+                "upload_id": upload_id,
+                "part_size": part_size,
+                "parts": parts,
             },
             status=drf.status.HTTP_201_CREATED,
         )
 
+    @drf.decorators.action(
+        detail=True,
+        methods=["post"],
+        url_path="attachment-upload/complete",
+    )
+    def attachment_upload_complete(self, request, *args, **kwargs):
+        """
+        Complete the upload of a file directly to the object storage.
+
+        The type of the file is verified by reading only its first bytes and the
+        attachment is registered on the document with a single UPDATE query.
+        """
+        document = self.get_object()
+
+        serializer = serializers.AttachmentUploadCompleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        upload_id = serializer.validated_data["upload_id"]
+        cache_key = utils.get_attachment_upload_cache_key(upload_id)
+        upload = cache.get(cache_key)
+        if (
+            upload is None
+            or upload["document_id"] != str(document.id)
+            or upload["user_id"] != str(request.user.id)
+        ):
+            raise drf.exceptions.ValidationError({"upload_id": "Unknown upload."})
+
+        if any(
+            part["part_number"] > upload["nb_parts"]
+            for part in serializer.validated_data["parts"]
+        ):
+            raise drf.exceptions.ValidationError(
+                {"parts": "The upload has more parts than announced."}
+            )
+
+        s3_client = get_s3_client()
+        bucket_name = default_storage.bucket_name
+        key = upload["key"]
+        try:
+            s3_client.complete_multipart_upload(
+                Bucket=bucket_name,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={
+                    "Parts": [
+                        {"PartNumber": part["part_number"], "ETag": part["etag"]}
+                        for part in sorted(
+                            serializer.validated_data["parts"],
+                            key=lambda part: part["part_number"],
+                        )
+                    ]
+                },
+            )
+        except ClientError as err:
+            raise drf.exceptions.ValidationError(
+                {"parts": "The upload could not be completed."}
+            ) from err
+        cache.delete(cache_key)
+
+        # Read only the first bytes to determine the type of the file
+        response = s3_client.get_object(
+            Bucket=bucket_name, Key=key, Range="bytes=0-1023"
+        )
+        head = response["Body"].read()
+        # Only address the version read when the bucket is versioned
+        version = (
+            {"VersionId": response["VersionId"]} if response.get("VersionId") else {}
+        )
+        size = int(response.get("ContentRange", "").rpartition("/")[-1] or len(head))
+
+        try:
+            serializers.validate_attachment_size(size)
+            file_type = serializers.get_attachment_file_type(upload["file_name"], head)
+        except drf.exceptions.ValidationError as err:
+            s3_client.delete_object(Bucket=bucket_name, Key=key, **version)
+            raise drf.exceptions.ValidationError({"file": err.detail}) from err
+
+        if (
+            file_type["is_unsafe"]
+            or file_type["content_type"] != response["ContentType"]
+        ):
+            # Store the file under a key and with metadata matching its real type,
+            # the copy is done by the object storage.
+            source_key = key
+            key = self._get_attachment_key(
+                document,
+                uuid.uuid4(),
+                file_type["expected_extension"],
+                file_type["is_unsafe"],
+            )
+            s3_client.copy_object(
+                Bucket=bucket_name,
+                Key=key,
+                CopySource={"Bucket": bucket_name, "Key": source_key, **version},
+                MetadataDirective="REPLACE",
+                **self._get_attachment_extra_args(
+                    request.user,
+                    file_type["content_type"],
+                    upload["file_name"],
+                    file_type["is_unsafe"],
+                ),
+            )
+            s3_client.delete_object(Bucket=bucket_name, Key=source_key, **version)
+
+        self._create_attachment(
+            document, key, request.user, file_type["content_type"], size
+        )
+
+        # Make the attachment readable by document readers
+        models.Document.objects.filter(pk=document.pk).update(
+            attachments=db.Func(
+                db.F("attachments"),
+                db.Value(key),
+                function="array_append",
+                output_field=ArrayField(base_field=db.CharField()),
+            )
+        )
+
+        malware_detection.analyse_file(key, document_id=document.id)
+
+        return self._get_attachment_response(document, key)
+
     def _auth_get_original_url(self, request):
         """
         Extracts and parses the original URL from the configured parameter header.
@@ -1986,25 +2417,11 @@ class DocumentViewSet(
             logger.debug("Failed to extract parameters from subrequest URL: %s", exc)
             raise drf.exceptions.PermissionDenied() from exc
 
-    @drf.decorators.action(detail=False, methods=["get"], url_path="media-auth")
-    def media_auth(self, request, *args, **kwargs):
+    def _auth_check_attachment_access(self, user, key):
         """
-        This view is used by an Nginx subrequest to control access to a document's
-        attachment file.
-
-        When we let the request go through, we compute authorization headers that will be added to
-        the request going through thanks to the nginx.ingress.kubernetes.io/auth-response-headers
-        annotation. The request will then be proxied to the object storage backend who will
-        respond with the file after checking the signature included in headers.
+        Check that the user can read the attachment and that it is ready, and
+        remember the decision. Raises PermissionDenied otherwise.
         """
-        parsed_url = self._auth_get_original_url(request)
-        url_params = self._auth_get_url_params(
-            enums.MEDIA_STORAGE_URL_PATTERN, parsed_url.path
-        )
-
-        user = request.user
-        key = f"{url_params['pk']:s}/{url_params['attachment']:s}"
-
         # Look for a document to which the user has access and that includes this
         # attachment. Access is granted when the document holding the attachment,
         # or any of its ancestors, is readable per se by the user.
@@ -2030,11 +2447,11 @@ class DocumentViewSet(
             .values_list("path", flat=True)
         )
 
-        candidate_paths = {
-            path[:pos]
-            for path in attachment_paths
-            for pos in range(len(path), 0, -models.Document.steplen)
-        }
+        candidate_paths = self._get_ancestors_or_self_paths(attachment_paths)
+
+        # Read the generations before the decision: if a tree changes meanwhile,
+        # the decision will not be reused.
+        generations = media_auth_cache.get_tree_generations(attachment_paths)
 
         if not candidate_paths or not (
             self.queryset.readable_per_se(user)
@@ -2044,30 +2461,61 @@ class DocumentViewSet(
             logger.debug("User '%s' lacks permission for attachment", user)
             raise drf.exceptions.PermissionDenied()
 
-        # Check if the attachment is ready. Use the process-global S3 client
-        # (see core.utils.s3): django-storages caches its client per thread, so
-        # relying on default_storage.connection here rebuilds the boto3 client
-        # on every fresh thread -- profiling showed that client construction,
-        # not the DB, dominated this endpoint's CPU under load.
-        s3_client = get_s3_client()
-        bucket_name = default_storage.bucket_name
-        try:
-            head_resp = s3_client.head_object(Bucket=bucket_name, Key=key)
-        except ClientError as err:
-            raise drf.exceptions.PermissionDenied() from err
-        metadata = lowercase_keys(head_resp.get("Metadata", {}))
-        # In order to be compatible with existing upload without `status` metadata,
-        # we consider them as ready.
-        if (
-            metadata.get("status", enums.DocumentAttachmentStatus.READY)
-            != enums.DocumentAttachmentStatus.READY
-        ):
+        if not media_auth_cache.is_attachment_ready(key):
+            self._auth_check_attachment_ready(key)
+
+        media_auth_cache.grant_access(user, key, generations)
+
+    @staticmethod
+    def _get_ancestors_or_self_paths(paths):
+        """Expand paths to themselves and the paths of all their ancestors."""
+        return {
+            path[:pos]
+            for path in paths
+            for pos in range(len(path), 0, -models.Document.steplen)
+        }
+
+    @staticmethod
+    def _auth_check_attachment_ready(key):
+        """
+        Check that an attachment is ready and remember it. Raises PermissionDenied
+        otherwise.
+        """
+        status = models.Attachment.get_status(key)
+        if status != enums.DocumentAttachmentStatus.READY:
             raise drf.exceptions.PermissionDenied()
 
+        media_auth_cache.mark_attachment_ready(key)
+
+    @drf.decorators.action(detail=False, methods=["get"], url_path="media-auth")
+    def media_auth(self, request, *args, **kwargs):
+        """
+        This view is used by an Nginx subrequest to control access to a document's
+        attachment file.
+
+        When we let the request go through, we compute authorization headers that will be added to
+        the request going through thanks to the nginx.ingress.kubernetes.io/auth-response-headers
+        annotation. The request will then be proxied to the object storage backend who will
+        respond with the file after checking the signature included in headers.
+        """
+        parsed_url = self._auth_get_original_url(request)
+        url_params = self._auth_get_url_params(
+            enums.MEDIA_STORAGE_URL_PATTERN, parsed_url.path
+        )
+
+        user = request.user
+        key = f"{url_params['pk']:s}/{url_params['attachment']:s}"
+
+        # Repeated loads of an attachment reuse the decision taken for the user as
+        # long as the trees of documents it was computed from did not change (see
+        # core.utils.media_auth).
+        if not media_auth_cache.is_access_granted(user, key):
+            self._auth_check_attachment_access(user, key)
+
         # Generate S3 authorization headers using the extracted URL parameters
-        request = utils.generate_s3_authorization_headers(key)
+        headers = utils.generate_s3_authorization_headers(key)
 
-        return drf.response.Response("authorized", headers=request.headers, status=200)
+        return drf.response.Response("authorized", headers=headers, status=200)
 
     @drf.decorators.action(detail=True, methods=["patch"])
     def content(self, request, *args, **kwargs):
@@ -2087,41 +2535,41 @@ class DocumentViewSet(
             )
 
         content = serializer.validated_data["content"]
+        existing_attachments = set(document.attachments or [])
         try:
-            extracted_attachments = set(extract_attachments(content))
+            new_attachments = extract_new_attachments(content, existing_attachments)
         except ValueError:
             return drf_response.Response(
                 "invalid yjs document", status=status.HTTP_400_BAD_REQUEST
             )
 
-        existing_attachments = set(document.attachments or [])
-        new_attachments = extracted_attachments - existing_attachments
-
         # Ensure we update attachments the request user is allowed to read
         if new_attachments:
-            attachments_documents = (
+            attachments_documents = list(
                 models.Document.objects.filter(
                     attachments__overlap=list(new_attachments)
+                ).only("path", "attachments")
+            )
+
+            # Like in media-auth, an attachment is readable if the document holding
+            # it or one of its ancestors is readable per se by the user: check all
+            # these candidate paths with one query instead of listing every path
+            # readable by the user.
+            readable_paths = set(
+                models.Document.objects.readable_per_se(self.request.user)
+                .filter(
+                    path__in=self._get_ancestors_or_self_paths(
+                        [doc.path for doc in attachments_documents]
+                    )
                 )
-                .only("path", "attachments")
-                .order_by("path")
-            )
-
-            user = self.request.user
-            readable_per_se_paths = (
-                models.Document.objects.readable_per_se(user)
-                .order_by("path")
                 .values_list("path", flat=True)
             )
-            readable_attachments_paths = filter_descendants(
-                [doc.path for doc in attachments_documents],
-                readable_per_se_paths,
-                skip_sorting=True,
-            )
 
             readable_attachments = set()
             for attachments_document in attachments_documents:
-                if attachments_document.path not in readable_attachments_paths:
+                if readable_paths.isdisjoint(
+                    self._get_ancestors_or_self_paths([attachments_document.path])
+                ):
                     continue
                 readable_attachments.update(
                     set(attachments_document.attachments) & new_attachments
@@ -2131,7 +2579,12 @@ class DocumentViewSet(
             document.attachments = list(existing_attachments | readable_attachments)
         document.content = content
         document.save()
-        cache.delete(utils.get_content_metadata_cache_key(document.id))
+        cache.delete_many(
+            [
+                utils.get_content_metadata_cache_key(document.id),
+                utils.get_content_head_single_flight_cache_key(document.file_key),
+            ]
+        )
 
         return drf_response.Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -2163,13 +2616,20 @@ class DocumentViewSet(
         # First check if a cache is existing to return earlier a 304 without reaching s3
         # if etag or last_modified have not changed.
         cache_key = utils.get_content_metadata_cache_key(document.id)
-        if content_metadata := cache.get(cache_key):
-            if (if_none_match and if_none_match == content_metadata.get("etag")) or (
-                if_modified_since_dt
-                and dt.datetime.fromisoformat(content_metadata.get("last_modified"))
-                <= if_modified_since_dt
-            ):
-                return drf_response.Response(status=status.HTTP_304_NOT_MODIFIED)
+        if (content_metadata := cache.get(cache_key)) and utils.is_content_not_modified(
+            content_metadata.get("etag"),
+            dt.datetime.fromisoformat(content_metadata.get("last_modified")),
+            if_none_match,
+            if_modified_since_dt,
+        ):
+            return drf_response.Response(status=status.HTTP_304_NOT_MODIFIED)
+
+        if settings.CONTENT_SINGLE_FLIGHT_ENABLED and (
+            response := self._content_retrieve_single_flight(
+                document, if_none_match, if_modified_since_dt
+            )
+        ):
+            return response
 
         # Prepare get_object S3 operation. The get_object manages ETag and last_modified
         # headers will raise a 304 client error if one of them matches the value existing in
@@ -2201,13 +2661,67 @@ class DocumentViewSet(
                 case _:
                     raise
 
-        last_modified = s3_response["LastModified"]
-        etag = s3_response["ETag"]
-        size = s3_response["ContentLength"]
+        return self._get_content_response(
+            document,
+            s3_response["Body"],
+            etag=s3_response["ETag"],
+            last_modified=s3_response["LastModified"],
+            size=s3_response["ContentLength"],
+        )
+
+    def _content_retrieve_single_flight(
+        self, document, if_none_match, if_modified_since_dt
+    ):
+        """
+        Serve the content through a metadata read and a fetch both shared with
+        concurrent requests for the same document. The conditional headers can't be
+        passed to the shared object storage calls so they are evaluated against the
+        etag and last modified date read first.
+
+        Return None when the content must be streamed from the object storage instead:
+        when it is too large to be held in memory and shared, or when it changed
+        between the two object storage calls.
+        """
+        head = utils.fetch_content_head_single_flight(document.file_key)
+
+        if head is None:
+            return StreamingHttpResponse(
+                content_stream(StreamingBody(BytesIO(b""), content_length=0)),
+                content_type="text/plain",
+                status=200,
+            )
+
+        if utils.is_content_not_modified(
+            head["etag"],
+            head["last_modified"],
+            if_none_match,
+            if_modified_since_dt,
+        ):
+            return drf_response.Response(status=status.HTTP_304_NOT_MODIFIED)
+
+        if head["size"] > settings.CONTENT_SINGLE_FLIGHT_MAX_SIZE:
+            return None
+
+        try:
+            body = utils.fetch_content_single_flight(document, head["etag"])
+        except ClientError as exc:
+            if exc.response["Error"]["Code"] in ("412", "PreconditionFailed"):
+                return None
+            raise
+
+        return self._get_content_response(
+            document,
+            StreamingBody(BytesIO(body), content_length=len(body)),
+            etag=head["etag"],
+            last_modified=head["last_modified"],
+            size=len(body),
+        )
 
-        # Refresh the metadata cache
+    # pylint: disable=too-many-arguments
+    def _get_content_response(self, document, body, *, etag, last_modified, size):
+        """Refresh the content metadata cache and stream the content body."""
         cache.set(
-            cache_key,
+            utils.get_content_metadata_cache_key(document.id),
             {
                 "last_modified": last_modified.isoformat(),
                 "etag": etag,
@@ -2216,7 +2730,7 @@ class DocumentViewSet(
         )
 
         response = StreamingHttpResponse(
-            streaming_content=content_stream(s3_response["Body"]),
+            streaming_content=content_stream(body),
             content_type="text/plain",
             status=status.HTTP_200_OK,
         )
@@ -2249,29 +2763,59 @@ class DocumentViewSet(
             )
 
         # Check if the attachment is ready
-        s3_client = default_storage.connection.meta.client
-        bucket_name = default_storage.bucket_name
-        try:
-            head_resp = s3_client.head_object(Bucket=bucket_name, Key=key)
-        except ClientError as err:
-            logger.error("Client Error fetching file %s metadata: %s", key, err)
+        status = models.Attachment.get_status(
+            key, default=enums.DocumentAttachmentStatus.PROCESSING.value
+        )
+        if status is None:
             return drf.response.Response(
                 {"detail": "Media not found"},
                 status=drf.status.HTTP_404_NOT_FOUND,
             )
-        metadata = lowercase_keys(head_resp.get("Metadata", {}))
 
-        body = {
-            "status": metadata.get("status", enums.DocumentAttachmentStatus.PROCESSING),
-        }
-        if metadata.get("status") == enums.DocumentAttachmentStatus.READY:
-            body = {
-                "status": enums.DocumentAttachmentStatus.READY,
-                "file": f"{settings.MEDIA_URL:s}{key:s}",
-            }
+        return drf.response.Response(
+            self._get_media_check_body(key, status), status=drf.status.HTTP_200_OK
+        )
+
+    @drf.decorators.action(detail=True, methods=["post"], url_path="media-check/batch")
+    def media_check_batch(self, request, *args, **kwargs):
+        """
+        Check if several medias are ready to be served, in a single request.
+
+        Statuses are resolved from the cache and the attachments table; legacy
+        attachments fall back on the object storage, checked concurrently. The
+        response maps each key to the body the "media-check" endpoint would return.
+        """
+        document = self.get_object()
+
+        serializer = serializers.MediaCheckBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        keys = list(dict.fromkeys(serializer.validated_data["keys"]))
+
+        attachments = set(document.attachments)
+        statuses = models.Attachment.get_statuses(
+            [key for key in keys if key in attachments],
+            default=enums.DocumentAttachmentStatus.PROCESSING.value,
+        )
+
+        body = {}
+        for key in keys:
+            if key not in attachments:
+                body[key] = {"detail": "Attachment missing"}
+            elif statuses[key] is None:
+                body[key] = {"detail": "Media not found"}
+            else:
+                body[key] = self._get_media_check_body(key, statuses[key])
 
         return drf.response.Response(body, status=drf.status.HTTP_200_OK)
 
+    @staticmethod
+    def _get_media_check_body(key, status):
+        """Return the status of an attachment and its url once it is ready."""
+        body = {"status": status}
+        if status == enums.DocumentAttachmentStatus.READY:
+            body["file"] = f"{settings.MEDIA_URL:s}{key:s}"
+        return body
+
     @drf.decorators.action(
         detail=True,
         methods=["post"],
@@ -2,6 +2,8 @@
 Core application factories
 """
 
+import uuid
+
 from django.conf import settings
 from django.contrib.auth.hashers import make_password
 
@@ -173,6 +175,21 @@ class TeamDocumentAccessFactory(factory.django.DjangoModelFactory):
     role = factory.fuzzy.FuzzyChoice([r[0] for r in models.RoleChoices.choices])
 
 
+class AttachmentFactory(factory.django.DjangoModelFactory):
+    """Create fake document attachments for testing."""
+
+    class Meta:
+        model = models.Attachment
+
+    document = factory.SubFactory(DocumentFactory)
+    key = factory.LazyAttribute(
+        lambda o: f"{o.document.id!s}/attachments/{uuid.uuid4()!s}.png"
+    )
+    content_type = "image/png"
+    size = factory.fuzzy.FuzzyInteger(1, 10 * 1024 * 1024)
+    owner = factory.SubFactory(UserFactory)
+
+
 class DocumentAskForAccessFactory(factory.django.DjangoModelFactory):
     """Create fake document ask for access for testing."""
 
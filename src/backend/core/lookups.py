@@ -0,0 +1,40 @@
+"""Database functions and lookups for the impress core application."""
+
+from django.db import models
+
+
+class ImmutableUnaccent(models.Func):
+    """
+    Remove accents with `f_unaccent`, the immutable wrapper of the unaccent
+    extension's function created by migration 0027. Unlike `unaccent`, it can be
+    used in indexes.
+    """
+
+    function = "f_unaccent"
+    output_field = models.TextField()
+
+
+@models.CharField.register_lookup
+class UnaccentIContains(models.Lookup):
+    """
+    Accent and case insensitive containment, written as
+    `f_unaccent(field) ILIKE f_unaccent(pattern)` so that it can be served by a
+    trigram index on `f_unaccent(field)`. The `unaccent__icontains` lookups compare
+    uppercased values, which no index serves.
+    """
+
+    lookup_name = "unaccent_icontains"
+    prepare_rhs = False
+
+    def get_db_prep_lookup(self, value, connection):
+        """Escape the value and wrap it in wildcards."""
+        return "%s", [f"%{connection.ops.prep_for_like_query(value):s}%"]
+
+    def as_sql(self, compiler, connection):
+        """Compare the unaccented values with ILIKE."""
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return (
+            f"f_unaccent({lhs:s}) ILIKE f_unaccent({rhs:s})",
+            [*lhs_params, *rhs_params],
+        )
@@ -7,33 +7,46 @@ from django.core.files.storage import default_storage
 from lasuite.malware_detection.enums import ReportStatus
 
 from core.enums import DocumentAttachmentStatus
-from core.models import Document
+from core.models import Attachment, Document
+from core.utils import media_auth as media_auth_cache
 from core.utils.dicts import lowercase_keys
 
 logger = logging.getLogger(__name__)
 security_logger = logging.getLogger("docs.security")
 
 
+def _mark_object_ready(file_path):
+    """Store the ready status in the metadata of an object (legacy attachments)."""
+    # Get existing metadata
+    s3_client = default_storage.connection.meta.client
+    bucket_name = default_storage.bucket_name
+    head_resp = s3_client.head_object(Bucket=bucket_name, Key=file_path)
+    metadata = lowercase_keys(head_resp.get("Metadata", {}))
+    metadata.update({"status": DocumentAttachmentStatus.READY.value})
+    # Update status in metadata
+    s3_client.copy_object(
+        Bucket=bucket_name,
+        CopySource={"Bucket": bucket_name, "Key": file_path},
+        Key=file_path,
+        ContentType=head_resp.get("ContentType"),
+        Metadata=metadata,
+        MetadataDirective="REPLACE",
+    )
+
+
 def malware_detection_callback(file_path, status, error_info, **kwargs):
     """Malware detection callback"""
 
     if status == ReportStatus.SAFE:
         logger.info("File %s is safe", file_path)
-        # Get existing metadata
-        s3_client = default_storage.connection.meta.client
-        bucket_name = default_storage.bucket_name
-        head_resp = s3_client.head_object(Bucket=bucket_name, Key=file_path)
-        metadata = lowercase_keys(head_resp.get("Metadata", {}))
-        metadata.update({"status": DocumentAttachmentStatus.READY.value})
-        # Update status in metadata
-        s3_client.copy_object(
-            Bucket=bucket_name,
-            CopySource={"Bucket": bucket_name, "Key": file_path},
-            Key=file_path,
-            ContentType=head_resp.get("ContentType"),
-            Metadata=metadata,
-            MetadataDirective="REPLACE",
-        )
+        # The status of attachments registered in the database is only stored there
+        if not Attachment.objects.filter(key=file_path).update(
+            status=DocumentAttachmentStatus.READY.value
+        ):
+            _mark_object_ready(file_path)
+
+        # Let media-auth serve the attachment without checking its status again
+        media_auth_cache.mark_attachment_ready(file_path)
         return
 
     document_id = kwargs.get("document_id")
@@ -51,3 +64,4 @@ def malware_detection_callback(file_path, status, error_info, **kwargs):
 
     # Delete the file from the storage
     default_storage.delete(file_path)
+    Attachment.objects.filter(key=file_path).delete()
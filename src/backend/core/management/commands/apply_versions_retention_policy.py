@@ -0,0 +1,79 @@
+"""Apply the versions retention policy to the content of documents."""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Document
+from core.services.versions_retention import apply_versions_retention_policy
+from core.tasks.versions import apply_versions_retention_policy_task
+
+
+class Command(BaseCommand):
+    """
+    Delete the document versions not kept by the retention policy configured with
+    the DOCUMENT_VERSIONS_RETENTION_* settings and print statistics per document.
+
+        python manage.py apply_versions_retention_policy --dry-run   # preview
+        python manage.py apply_versions_retention_policy <id> <id>   # some documents
+        python manage.py apply_versions_retention_policy --async     # celery tasks
+    """
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Define command arguments."""
+        parser.add_argument(
+            "document_ids",
+            nargs="*",
+            type=str,
+            help="UUIDs of the documents to process (all documents by default)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Print what would be deleted; delete nothing.",
+        )
+        parser.add_argument(
+            "--async",
+            action="store_true",
+            dest="is_async",
+            help="Apply the policy to all documents in background celery tasks.",
+        )
+
+    def handle(self, *args, **options):
+        """Apply the policy document per document and print statistics."""
+        if options["is_async"]:
+            if options["dry_run"] or options["document_ids"]:
+                raise CommandError(
+                    "The --async option can not be combined with --dry-run "
+                    "or document ids."
+                )
+            apply_versions_retention_policy_task.delay()
+            self.stdout.write("[INFO] Versions retention policy task enqueued.")
+            return
+
+        queryset = Document.objects.order_by("pk").only("pk")
+        if options["document_ids"]:
+            queryset = queryset.filter(pk__in=options["document_ids"])
+
+        prefix = "[DRY RUN] " if options["dry_run"] else ""
+        totals = {"documents": 0, "versions": 0, "deleted": 0, "size": 0}
+        for document in queryset.iterator():
+            stats = apply_versions_retention_policy(
+                document, dry_run=options["dry_run"]
+            )
+            totals["documents"] += 1
+            for key, value in stats.items():
+                totals[key] += value
+
+            if stats["deleted"]:
+                self.stdout.write(
+                    f"{prefix}{document.pk!s}: {stats['deleted']:d}/"
+                    f"{stats['versions']:d} version(s) deleted "
+                    f"({stats['size']:d} bytes)"
+                )
+
+        self.stdout.write(
+            f"{prefix}[INFO] {totals['deleted']:d}/{totals['versions']:d} version(s) "
+            f"deleted in {totals['documents']:d} document(s) "
+            f"({totals['size']:d} bytes)."
+        )
@@ -0,0 +1,147 @@
+"""Management command filling the attachments table from the object storage."""
+
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from botocore.exceptions import ClientError
+
+from core import enums
+from core.models import Attachment, Document, User
+from core.utils.dicts import lowercase_keys
+from core.utils.s3 import get_s3_client
+
+ATTACHMENT_KEY_PATTERN = re.compile(
+    f"^(?P<document_id>{enums.UUID_REGEX:s})/{enums.ATTACHMENTS_FOLDER:s}/"
+    f"{enums.UUID_REGEX:s}(?:-unsafe)?{enums.FILE_EXT_REGEX:s}$"
+)
+
+
+class Command(BaseCommand):
+    """
+    Register in the attachments table the attachments found in the object storage.
+    The metadata of the objects are read in parallel. Attachments already
+    registered are ignored so it can be run again.
+    """
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Define the batch size and the number of parallel requests."""
+        parser.add_argument(
+            "--batch-size",
+            action="store",
+            dest="batch_size",
+            type=int,
+            default=1000,
+            help="Number of attachments inserted in the database at once",
+        )
+        parser.add_argument(
+            "--workers",
+            action="store",
+            dest="workers",
+            type=int,
+            default=8,
+            help="Number of parallel requests to the object storage",
+        )
+
+    def handle(self, *args, **options):
+        """Execute management command."""
+        paginator = get_s3_client().get_paginator("list_objects_v2")
+
+        total = 0
+        batch = []
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            for page in paginator.paginate(Bucket=default_storage.bucket_name):
+                for obj in page.get("Contents", []):
+                    match = ATTACHMENT_KEY_PATTERN.match(obj["Key"])
+                    if not match:
+                        continue
+
+                    batch.append((match.group("document_id"), obj))
+                    if len(batch) >= options["batch_size"]:
+                        total += self._save_batch(executor, batch)
+                        batch = []
+
+            total += self._save_batch(executor, batch)
+
+        self.stdout.write(f"[INFO] {total:d} attachment(s) registered.")
+
+    @staticmethod
+    def _head_object(key):
+        """Return the metadata of an object or None if it does not exist anymore."""
+        try:
+            return get_s3_client().head_object(
+                Bucket=default_storage.bucket_name, Key=key
+            )
+        except ClientError:
+            return None
+
+    @staticmethod
+    def _get_owner_id(metadata):
+        """Return the id of the owner stored in the metadata, if any."""
+        try:
+            return uuid.UUID(metadata.get("owner", ""))
+        except ValueError:
+            return None
+
+    def _save_batch(self, executor, batch):
+        """Register the attachments of a batch that are missing from the table."""
+        keys = [obj["Key"] for _document_id, obj in batch]
+        registered_keys = set(
+            Attachment.objects.filter(key__in=keys).values_list("key", flat=True)
+        )
+        existing_document_ids = {
+            str(document_id)
+            for document_id in Document.objects.filter(
+                id__in={document_id for document_id, _obj in batch}
+            ).values_list("id", flat=True)
+        }
+        batch = [
+            (document_id, obj)
+            for document_id, obj in batch
+            if document_id in existing_document_ids
+            and obj["Key"] not in registered_keys
+        ]
+
+        heads = list(
+            executor.map(self._head_object, [obj["Key"] for _id, obj in batch])
+        )
+        metadatas = [
+            lowercase_keys(head.get("Metadata", {})) if head else None for head in heads
+        ]
+        existing_owner_ids = set(
+            User.objects.filter(
+                id__in={
+                    self._get_owner_id(metadata) for metadata in metadatas if metadata
+                }
+                - {None}
+            ).values_list("id", flat=True)
+        )
+
+        attachments = []
+        for (document_id, obj), head, metadata in zip(
+            batch, heads, metadatas, strict=True
+        ):
+            if head is None:
+                continue
+
+            owner_id = self._get_owner_id(metadata)
+            attachments.append(
+                Attachment(
+                    key=obj["Key"],
+                    document_id=document_id,
+                    # Attachments uploaded before the malware detection have no status
+                    status=metadata.get(
+                        "status", enums.DocumentAttachmentStatus.READY.value
+                    ),
+                    content_type=head.get("ContentType", ""),
+                    size=obj["Size"],
+                    owner_id=owner_id if owner_id in existing_owner_ids else None,
+                )
+            )
+
+        return len(Attachment.objects.bulk_create(attachments, ignore_conflicts=True))
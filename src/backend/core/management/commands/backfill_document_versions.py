@@ -0,0 +1,87 @@
+"""Management command filling the document versions catalogue from the object storage."""
+
+import re
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from core import enums
+from core.models import Document, DocumentVersion
+
+DOCUMENT_FILE_KEY_PATTERN = re.compile(f"^(?P<document_id>{enums.UUID_REGEX:s})/file$")
+
+
+class Command(BaseCommand):
+    """
+    Fill the document versions catalogue with the versions found in the object storage.
+    Versions already registered in the catalogue are ignored so it can be run again.
+    """
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Define the batch size of the versions inserted in the database."""
+        parser.add_argument(
+            "--batch-size",
+            action="store",
+            dest="batch_size",
+            type=int,
+            default=1000,
+            help="Number of versions inserted in the database at once",
+        )
+
+    def handle(self, *args, **options):
+        """Execute management command."""
+        s3_client = default_storage.connection.meta.client
+        paginator = s3_client.get_paginator("list_object_versions")
+
+        total = 0
+        batch = []
+        for page in paginator.paginate(Bucket=default_storage.bucket_name):
+            for version in page.get("Versions", []):
+                match = DOCUMENT_FILE_KEY_PATTERN.match(version["Key"])
+                # Skip other objects and objects stored before versioning was enabled
+                if not match or version["VersionId"] == "null":
+                    continue
+
+                batch.append((match.group("document_id"), version))
+                if len(batch) >= options["batch_size"]:
+                    total += self._save_batch(batch)
+                    batch = []
+
+        total += self._save_batch(batch)
+        self.stdout.write(f"[INFO] {total:d} version(s) registered in the catalogue.")
+
+    @staticmethod
+    def _save_batch(batch):
+        """Register the versions of a batch that are missing from the catalogue."""
+        document_ids = {document_id for document_id, _version in batch}
+        existing_ids = {
+            str(document_id)
+            for document_id in Document.objects.filter(id__in=document_ids).values_list(
+                "id", flat=True
+            )
+        }
+        registered = {
+            (str(document_id), version_id)
+            for document_id, version_id in DocumentVersion.objects.filter(
+                document_id__in=existing_ids,
+                version_id__in={version["VersionId"] for _id, version in batch},
+            ).values_list("document_id", "version_id")
+        }
+
+        versions = DocumentVersion.objects.bulk_create(
+            [
+                DocumentVersion(
+                    document_id=document_id,
+                    version_id=version["VersionId"],
+                    etag=version["ETag"],
+                    last_modified=version["LastModified"],
+                )
+                for document_id, version in batch
+                if document_id in existing_ids
+                and (document_id, version["VersionId"]) not in registered
+            ],
+            ignore_conflicts=True,
+        )
+        return len(versions)
@@ -0,0 +1,79 @@
+"""benchmark_sigv4_signing — time the signing of the S3 requests of media-auth.
+
+Compares the per-call cost of signing the GET request of an attachment with the
+precomputed ``S3AuthorizationSigner`` that ``media-auth`` uses with signing it
+through botocore as it used to do (presigning a URL, then running ``add_auth``
+of ``S3SigV4Auth`` on a request built from it).
+
+    python manage.py benchmark_sigv4_signing --number 2000
+
+Nothing is sent to the object storage: only the signing is timed.
+"""
+
+import timeit
+import uuid
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+import botocore
+
+from core.utils.s3 import (
+    get_s3_authorization_signer,
+    get_s3_client,
+    get_unsigned_s3_client,
+)
+
+
+def sign_with_botocore(key):
+    """Sign the GET request of an object the way media-auth used to do it."""
+    s3_client = get_s3_client()
+    url = get_unsigned_s3_client().generate_presigned_url(
+        "get_object",
+        ExpiresIn=0,
+        Params={"Bucket": default_storage.bucket_name, "Key": key},
+    )
+    request = botocore.awsrequest.AWSRequest(method="get", url=url)
+    botocore.auth.S3SigV4Auth(
+        # pylint: disable=protected-access
+        s3_client._request_signer._credentials.get_frozen_credentials(),  # noqa: SLF001
+        "s3",
+        s3_client.meta.region_name,
+    ).add_auth(request)
+    return dict(request.headers)
+
+
+class Command(BaseCommand):
+    """Time the signing of the S3 requests of media-auth."""
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Define command arguments."""
+        parser.add_argument(
+            "--number",
+            type=int,
+            default=2000,
+            help="Number of signatures per timing (default: 2000).",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=3,
+            help="Number of timings, the best one is kept (default: 3).",
+        )
+
+    def handle(self, *args, **options):
+        """Time both ways of signing the request of an attachment."""
+        number = options["number"]
+        key = f"{uuid.uuid4()!s}/attachments/{uuid.uuid4()!s}.png"
+        signer = get_s3_authorization_signer()
+
+        for name, sign in [
+            ("precomputed signer", lambda: signer.sign(key)),
+            ("botocore", lambda: sign_with_botocore(key)),
+        ]:
+            cost = min(timeit.repeat(sign, number=number, repeat=options["repeat"]))
+            self.stdout.write(
+                self.style.SUCCESS(f"{name:s}: {cost / number * 1e6:.1f}µs per call")
+            )
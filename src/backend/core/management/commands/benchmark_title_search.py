@@ -0,0 +1,101 @@
+# ruff: noqa: S311
+"""benchmark_title_search — time the title search of the database fallback.
+
+Compares, on the current database, the accent-insensitive title lookup that the
+document list and search endpoints used to run (``unaccent`` + ``UPPER LIKE``,
+which no index serves) with the ``unaccent_icontains`` lookup served by the
+``document_title_unaccent_trgm`` GIN trigram index.
+
+    python manage.py benchmark_title_search --queries 50
+
+Queries are substrings of random document titles, so run it against a database
+at production scale, e.g. one built with ``generate_volumetry``; on a small table
+PostgreSQL prefers a sequential scan and both lookups take the same time. The
+plan of the first query of each lookup is printed, to check the index is used.
+"""
+
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import models
+
+LOOKUPS = {
+    "unaccent__icontains": "title__unaccent__icontains",
+    "unaccent_icontains (trigram index)": "title__unaccent_icontains",
+}
+
+
+class Command(BaseCommand):
+    """Time the title search lookups of the database fallback."""
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Define command arguments."""
+        parser.add_argument(
+            "--queries",
+            type=int,
+            default=50,
+            help="Number of title substrings to search (default: 50).",
+        )
+        parser.add_argument(
+            "--length",
+            type=int,
+            default=5,
+            help="Length of the title substrings to search (default: 5).",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="RNG seed for reproducible runs (default: 0).",
+        )
+
+    def handle(self, *args, **options):
+        """Sample the queries, then time each lookup on them."""
+        rng = random.Random(options["seed"])
+        length = options["length"]
+        titles = (
+            models.Document.objects.filter(title__isnull=False)
+            .order_by("?")
+            .values_list("title", flat=True)[: options["queries"]]
+        )
+        queries = []
+        for title in titles:
+            start = rng.randrange(max(len(title) - length, 0) + 1)
+            queries.append(title[start : start + length])
+
+        if not queries:
+            raise CommandError("No titled document to search, generate some first.")
+
+        self.stdout.write(
+            f"Searching {len(queries):d} substrings among "
+            f"{models.Document.objects.count():d} documents"
+        )
+        for name, lookup in LOOKUPS.items():
+            self._benchmark(name, lookup, queries)
+
+    def _benchmark(self, name, lookup, queries):
+        """Time the count of the documents matching each query with a lookup."""
+        self.stdout.write(f"\n{name:s}")
+        self.stdout.write(
+            models.Document.objects.filter(**{lookup: queries[0]}).explain()
+        )
+
+        durations = []
+        for query in queries:
+            start = time.perf_counter()
+            models.Document.objects.filter(**{lookup: query}).count()
+            durations.append((time.perf_counter() - start) * 1000)
+
+        durations.sort()
+        p95 = durations[min(round(len(durations) * 0.95), len(durations) - 1)]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"median {statistics.median(durations):.1f} ms, "
+                f"p95 {p95:.1f} ms, max {durations[-1]:.1f} ms"
+            )
+        )
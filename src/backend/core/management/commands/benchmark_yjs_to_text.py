@@ -0,0 +1,121 @@
+"""benchmark_yjs_to_text — time the text extraction of yjs documents.
+
+Compares the per-document cost of ``base64_yjs_to_text``, which streams the
+text out of the XML of the document, with the previous extraction building a
+soup, over a corpus of generated documents of varying size:
+
+    python manage.py benchmark_yjs_to_text --blocks 10 100 1000
+
+The parsed documents cache is disabled while timing so that the extraction is
+measured, not the memo.
+"""
+
+import base64
+import random
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+import pycrdt
+from bs4 import BeautifulSoup
+
+from core.utils.yjs import base64_yjs_to_text, base64_yjs_to_xml
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "élément", "naïve", "42"]
+
+
+def generate_blocknote_ydoc(blocks_count, seed=0):
+    """
+    Generate a base64 yjs document structured like the ones of the blocknote
+    editor, with nested blocks of formatted text.
+    """
+    rng = random.Random(seed)  # noqa: S311
+
+    ydoc = pycrdt.Doc()
+    block_group = pycrdt.XmlElement("blockGroup")
+    ydoc["document-store"] = pycrdt.XmlFragment([block_group])
+    for i in range(blocks_count):
+        container = pycrdt.XmlElement("blockContainer", {"id": str(i)})
+        block_group.children.append(container)
+        block = pycrdt.XmlElement(
+            rng.choice(["paragraph", "heading", "bulletListItem"]),
+            {"textAlignment": "left"},
+        )
+        container.children.append(block)
+        text = pycrdt.XmlText()
+        block.children.append(text)
+        for _ in range(rng.randint(1, 5)):
+            run = " ".join(rng.choices(WORDS, k=rng.randint(1, 12)))
+            attributes = rng.choice([None, None, {"bold": {}}, {"italic": {}}])
+            text.insert(len(text), f"{run:s} ", attributes)
+        if i % 10 == 9:
+            children = pycrdt.XmlElement("blockGroup")
+            container.children.append(children)
+            children.children.append(
+                pycrdt.XmlElement(
+                    "blockContainer",
+                    {"id": f"{i:d}-child"},
+                    [pycrdt.XmlElement("paragraph", {}, [pycrdt.XmlText("child")])],
+                )
+            )
+
+    return base64.b64encode(ydoc.get_update()).decode("utf-8")
+
+
+def base64_yjs_to_text_with_soup(base64_string):
+    """Previous implementation of the text extraction, building a soup."""
+    soup = BeautifulSoup(base64_yjs_to_xml(base64_string), "lxml-xml")
+    return soup.get_text(separator=" ", strip=True)
+
+
+class Command(BaseCommand):
+    """Time the text extraction of yjs documents."""
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Define command arguments."""
+        parser.add_argument(
+            "--blocks",
+            type=int,
+            nargs="+",
+            default=[10, 100, 1000],
+            help="Number of blocks of the generated documents (default: 10 100 1000).",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=3,
+            help="Number of timings, the best one is kept (default: 3).",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Seed of the generated documents (default: 0).",
+        )
+
+    @override_settings(YJS_PARSED_CACHE_MAX_SIZE=0)
+    def handle(self, *args, **options):
+        """Time both extractions on a document of each size."""
+        for blocks_count in options["blocks"]:
+            content = generate_blocknote_ydoc(blocks_count, seed=options["seed"])
+            number = max(1, 1000 // blocks_count)
+            stream_cost, soup_cost = (
+                min(
+                    timeit.repeat(
+                        lambda e=extract, c=content: e(c),
+                        number=number,
+                        repeat=options["repeat"],
+                    )
+                )
+                for extract in [base64_yjs_to_text, base64_yjs_to_text_with_soup]
+            )
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{blocks_count:>5d} blocks ({len(content):>8d} bytes): "
+                    f"{stream_cost / number * 1e3:8.2f}ms streaming the XML, "
+                    f"{soup_cost / number * 1e3:8.2f}ms building a soup"
+                )
+            )
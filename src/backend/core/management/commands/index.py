@@ -2,16 +2,38 @@
 Handle search setup that needs to be done at bootstrap time.
 """
 
+import argparse
 import logging
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
+from django.core.exceptions import ImproperlyConfigured
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 
+from core import models
 from core.services.search_indexers import get_document_indexer
 
 logger = logging.getLogger("docs.search.bootstrap_search")
 
 
+def parse_since(value):
+    """Parse the --since option as an ISO 8601 datetime."""
+    since = parse_datetime(value)
+    if since is None:
+        raise argparse.ArgumentTypeError(f"{value:s} is not a valid ISO 8601 datetime")
+    return since
+
+
+def get_id_ranges(count):
+    """Split the range of UUIDs in `count` consecutive ranges of the same size."""
+    bounds = [uuid.UUID(int=index * (1 << 128) // count) for index in range(count)]
+    return list(zip(bounds, [*bounds[1:], None], strict=True))
+
+
 class Command(BaseCommand):
     """Index all documents to remote search service"""
 
@@ -27,6 +49,31 @@ class Command(BaseCommand):
             default=50,
             help="Indexation query batch size",
         )
+        parser.add_argument(
+            "--since",
+            action="store",
+            dest="since",
+            type=parse_since,
+            default=None,
+            help="Only index the documents updated or deleted since this datetime",
+        )
+        parser.add_argument(
+            "--only-changed",
+            action="store_true",
+            dest="only_changed",
+            help=(
+                "Skip the documents unchanged since they were last indexed and "
+                "delete the documents that do not exist anymore from the index"
+            ),
+        )
+        parser.add_argument(
+            "--parallel",
+            action="store",
+            dest="parallel",
+            type=int,
+            default=1,
+            help="Number of ranges of documents indexed in parallel",
+        )
 
     def handle(self, *args, **options):
         """Launch and log search index generation."""
@@ -37,16 +84,65 @@ class Command(BaseCommand):
 
         logger.info("Starting to regenerate Find index...")
         start = time.perf_counter()
-        batch_size = options["batch_size"]
+
+        queryset = models.Document.objects.all()
+        if since := options["since"]:
+            queryset = queryset.filter(
+                Q(updated_at__gte=since)
+                | Q(deleted_at__gte=since)
+                | Q(ancestors_deleted_at__gte=since)
+            )
 
         try:
-            count = indexer.index(batch_size=batch_size)
+            if options["parallel"] > 1:
+                with ThreadPoolExecutor(max_workers=options["parallel"]) as executor:
+                    count = sum(
+                        executor.map(
+                            lambda id_range: self._index_range(
+                                indexer, queryset, id_range, options
+                            ),
+                            get_id_ranges(options["parallel"]),
+                        )
+                    )
+            else:
+                count = indexer.index(
+                    queryset,
+                    batch_size=options["batch_size"],
+                    only_changed=options["only_changed"],
+                )
         except Exception as err:
             raise CommandError("Unable to regenerate index") from err
 
+        if options["only_changed"]:
+            try:
+                deleted = indexer.delete_vanished()
+            except (NotImplementedError, ImproperlyConfigured) as err:
+                logger.warning("Deleted documents were not removed: %s", err)
+            except Exception as err:
+                raise CommandError("Unable to delete documents from index") from err
+            else:
+                logger.info("%d deleted document(s) removed from index.", deleted)
+
         duration = time.perf_counter() - start
         logger.info(
             "Search index regenerated from %d document(s) in %.2f seconds.",
             count,
             duration,
         )
+
+    @staticmethod
+    def _index_range(indexer, queryset, id_range, options):
+        """Index the documents of a range of ids, in its own database connection."""
+        lower, upper = id_range
+        queryset = queryset.filter(id__gte=lower)
+        if upper is not None:
+            queryset = queryset.filter(id__lt=upper)
+
+        try:
+            return indexer.index(
+                queryset,
+                batch_size=options["batch_size"],
+                only_changed=options["only_changed"],
+            )
+        finally:
+            connection.close()
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0035_attachment"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DocumentIndexingChange",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "include_descendants",
+                    models.BooleanField(
+                        default=False,
+                        help_text="Whether the descendants of the document must be indexed too.",
+                        verbose_name="include descendants",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="created on"),
+                ),
+                (
+                    "document",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="indexing_changes",
+                        to="core.document",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Document indexing change",
+                "verbose_name_plural": "Document indexing changes",
+                "db_table": "impress_document_indexing_change",
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:25
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0036_document_indexing_change"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DocumentIndexFingerprint",
+            fields=[
+                ("document_id", models.UUIDField(primary_key=True, serialize=False)),
+                (
+                    "fingerprint",
+                    models.CharField(max_length=64, verbose_name="fingerprint"),
+                ),
+                (
+                    "indexed_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="indexed on"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Document index fingerprint",
+                "verbose_name_plural": "Document index fingerprints",
+                "db_table": "impress_document_index_fingerprint",
+            },
+        ),
+    ]
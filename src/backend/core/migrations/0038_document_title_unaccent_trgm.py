@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:35
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+import core.lookups
+
+
+class Migration(migrations.Migration):
+    # The index is built without locking the table against writes
+    atomic = False
+
+    dependencies = [
+        ("core", "0037_document_index_fingerprint"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="document",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    core.lookups.ImmutableUnaccent("title"), name="gin_trgm_ops"
+                ),
+                name="document_title_unaccent_trgm",
+            ),
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:39
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0038_document_title_unaccent_trgm"),
+    ]
+
+    operations = [
+        # Text search configuration of the PostgreSQL search indexer: words are
+        # unaccented but not stemmed, documents being written in several languages
+        migrations.RunSQL(
+            sql="""
+                CREATE TEXT SEARCH CONFIGURATION public.docs_search
+                (COPY = pg_catalog.simple);
+
+                ALTER TEXT SEARCH CONFIGURATION public.docs_search
+                ALTER MAPPING FOR hword, hword_part, word WITH unaccent, simple;
+            """,
+            reverse_sql="DROP TEXT SEARCH CONFIGURATION IF EXISTS public.docs_search;",
+        ),
+        migrations.CreateModel(
+            name="DocumentSearchEntry",
+            fields=[
+                ("document_id", models.UUIDField(primary_key=True, serialize=False)),
+                (
+                    "path",
+                    models.CharField(db_collation="C", db_index=True, max_length=252),
+                ),
+                ("title", models.TextField(blank=True, verbose_name="title")),
+                ("content", models.TextField(blank=True, verbose_name="content")),
+                (
+                    "users",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.TextField(),
+                        blank=True,
+                        default=list,
+                        size=None,
+                    ),
+                ),
+                (
+                    "teams",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.TextField(),
+                        blank=True,
+                        default=list,
+                        size=None,
+                    ),
+                ),
+                (
+                    "reach",
+                    models.CharField(
+                        choices=[
+                            ("restricted", "Restricted"),
+                            ("authenticated", "Authenticated"),
+                            ("public", "Public"),
+                        ],
+                        default="restricted",
+                        max_length=20,
+                    ),
+                ),
+                ("is_active", models.BooleanField(default=True)),
+                ("updated_at", models.DateTimeField(verbose_name="updated on")),
+                (
+                    "search_vector",
+                    models.GeneratedField(
+                        db_persist=True,
+                        expression=django.contrib.postgres.search.CombinedSearchVector(
+                            django.contrib.postgres.search.SearchVector(
+                                "title", config="docs_search", weight="A"
+                            ),
+                            "||",
+                            django.contrib.postgres.search.SearchVector(
+                                "content", config="docs_search", weight="B"
+                            ),
+                            django.contrib.postgres.search.SearchConfig("docs_search"),
+                        ),
+                        output_field=django.contrib.postgres.search.SearchVectorField(),
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Document search entry",
+                "verbose_name_plural": "Document search entries",
+                "db_table": "impress_document_search_entry",
+                "indexes": [
+                    django.contrib.postgres.indexes.GinIndex(
+                        fields=["search_vector"], name="document_search_vector"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0039_documentsearchentry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="documentindexingchange",
+            name="claimed_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When an indexing task claimed the change.",
+                null=True,
+                verbose_name="claimed on",
+            ),
+        ),
+        migrations.AddField(
+            model_name="documentindexingchange",
+            name="claimed_by",
+            field=models.UUIDField(
+                blank=True,
+                help_text="Identifier of the indexing run that claimed the change.",
+                null=True,
+                verbose_name="claimed by",
+            ),
+        ),
+    ]
@@ -7,17 +7,19 @@ Declare and configure the models for the impress core application
 import hashlib
 import smtplib
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
+from functools import partial
 from logging import getLogger
 
 from django.conf import settings
 from django.contrib.auth import models as auth_models
 from django.contrib.auth.base_user import AbstractBaseUser
 from django.contrib.postgres.fields import ArrayField
-from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.contrib.sites.models import Site
 from django.core.cache import cache
-from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from django.core.mail import send_mail
 from django.db import models, transaction
@@ -41,6 +43,12 @@ from core.choices import (
     RoleChoices,
     get_equivalent_link_definition,
 )
+from core.enums import DocumentAttachmentStatus
+from core.lookups import ImmutableUnaccent
+from core.utils import media_auth as media_auth_cache
+from core.utils import search_queue
+from core.utils.dicts import lowercase_keys
+from core.utils.s3 import get_s3_client
 from core.utils.treebeard import create_tree_node_with_retry
 from core.validators import sub_validator
 
@@ -61,6 +69,37 @@ def get_trashbin_cutoff():
     return timezone.now() - timedelta(days=settings.TRASHBIN_CUTOFF_DAYS)
 
 
+def get_versions_min_datetime_cache_key(document_id):
+    """Cache key of the dates from which users can see the versions of a document."""
+    return f"docs:versions-min-datetime:{document_id!s}"
+
+
+def get_versions_min_datetime_tree_cache_key(path):
+    """
+    Cache key of the generation of the dates from which users can see the versions
+    of the documents of the tree including this path.
+    """
+    return f"docs:versions-min-datetime-tree:{path[: Document.steplen]:s}"
+
+
+def _renew_versions_min_datetime_trees(cache_keys):
+    # Generations only need to outlive the dates cached before their renewal
+    cache.set_many(
+        {cache_key: uuid.uuid4().hex for cache_key in cache_keys},
+        timeout=2 * settings.DOCUMENT_VERSIONS_MIN_DATETIME_CACHE_TIMEOUT,
+    )
+
+
+def get_visited_document_ids_cache_key(user_id):
+    """Cache key of the ids of the documents a user visited without an access."""
+    return f"docs:visited-document-ids:{user_id!s}"
+
+
+def get_typeahead_cache_key(user_id):
+    """Cache key of the typeahead candidates of a user."""
+    return f"docs:typeahead:{user_id!s}"
+
+
 class DuplicateEmailError(Exception):
     """Raised when an email is already associated with a pre-existing user."""
 
@@ -309,6 +348,7 @@ class User(AbstractBaseUser, BaseModel, auth_models.PermissionsMixin):
                 )
 
             LinkTrace.objects.bulk_create(onboarding_link_traces)
+            cache.delete(get_visited_document_ids_cache_key(self.id))
             DocumentFavorite.objects.bulk_create(favorite_documents)
 
     def _duplicate_onboarding_sandbox_document(self):
@@ -545,6 +585,14 @@ class UserReconciliation(BaseModel):
         Thread.objects.bulk_update(updated_threads, ["creator"])
         Comment.objects.bulk_update(updated_comments, ["user"])
 
+        # Bulk operations do not send the signals invalidating the visited documents
+        cache.delete_many(
+            [
+                get_visited_document_ids_cache_key(self.active_user_id),
+                get_visited_document_ids_cache_key(self.inactive_user_id),
+            ]
+        )
+
         # pylint: disable=C0103
         ReactionThroughModel = Reaction.users.through
         reactions_to_create = []
@@ -991,6 +1039,11 @@ class Document(MP_Node, BaseModel):
             # Used by media-auth to find the document(s) holding an attachment
             # key without scanning the table (attachments @> [key]).
             GinIndex(fields=["attachments"], name="document_attachments_gin"),
+            # Used by the accent insensitive searches on titles (title__unaccent_icontains)
+            GinIndex(
+                OpClass(ImmutableUnaccent("title"), name="gin_trgm_ops"),
+                name="document_title_unaccent_trgm",
+            ),
         ]
         constraints = [
             models.CheckConstraint(
@@ -1041,8 +1094,39 @@ class Document(MP_Node, BaseModel):
             )
 
         if has_changed:
-            content_file = ContentFile(bytes_content)
-            default_storage.save(file_key, content_file)
+            # Write with the client rather than the storage to get the version
+            # created by this write, even if other saves happen concurrently.
+            response = default_storage.connection.meta.client.put_object(
+                Bucket=default_storage.bucket_name, Key=file_key, Body=bytes_content
+            )
+            self.record_version(response)
+
+    def record_version(self, response):
+        """
+        Register the version created by a write of the content in the versions
+        catalogue so versions can be listed without calling the object storage.
+        """
+        version_id = response.get("VersionId")
+        # Versioning is not enabled on the bucket
+        if not version_id or version_id == "null":
+            return
+
+        # The modification date is not returned by the write: read the one of the
+        # object storage, to which the versions are compared when they are retrieved
+        head = default_storage.connection.meta.client.head_object(
+            Bucket=default_storage.bucket_name, Key=self.file_key, VersionId=version_id
+        )
+        DocumentVersion.objects.bulk_create(
+            [
+                DocumentVersion(
+                    document=self,
+                    version_id=version_id,
+                    etag=response["ETag"],
+                    last_modified=head["LastModified"],
+                )
+            ],
+            ignore_conflicts=True,
+        )
 
     def is_leaf(self):
         """
@@ -1111,6 +1195,11 @@ class Document(MP_Node, BaseModel):
             else settings.DOCUMENT_VERSIONS_PAGE_SIZE
         )
 
+        if settings.DOCUMENT_VERSIONS_CATALOGUE_ENABLED:
+            return self._get_versions_slice_from_catalogue(
+                from_version_id, min_datetime or self.created_at, real_page_size
+            )
+
         response = default_storage.connection.meta.client.list_object_versions(
             Bucket=default_storage.bucket_name,
             Prefix=self.file_key,
@@ -1152,11 +1241,120 @@ class Document(MP_Node, BaseModel):
             "count": count,
         }
 
+    def _get_versions_slice_from_catalogue(
+        self, from_version_id, min_last_modified, page_size
+    ):
+        """
+        Same as `get_versions_slice` but reading the versions catalogue with a keyset
+        pagination: versions are filtered by date in the database so pages are always
+        full, and the object storage is not called.
+        """
+        ordering = ("-last_modified", "-version_id")
+        latest_version_id = (
+            self.versions.order_by(*ordering)
+            .values_list("version_id", flat=True)
+            .first()
+        )
+        queryset = self.versions.filter(last_modified__gte=min_last_modified).exclude(
+            version_id=latest_version_id
+        )
+
+        if from_version_id:
+            marker = self.versions.filter(version_id=from_version_id).first()
+            if marker is None:
+                queryset = queryset.none()
+            else:
+                queryset = queryset.filter(
+                    models.Q(last_modified__lt=marker.last_modified)
+                    | models.Q(
+                        last_modified=marker.last_modified,
+                        version_id__lt=marker.version_id,
+                    )
+                )
+
+        versions = list(
+            queryset.order_by(*ordering).values("etag", "last_modified", "version_id")[
+                : page_size + 1
+            ]
+        )
+        results = [
+            {
+                "etag": version["etag"],
+                "is_latest": False,
+                "last_modified": version["last_modified"],
+                "version_id": version["version_id"],
+            }
+            for version in versions[:page_size]
+        ]
+
+        count = len(results)
+        is_truncated = count < len(versions)
+        return {
+            "next_version_id_marker": results[-1]["version_id"] if is_truncated else "",
+            "is_truncated": is_truncated,
+            "versions": results,
+            "count": count,
+        }
+
     def delete_version(self, version_id):
         """Delete a version from object storage given its version id"""
-        return default_storage.connection.meta.client.delete_object(
+        response = default_storage.connection.meta.client.delete_object(
             Bucket=default_storage.bucket_name, Key=self.file_key, VersionId=version_id
         )
+        self.versions.filter(version_id=version_id).delete()
+        return response
+
+    def get_versions_min_datetime(self, user):
+        """
+        Return the date at which the user first got a specific access to the document
+        or one of its ancestors. Versions older than this date should not be visible.
+
+        Dates are cached per document in a mapping of user ids, along with the
+        generation of the tree of the document, renewed when an access of the tree
+        changes or when a document is moved in or out of it. Changes in the teams of
+        a user rely on the cache expiration.
+        """
+        cache_key = get_versions_min_datetime_cache_key(self.id)
+        tree_cache_key = get_versions_min_datetime_tree_cache_key(self.path)
+        cached = cache.get_many([cache_key, tree_cache_key])
+        generation = cached.get(tree_cache_key)
+        min_datetimes = {}
+        if cache_key in cached and cached[cache_key]["generation"] == generation:
+            min_datetimes = cached[cache_key]["min_datetimes"]
+
+        try:
+            return min_datetimes[str(user.id)]
+        except KeyError:
+            pass
+
+        min_datetime = DocumentAccess.objects.filter(
+            models.Q(user=user) | models.Q(team__in=user.teams),
+            document__path=Left(models.Value(self.path), Length("document__path")),
+        ).aggregate(min_date=models.Min("created_at"))["min_date"]
+
+        # Don't cache the absence of access: it is not invalidated by team accesses
+        if min_datetime:
+            min_datetimes[str(user.id)] = min_datetime
+            cache.set(
+                cache_key,
+                {"generation": generation, "min_datetimes": min_datetimes},
+                settings.DOCUMENT_VERSIONS_MIN_DATETIME_CACHE_TIMEOUT,
+            )
+
+        return min_datetime
+
+    def invalidate_versions_min_datetime_cache(self):
+        """
+        Invalidate the dates from which users can see versions on the tree of the
+        document, e.g. when an access changes or the document is moved.
+
+        The generation of the tree is renewed right away and again once the current
+        transaction is committed, so that dates read meanwhile from the previous
+        state of the database are not kept.
+        """
+        cache_keys = {get_versions_min_datetime_tree_cache_key(self.path)}
+        _renew_versions_min_datetime_trees(cache_keys)
+        transaction.on_commit(partial(_renew_versions_min_datetime_trees, cache_keys))
 
     def get_nb_accesses_cache_key(self):
         """Generate a unique cache key for each document."""
@@ -1207,6 +1405,67 @@ class Document(MP_Node, BaseModel):
             cache_key = document.get_nb_accesses_cache_key()
             cache.delete(cache_key)
 
+    def invalidate_media_auth_cache(self):
+        """
+        Invalidate the media-auth decisions involving the tree of the document, e.g.
+        when the accesses or the link configuration of the document change.
+        """
+        media_auth_cache.invalidate_trees(self.path)
+
+    def invalidate_typeahead_cache(self):
+        """
+        Invalidate the typeahead candidates of the users who have access to or visited
+        the document, one of its ancestors or descendants, e.g. when the document is
+        moved or its link reach changes. Team members see the change once their
+        candidates expire.
+        """
+        documents = models.Q(
+            document__path=Left(models.Value(self.path), Length("document__path"))
+        ) | models.Q(document__path__startswith=self.path)
+        user_ids = {
+            *DocumentAccess.objects.filter(documents, user__isnull=False).values_list(
+                "user_id", flat=True
+            ),
+            *LinkTrace.objects.filter(documents).values_list("user_id", flat=True),
+        }
+        cache.delete_many([get_typeahead_cache_key(user_id) for user_id in user_ids])
+
+    def record_indexing_change(self, include_descendants=False):
+        """
+        Record in the indexing journal that the document changed, in the current
+        transaction, and trigger the indexer once it is committed.
+        `include_descendants` should be set when the change also affects how the
+        descendants are indexed, e.g. accesses or link configuration.
+        """
+        if not settings.SEARCH_INDEXER_CLASS or not self.pk:
+            return
+
+        # pylint: disable-next=import-outside-toplevel
+        from core.tasks.search import trigger_batch_document_indexer  # noqa: PLC0415
+
+        DocumentIndexingChange.objects.create(
+            document_id=self.pk, include_descendants=include_descendants
+        )
+        # Queued right away so that the changes of a transaction are indexed together
+        if settings.SEARCH_INDEXER_COUNTDOWN > 0:
+            search_queue.mark_dirty([self.pk], settings.SEARCH_INDEXER_COUNTDOWN)
+        transaction.on_commit(partial(trigger_batch_document_indexer, self))
+
+    def move(self, target, pos=None):
+        """
+        Invalidate the media-auth decisions, the typeahead candidates and the dates
+        from which users can see versions involving both trees, and reindex the
+        subtree when moving a document.
+        """
+        media_auth_cache.invalidate_trees(self.path, target.path)
+        self.invalidate_versions_min_datetime_cache()
+        target.invalidate_versions_min_datetime_cache()
+        self.invalidate_typeahead_cache()
+        target.invalidate_typeahead_cache()
+        with transaction.atomic():
+            super().move(target, pos=pos)
+            self.record_indexing_change(include_descendants=True)
+
     def get_role(self, user):
         """Return the roles a user has on a document."""
         if not user.is_authenticated:
@@ -1507,6 +1766,8 @@ class Document(MP_Node, BaseModel):
         self.ancestors_deleted_at = self.deleted_at = timezone.now()
         self.save()
         self.invalidate_nb_accesses_cache()
+        self.invalidate_media_auth_cache()
+        self.record_indexing_change(include_descendants=True)
 
         if self.depth > 1:
             self._meta.model.objects.filter(pk=self.get_parent().pk).update(
@@ -1551,6 +1812,8 @@ class Document(MP_Node, BaseModel):
         self.ancestors_deleted_at = ancestors_deleted_at
         self.save(update_fields=["deleted_at", "ancestors_deleted_at"])
         self.invalidate_nb_accesses_cache()
+        self.invalidate_media_auth_cache()
+        self.record_indexing_change(include_descendants=True)
 
         self.get_descendants().exclude(
             models.Q(deleted_at__isnull=False)
@@ -1563,6 +1826,254 @@ class Document(MP_Node, BaseModel):
             )
 
 
+class DocumentVersion(BaseModel):
+    """
+    Catalogue of the versions of a document's content stored in object storage.
+
+    It mirrors the versions of the versioned bucket so they can be listed and
+    paginated by date without calling `list_object_versions`.
+    """
+
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.CASCADE,
+        related_name="versions",
+    )
+    version_id = models.CharField(_("version id"), max_length=1024)
+    etag = models.CharField(_("etag"), max_length=255)
+    last_modified = models.DateTimeField(_("last modified"))
+
+    class Meta:
+        db_table = "impress_document_version"
+        verbose_name = _("Document version")
+        verbose_name_plural = _("Document versions")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["document", "version_id"],
+                name="unique_document_version",
+                violation_error_message=_("This version already exists."),
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["document", "-last_modified", "-version_id"],
+                name="document_version_keyset_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Version {self.version_id:s} of document {self.document_id!s}"
+
+
+class Attachment(BaseModel):
+    """
+    File uploaded as an attachment of a document and stored in object storage.
+
+    The status of the attachment is kept here so that it can be checked without
+    reading the metadata of the object in object storage.
+    """
+
+    key = models.CharField(_("key"), max_length=255, unique=True)
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.CASCADE,
+        related_name="attachment_files",
+    )
+    status = models.CharField(
+        _("status"),
+        max_length=20,
+        choices=[(status.value, status.value) for status in DocumentAttachmentStatus],
+        default=DocumentAttachmentStatus.PROCESSING.value,
+    )
+    content_type = models.CharField(_("content type"), max_length=255, blank=True)
+    size = models.PositiveBigIntegerField(_("size"), null=True, blank=True)
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        related_name="attachments",
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        db_table = "impress_attachment"
+        verbose_name = _("Attachment")
+        verbose_name_plural = _("Attachments")
+
+    def __str__(self):
+        return self.key
+
+    @classmethod
+    def get_status(cls, key, default=DocumentAttachmentStatus.READY.value):
+        """Return the status of an attachment or None if it does not exist."""
+        return cls.get_statuses([key], default=default)[key]
+
+    @classmethod
+    def get_statuses(cls, keys, default=DocumentAttachmentStatus.READY.value):
+        """
+        Return a dict of the statuses of attachments, None for attachments that do
+        not exist.
+
+        Statuses are resolved from the cache of ready attachments, then from this
+        table. Attachments uploaded before this table existed (see the
+        `backfill_attachments` command) fall back on the metadata of their object
+        in object storage, read concurrently in a bounded thread pool, `default`
+        being the status of objects without metadata.
+        """
+        statuses = dict.fromkeys(
+            media_auth_cache.get_ready_attachments(keys),
+            DocumentAttachmentStatus.READY.value,
+        )
+
+        missing_keys = [key for key in keys if key not in statuses]
+        if missing_keys:
+            statuses.update(
+                cls.objects.filter(key__in=missing_keys).values_list("key", "status")
+            )
+
+        missing_keys = [key for key in keys if key not in statuses]
+        if len(missing_keys) == 1:
+            statuses[missing_keys[0]] = cls._get_object_status(missing_keys[0], default)
+        elif missing_keys:
+            max_workers = min(len(missing_keys), settings.ATTACHMENT_STATUS_MAX_WORKERS)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                statuses.update(
+                    zip(
+                        missing_keys,
+                        executor.map(
+                            cls._get_object_status,
+                            missing_keys,
+                            [default] * len(missing_keys),
+                        ),
+                        strict=True,
+                    )
+                )
+
+        return statuses
+
+    @staticmethod
+    def _get_object_status(key, default):
+        """Return the status stored in the metadata of an object, None if missing."""
+        try:
+            head_resp = get_s3_client().head_object(
+                Bucket=default_storage.bucket_name, Key=key
+            )
+        except ClientError:
+            return None
+
+        return lowercase_keys(head_resp.get("Metadata", {})).get("status", default)
+
+
+class DocumentIndexingChange(models.Model):
+    """
+    Journal of the changes of documents to send to the search indexer.
+
+    Rows are written in the transaction of the change and consumed in the order
+    they were written, hence the auto-incremented primary key, by the indexing
+    task that claims them for a while and deletes them once the documents are
+    pushed. Rows whose claim expired, their task having died, are claimed again.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.CASCADE,
+        related_name="indexing_changes",
+    )
+    include_descendants = models.BooleanField(
+        _("include descendants"),
+        default=False,
+        help_text=_("Whether the descendants of the document must be indexed too."),
+    )
+    created_at = models.DateTimeField(_("created on"), auto_now_add=True)
+    claimed_at = models.DateTimeField(
+        _("claimed on"),
+        null=True,
+        blank=True,
+        help_text=_("When an indexing task claimed the change."),
+    )
+    claimed_by = models.UUIDField(
+        _("claimed by"),
+        null=True,
+        blank=True,
+        help_text=_("Identifier of the indexing run that claimed the change."),
+    )
+
+    class Meta:
+        db_table = "impress_document_indexing_change"
+        verbose_name = _("Document indexing change")
+        verbose_name_plural = _("Document indexing changes")
+
+    def __str__(self):
+        return f"Indexing change {self.id:d} of document {self.document_id!s}"
+
+
+class DocumentIndexFingerprint(models.Model):
+    """
+    Fingerprint of the state of a document when it was last pushed to the search
+    indexer, to skip unchanged documents when reindexing.
+
+    It is not a foreign key so that fingerprints outlive the documents deleted
+    from the database, which must then be deleted from the search index.
+    """
+
+    document_id = models.UUIDField(primary_key=True)
+    fingerprint = models.CharField(_("fingerprint"), max_length=64)
+    indexed_at = models.DateTimeField(_("indexed on"), default=timezone.now)
+
+    class Meta:
+        db_table = "impress_document_index_fingerprint"
+        verbose_name = _("Document index fingerprint")
+        verbose_name_plural = _("Document index fingerprints")
+
+    def __str__(self):
+        return f"Index fingerprint of document {self.document_id!s}"
+
+
+class DocumentSearchEntry(models.Model):
+    """
+    Text and accesses of a document as indexed by the PostgreSQL search indexer,
+    searched by full-text instead of the Find app.
+
+    Like index fingerprints, it is not a foreign key: entries of the documents
+    deleted from the database are deleted by the indexer.
+    """
+
+    document_id = models.UUIDField(primary_key=True)
+    path = models.CharField(max_length=7 * 36, db_collation="C", db_index=True)
+    title = models.TextField(_("title"), blank=True)
+    content = models.TextField(_("content"), blank=True)
+    users = ArrayField(models.TextField(), default=list, blank=True)
+    teams = ArrayField(models.TextField(), default=list, blank=True)
+    reach = models.CharField(
+        max_length=20,
+        choices=LinkReachChoices.choices,
+        default=LinkReachChoices.RESTRICTED,
+    )
+    is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(_("updated on"))
+    # Titles weigh more than contents. The "docs_search" configuration created by
+    # migration 0039 ignores accents and does not stem words: documents are written
+    # in several languages.
+    search_vector = models.GeneratedField(
+        expression=SearchVector("title", weight="A", config="docs_search")
+        + SearchVector("content", weight="B", config="docs_search"),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        db_table = "impress_document_search_entry"
+        verbose_name = _("Document search entry")
+        verbose_name_plural = _("Document search entries")
+        indexes = [
+            GinIndex(fields=["search_vector"], name="document_search_vector"),
+        ]
+
+    def __str__(self):
+        return f"Search entry of document {self.document_id!s}"
+
+
 class LinkTrace(BaseModel):
     """
     Relation model to trace accesses to a document via a link by a logged-in user.
@@ -1668,6 +2179,8 @@ class DocumentAccess(BaseAccess):
         """Override save to clear the document's cache for number of accesses."""
         super().save(*args, **kwargs)
         self.document.invalidate_nb_accesses_cache()
+        self.document.invalidate_media_auth_cache()
+        self.document.invalidate_versions_min_datetime_cache()
 
     @property
     def target_key(self):
@@ -1678,6 +2191,8 @@ class DocumentAccess(BaseAccess):
         """Override delete to clear the document's cache for number of accesses."""
         super().delete(*args, **kwargs)
         self.document.invalidate_nb_accesses_cache()
+        self.document.invalidate_media_auth_cache()
+        self.document.invalidate_versions_min_datetime_cache()
 
     def set_user_roles_tuple(self, ancestors_role, current_role):
         """
@@ -1,25 +1,63 @@
 """Document search index management utilities and indexers"""
 
+import gzip
+import hashlib
+import json
 import logging
+import random
+import threading
+import time
+import uuid
 from abc import ABC, abstractmethod
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
 from functools import cache
+from http import HTTPStatus
 
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.core.cache import cache as django_cache
 from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.html import escape
 from django.utils.module_loading import import_string
 
 import requests
+from requests.adapters import HTTPAdapter
 
 from core import models
 from core.enums import SearchType
 from core.utils.dicts import get_value_by_pattern
-from core.utils.paths import get_ancestor_to_descendants_map
-from core.utils.yjs import base64_yjs_to_text
+from core.utils.yjs import base64_yjs_to_text, base64_yjs_to_text_many
 
 logger = logging.getLogger(__name__)
 
+# Statuses of the responses of the Find app worth retrying the request for
+RETRY_STATUSES = frozenset(
+    {
+        HTTPStatus.TOO_MANY_REQUESTS,
+        HTTPStatus.INTERNAL_SERVER_ERROR,
+        HTTPStatus.BAD_GATEWAY,
+        HTTPStatus.SERVICE_UNAVAILABLE,
+        HTTPStatus.GATEWAY_TIMEOUT,
+    }
+)
+# Bounds in seconds of the exponential backoff between two attempts
+RETRY_BACKOFF = 0.5
+RETRY_BACKOFF_MAX = 30
+
+# Text search configuration of the PostgreSQL indexer, created by migration 0039
+SEARCH_CONFIG = "docs_search"
+# Markers of the words highlighted by PostgreSQL in the snippets, replaced by HTML
+# tags once the snippets are escaped
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_STOP = "\x03"
+
 
 @cache
 def get_document_indexer():
@@ -46,59 +84,149 @@ def get_batch_accesses_by_users_and_teams(paths):
     """
     Get accesses related to a list of document paths,
     grouped by users and teams, including all ancestor paths.
-    """
-    ancestor_map = get_ancestor_to_descendants_map(
-        paths, steplen=models.Document.steplen
-    )
-    ancestor_paths = list(ancestor_map.keys())
-
-    access_qs = models.DocumentAccess.objects.filter(
-        document__path__in=ancestor_paths
-    ).values("document__path", "user__sub", "team")
 
-    access_by_document_path = defaultdict(lambda: {"users": set(), "teams": set()})
-
-    for access in access_qs:
-        ancestor_path = access["document__path"]
-        user_sub = access["user__sub"]
-        team = access["team"]
-
-        for descendant_path in ancestor_map.get(ancestor_path, []):
-            if user_sub:
-                access_by_document_path[descendant_path]["users"].add(str(user_sub))
-            if team:
-                access_by_document_path[descendant_path]["teams"].add(team)
+    The accesses are aggregated by the database in a single query: the ancestors
+    of each document are joined on the prefixes of its path, which are looked up
+    in the unique index of the path, and their accesses are aggregated in arrays
+    of user subs and teams, one row per document.
+    """
+    if not paths:
+        return {}
+
+    document_table = models.Document._meta.db_table  # noqa: SLF001
+    access_table = models.DocumentAccess._meta.db_table  # noqa: SLF001
+    user_table = models.User._meta.db_table  # noqa: SLF001
+
+    access_by_document_path = {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"select document.path, "  # noqa: S608
+            f"  array_remove(array_agg(distinct u.sub), null), "
+            f"  array_remove(array_agg(distinct access.team), '') "
+            f'from "{document_table}" document '
+            f"cross join lateral generate_series(%s, length(document.path), %s) "
+            f"  as prefix_length "
+            f'join "{document_table}" ancestor '
+            f"  on ancestor.path = left(document.path, prefix_length) "
+            f'join "{access_table}" access on access.document_id = ancestor.id '
+            f'left join "{user_table}" u on u.id = access.user_id '
+            f"where document.path = any(%s) "
+            f"group by document.path",
+            [models.Document.steplen, models.Document.steplen, list(paths)],
+        )
+        for path, user_subs, teams in cursor:
+            access_by_document_path[path] = {
+                "users": set(user_subs),
+                "teams": set(teams),
+            }
 
-    return dict(access_by_document_path)
+    return access_by_document_path
 
 
-def get_visited_document_ids_of(queryset, user) -> tuple[str, ...]:
+def get_visited_document_ids_of(user) -> tuple[str, ...]:
     """
     Returns the ids of the documents that have a linktrace to the user and NOT owned.
     It will be use to limit the opensearch responses to the public documents already
     "visited" by the user.
+
+    The ids are cached per user and invalidated when the link traces or the accesses
+    of the user change. Deleted documents are kept in the cache and filtered out on
+    each call instead, so deleting or restoring a document does not invalidate it.
     """
     if isinstance(user, AnonymousUser):
         return []
 
-    visited_ids = models.LinkTrace.objects.filter(user=user).values_list(
-        "document_id", flat=True
-    )
-
-    docs = (
-        queryset.exclude(accesses__user=user)
-        .filter(
-            deleted_at__isnull=True,
-            ancestors_deleted_at__isnull=True,
+    cache_key = models.get_visited_document_ids_cache_key(user.id)
+    visited_document_ids = django_cache.get(cache_key)
+    if visited_document_ids is None:
+        visited_ids = models.LinkTrace.objects.filter(user=user).values_list(
+            "document_id", flat=True
+        )
+        docs = (
+            models.Document.objects.exclude(accesses__user=user)
+            .filter(pk__in=visited_ids)
+            .order_by("pk")
+            .distinct("pk")
+        )
+        visited_document_ids = tuple(
+            str(id) for id in docs.values_list("pk", flat=True)
+        )
+        django_cache.set(
+            cache_key,
+            visited_document_ids,
+            settings.SEARCH_INDEXER_VISITED_CACHE_TIMEOUT,
         )
-        .filter(pk__in=visited_ids)
-        .order_by("pk")
-        .distinct("pk")
-    )
 
+    if not visited_document_ids:
+        return ()
+
+    docs = models.Document.objects.filter(
+        pk__in=visited_document_ids,
+        deleted_at__isnull=True,
+        ancestors_deleted_at__isnull=True,
+    ).order_by("pk")
     return tuple(str(id) for id in docs.values_list("pk", flat=True))
 
 
+def get_changed_documents(changes):
+    """
+    Return a queryset of the documents affected by changes of the indexing journal,
+    given as (id, document id, include descendants) tuples.
+    """
+    document_ids = set()
+    subtree_ids = set()
+    for _id, document_id, include_descendants in changes:
+        (subtree_ids if include_descendants else document_ids).add(document_id)
+
+    filters = Q(pk__in=document_ids)
+    subtree_paths = []
+    # Sorted paths list subtrees right after the subtree including them, if any
+    for path in sorted(
+        models.Document.objects.filter(pk__in=subtree_ids).values_list(
+            "path", flat=True
+        )
+    ):
+        if not subtree_paths or not path.startswith(subtree_paths[-1]):
+            subtree_paths.append(path)
+            filters |= Q(path__startswith=path)
+
+    return models.Document.objects.filter(filters)
+
+
+class IndexingStats:
+    """Time spent and documents processed by each stage of the indexing pipeline."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = defaultdict(lambda: {"documents": 0, "duration": 0.0})
+
+    @contextmanager
+    def measure(self, stage):
+        """
+        Measure the time spent in a stage. The context manager yields a function
+        to call with the number of documents processed.
+        """
+        documents = []
+        start = time.perf_counter()
+        yield documents.append
+        duration = time.perf_counter() - start
+
+        with self._lock:
+            self._stages[stage]["documents"] += sum(documents)
+            self._stages[stage]["duration"] += duration
+
+    def log(self):
+        """Log the throughput of each stage."""
+        for stage, stats in self._stages.items():
+            logger.info(
+                "Indexing stage %s: %d document(s) in %.2fs (%.1f documents/s)",
+                stage,
+                stats["documents"],
+                stats["duration"],
+                stats["documents"] / stats["duration"] if stats["duration"] else 0,
+            )
+
+
 class BaseDocumentIndexer(ABC):
     """
     Base class for document indexers.
@@ -107,72 +235,393 @@ class BaseDocumentIndexer(ABC):
     `serialize_document()` and `push()` to define backend-specific behavior.
     """
 
+    # Fields of the documents read by `serialize_document()`, the other fields are
+    # not fetched from the database. All fields are fetched if None.
+    document_fields = None
+    # Whether payloads are pushed by a pool of threads. Backends writing to the
+    # database push them from the calling thread, which runs all database queries.
+    push_in_threads = True
+
     def __init__(self):
         """
         Initialize the indexer.
         """
         self.batch_size = settings.SEARCH_INDEXER_BATCH_SIZE
-        self.indexer_url = settings.INDEXING_URL
-        self.indexer_secret = settings.SEARCH_INDEXER_SECRET
-        self.search_url = settings.SEARCH_URL
         self.search_limit = settings.SEARCH_INDEXER_QUERY_LIMIT
 
-        if not self.indexer_url:
-            raise ImproperlyConfigured("INDEXING_URL must be set in Django settings.")
+    def index(self, queryset=None, batch_size=None, only_changed=False):
+        """
+        Fetch documents in batches, serialize them, and push to the search backend.
 
-        if not self.indexer_secret:
-            raise ImproperlyConfigured(
-                "SEARCH_INDEXER_SECRET must be set in Django settings."
-            )
+        Batches go through a pipeline whose stages overlap:
 
-        if not self.search_url:
-            raise ImproperlyConfigured("SEARCH_URL must be set in Django settings.")
+        1. documents are fetched from the database by keyset pagination, with their
+           accesses;
+        2. their contents are read from the object storage by a pool of threads
+           (SEARCH_INDEXER_CONTENT_WORKERS) and decoded to text, in the yjs worker
+           pool if it is enabled (YJS_WORKER_POOL_SIZE);
+        3. they are serialized one by one and split in payloads of at most
+           SEARCH_INDEXER_PUSH_MAX_SIZE bytes;
+        4. payloads are pushed by a pool of threads (SEARCH_INDEXER_PUSH_WORKERS).
 
-    def index(self, queryset=None, batch_size=None):
-        """
-        Fetch documents in batches, serialize them, and push to the search backend.
+        Database queries are all run by the calling thread. At most
+        SEARCH_INDEXER_PIPELINE_DEPTH batches wait between two stages, which bounds
+        the memory used whatever the number of documents.
+
+        The fingerprint of the documents pushed is recorded once they are pushed.
 
         Args:
             queryset (optional): Document queryset
                 Defaults to all documents without filter.
-            batch_size (int, optional): Number of documents per batch.
-                Defaults to settings.SEARCH_INDEXER_BATCH_SIZE.
+            batch_size (int, optional): Number of documents fetched from the
+                database per batch. Defaults to settings.SEARCH_INDEXER_BATCH_SIZE.
+            only_changed (bool, optional): Skip the documents whose fingerprint did
+                not change since they were last pushed, before reading their
+                content. Defaults to False.
         """
-        last_id = 0
+        if queryset is None:
+            queryset = models.Document.objects.all()
+        if self.document_fields:
+            queryset = queryset.only(*self.document_fields)
+        batch_size = batch_size or self.batch_size
+        depth = settings.SEARCH_INDEXER_PIPELINE_DEPTH
+        stats = IndexingStats()
+
         count = 0
-        queryset = queryset or models.Document.objects.all()
+        pending_contents = deque()
+        pending_pushes = deque()
+        with (
+            ThreadPoolExecutor(max_workers=1) as contents_executor,
+            ThreadPoolExecutor(
+                max_workers=settings.SEARCH_INDEXER_CONTENT_WORKERS
+            ) as fetch_executor,
+            ThreadPoolExecutor(
+                max_workers=settings.SEARCH_INDEXER_PUSH_WORKERS
+            ) as push_executor,
+        ):
+            for fetched_batch in self._iter_batches(queryset, batch_size, stats):
+                accesses_by_document_path = get_batch_accesses_by_users_and_teams(
+                    [doc.path for doc in fetched_batch]
+                )
+                fingerprints = {
+                    document.pk: self.get_fingerprint(
+                        document, accesses_by_document_path
+                    )
+                    for document in fetched_batch
+                }
+                documents_batch = (
+                    self._exclude_unchanged(fetched_batch, fingerprints, stats)
+                    if only_changed
+                    else fetched_batch
+                )
+                if not documents_batch:
+                    continue
+
+                pending_contents.append(
+                    (
+                        documents_batch,
+                        accesses_by_document_path,
+                        fingerprints,
+                        contents_executor.submit(
+                            self._load_contents, documents_batch, fetch_executor, stats
+                        ),
+                    )
+                )
+
+                # Serialize batches whose contents are ready, or wait for the oldest
+                # one if too many are waiting
+                while pending_contents and (
+                    len(pending_contents) > depth or pending_contents[0][-1].done()
+                ):
+                    count += self._serialize_and_push(
+                        pending_contents.popleft(), push_executor, pending_pushes, stats
+                    )
+
+            while pending_contents:
+                count += self._serialize_and_push(
+                    pending_contents.popleft(), push_executor, pending_pushes, stats
+                )
+
+            while pending_pushes:
+                self._wait_push(pending_pushes.popleft())
+
+        stats.log()
+        return count
+
+    def index_changes(self, document_ids=None, batch_size=None):
+        """
+        Index the documents recorded in the indexing journal, in the order the
+        changes were recorded, and delete them from the journal.
+
+        Changes are consumed in batches, the changes of a same document being
+        coalesced and changes including descendants being expanded to the subtree.
+        Each batch is claimed for SEARCH_INDEXER_CLAIM_TIMEOUT seconds in a short
+        transaction, skipping the changes locked by a concurrent task, then
+        indexed outside of it so that no lock is held while the contents are read
+        and pushed. The changes are only deleted once their documents are pushed:
+        if indexing fails, they are released for the next task and, if the task
+        dies, they are claimed again by a task once their claim expired.
+
+        Args:
+            document_ids (list, optional): Only consume the changes recorded on
+                these documents. Defaults to all the changes.
+            batch_size (int, optional): Number of changes consumed per batch.
+                Defaults to settings.SEARCH_INDEXER_BATCH_SIZE.
+
+        Returns:
+            int: The number of documents indexed.
+        """
         batch_size = batch_size or self.batch_size
+        changes_queryset = models.DocumentIndexingChange.objects.all()
+        if document_ids is not None:
+            changes_queryset = changes_queryset.filter(document_id__in=document_ids)
+        claimed_by = uuid.uuid4()
 
+        count = 0
         while True:
-            documents_batch = list(
-                queryset.filter(
-                    id__gt=last_id,
-                ).order_by("id")[:batch_size]
+            with transaction.atomic():
+                now = timezone.now()
+                expired_before = now - timedelta(
+                    seconds=settings.SEARCH_INDEXER_CLAIM_TIMEOUT
+                )
+                changes = list(
+                    changes_queryset.filter(
+                        Q(claimed_at__isnull=True) | Q(claimed_at__lt=expired_before)
+                    )
+                    .select_for_update(skip_locked=True)
+                    .order_by("id")
+                    .values_list("id", "document_id", "include_descendants")[
+                        :batch_size
+                    ]
+                )
+                if not changes:
+                    return count
+
+                change_ids = [change_id for change_id, _id, _descendants in changes]
+                models.DocumentIndexingChange.objects.filter(id__in=change_ids).update(
+                    claimed_at=now, claimed_by=claimed_by
+                )
+
+            # Changes claimed again by another task after their claim expired are
+            # left to it
+            claimed_changes = models.DocumentIndexingChange.objects.filter(
+                id__in=change_ids, claimed_by=claimed_by
             )
 
+            try:
+                count += self.index(get_changed_documents(changes))
+            except Exception:
+                claimed_changes.update(claimed_at=None, claimed_by=None)
+                raise
+
+            claimed_changes.delete()
+
+    @staticmethod
+    def _iter_batches(queryset, batch_size, stats):
+        """Fetch the documents of the queryset in batches, by keyset pagination."""
+        last_id = 0
+        while True:
+            with stats.measure("fetch") as measure:
+                documents_batch = list(
+                    queryset.filter(id__gt=last_id).order_by("id")[:batch_size]
+                )
+                measure(len(documents_batch))
+
             if not documents_batch:
-                break
+                return
 
-            doc_paths = [doc.path for doc in documents_batch]
             last_id = documents_batch[-1].id
-            accesses_by_document_path = get_batch_accesses_by_users_and_teams(doc_paths)
+            yield documents_batch
+
+    @staticmethod
+    def _load_contents(documents_batch, fetch_executor, stats):
+        """
+        Read the contents of a batch of documents from the object storage in
+        parallel, then decode them to text. Returns the texts of the documents, in
+        the order of the batch.
+        """
+        with stats.measure("contents") as measure:
+            contents = list(
+                fetch_executor.map(lambda document: document.content, documents_batch)
+            )
+            measure(len(contents))
 
-            serialized_batch = [
-                self.serialize_document(document, accesses_by_document_path)
-                for document in documents_batch
-                if document.content or document.title
-            ]
+        with stats.measure("decode") as measure:
+            texts = base64_yjs_to_text_many(contents)
+            measure(len(contents))
 
-            if serialized_batch:
-                self.push(serialized_batch)
-                count += len(serialized_batch)
+        return texts
+
+    def _serialize_and_push(self, pending, push_executor, pending_pushes, stats):
+        """
+        Serialize a batch whose contents were loaded and hand its payloads over to
+        the push threads. Returns the number of documents pushed.
+        """
+        documents_batch, accesses_by_document_path, fingerprints, contents_future = (
+            pending
+        )
+        texts = contents_future.result()
+
+        count = 0
+        for serialized_batch, document_ids in self._iter_payloads(
+            documents_batch, texts, accesses_by_document_path, stats
+        ):
+            while len(pending_pushes) >= settings.SEARCH_INDEXER_PIPELINE_DEPTH:
+                self._wait_push(pending_pushes.popleft())
+
+            if self.push_in_threads:
+                push_future = push_executor.submit(self._push, serialized_batch, stats)
+            else:
+                push_future = Future()
+                push_future.set_result(self._push(serialized_batch, stats))
+
+            pending_pushes.append(
+                (
+                    push_future,
+                    {
+                        document_id: fingerprints[document_id]
+                        for document_id in document_ids
+                    },
+                )
+            )
+            count += len(serialized_batch)
 
         return count
 
+    @staticmethod
+    def _wait_push(pending):
+        """Wait for a payload to be pushed and record the fingerprints it pushed."""
+        push_future, fingerprints = pending
+        push_future.result()
+
+        now = timezone.now()
+        models.DocumentIndexFingerprint.objects.bulk_create(
+            [
+                models.DocumentIndexFingerprint(
+                    document_id=document_id, fingerprint=fingerprint, indexed_at=now
+                )
+                for document_id, fingerprint in fingerprints.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["document_id"],
+            update_fields=["fingerprint", "indexed_at"],
+        )
+
+    @staticmethod
+    def _exclude_unchanged(documents_batch, fingerprints, stats):
+        """Return the documents of a batch whose fingerprint changed."""
+        with stats.measure("fingerprint") as measure:
+            indexed_fingerprints = dict(
+                models.DocumentIndexFingerprint.objects.filter(
+                    document_id__in=fingerprints
+                ).values_list("document_id", "fingerprint")
+            )
+            measure(len(documents_batch))
+
+        return [
+            document
+            for document in documents_batch
+            if indexed_fingerprints.get(document.pk) != fingerprints[document.pk]
+        ]
+
+    def _iter_payloads(self, documents_batch, texts, accesses_by_document_path, stats):
+        """
+        Serialize the documents of a batch one by one and yield them in lists whose
+        JSON encoding fits in SEARCH_INDEXER_PUSH_MAX_SIZE bytes, with the ids of
+        their documents. A document larger than that is pushed alone.
+        """
+        max_size = settings.SEARCH_INDEXER_PUSH_MAX_SIZE
+        serialized_batch = []
+        document_ids = []
+        size = 2  # Brackets of the JSON list
+
+        for document, text in zip(documents_batch, texts, strict=True):
+            if not (document.content or document.title):
+                continue
+
+            with stats.measure("serialize") as measure:
+                serialized = self.serialize_document(
+                    document, accesses_by_document_path, text=text
+                )
+                # Same encoding as requests, plus the separator of the list items
+                document_size = len(json.dumps(serialized)) + 2
+                measure(1)
+
+            if serialized_batch and size + document_size > max_size:
+                yield serialized_batch, document_ids
+                serialized_batch = []
+                document_ids = []
+                size = 2
+
+            serialized_batch.append(serialized)
+            document_ids.append(document.pk)
+            size += document_size
+
+        if serialized_batch:
+            yield serialized_batch, document_ids
+
+    def _push(self, serialized_batch, stats):
+        with stats.measure("push") as measure:
+            self.push(serialized_batch)
+            measure(len(serialized_batch))
+
+    def delete_vanished(self):
+        """
+        Delete from the search backend the documents pushed once that do not exist
+        anymore in the database, by batches.
+
+        Returns:
+            int: The number of documents deleted.
+        """
+        count = 0
+        while True:
+            document_ids = list(
+                models.DocumentIndexFingerprint.objects.exclude(
+                    document_id__in=models.Document.objects.values("pk")
+                ).values_list("document_id", flat=True)[: self.batch_size]
+            )
+            if not document_ids:
+                return count
+
+            self.delete([str(document_id) for document_id in document_ids])
+            models.DocumentIndexFingerprint.objects.filter(
+                document_id__in=document_ids
+            ).delete()
+            count += len(document_ids)
+
+    @staticmethod
+    def get_fingerprint(document, accesses):
+        """
+        Return a hash of what the indexed document depends on, computed without
+        reading its content: every content write saves the document, which updates
+        its "updated_at" field.
+
+        Args:
+            document (Document): The document instance.
+            accesses (dict): Mapping of document path to user/team access.
+
+        Returns:
+            str: The hexadecimal SHA256 of the document state.
+        """
+        document_accesses = accesses.get(document.path, {})
+        state = [
+            str(document.pk),
+            document.title,
+            document.path,
+            document.numchild,
+            document.updated_at.isoformat(),
+            sorted(document_accesses.get("users", ())),
+            sorted(document_accesses.get("teams", ())),
+            document.computed_link_reach,
+            bool(document.ancestors_deleted_at),
+        ]
+        return hashlib.sha256(json.dumps(state).encode("utf-8")).hexdigest()
+
     @abstractmethod
-    def serialize_document(self, document, accesses):
+    def serialize_document(self, document, accesses, text=None):
         """
         Convert a Document instance to a JSON-serializable format for indexing.
+        The text of its content is decoded from the content when it is not given.
 
         Must be implemented by subclasses.
         """
@@ -185,7 +634,17 @@ class BaseDocumentIndexer(ABC):
         Must be implemented by subclasses.
         """
 
-    # pylint: disable=too-many-arguments, too-many-positional-arguments
+    def delete(self, document_ids):
+        """
+        Delete a batch of documents from the backend.
+
+        Must be implemented by subclasses supporting deletions.
+        """
+        raise NotImplementedError(
+            f"{self.__class__.__name__:s} does not support deletions."
+        )
+
+    # pylint: disable=too-many-arguments, too-many-positional-arguments, unused-argument
     def search(  # noqa : PLR0913, PLR0917
         self,
         q: str,
@@ -194,6 +653,7 @@ class BaseDocumentIndexer(ABC):
         nb_results: int = None,
         path: str = None,
         search_type: SearchType = None,
+        user=None,
     ):
         """
         Search for documents in Find app.
@@ -215,6 +675,9 @@ class BaseDocumentIndexer(ABC):
             search_type (SearchType, optional):
                 Type of search to perform. Can be SearchType.HYBRID or SearchType.FULL_TEXT.
                 If None, the backend search service will use its default search behavior.
+            user (User, optional):
+                The user searching, for the backends that do not identify the
+                user from the token.
         """
         nb_results = nb_results or self.search_limit
         results = self.search_query(
@@ -247,6 +710,19 @@ class FindDocumentIndexer(BaseDocumentIndexer):
     Document indexer that indexes and searches documents with La Suite Find app.
     """
 
+    document_fields = (
+        "id",
+        "title",
+        "path",
+        "depth",
+        "numchild",
+        "created_at",
+        "updated_at",
+        "link_reach",
+        "link_role",
+        "ancestors_deleted_at",
+    )
+
     # pylint: disable=too-many-arguments, too-many-positional-arguments
     def search(  # noqa : PLR0913, PLR0917
         self,
@@ -256,6 +732,7 @@ class FindDocumentIndexer(BaseDocumentIndexer):
         nb_results: int = None,
         path: str = None,
         search_type: SearchType = None,
+        user=None,
     ):
         """format Find search results"""
         search_results = super().search(
@@ -265,6 +742,7 @@ class FindDocumentIndexer(BaseDocumentIndexer):
             nb_results=nb_results,
             path=path,
             search_type=search_type,
+            user=user,
         )
         return [
             {
@@ -308,25 +786,28 @@ class FindDocumentIndexer(BaseDocumentIndexer):
             return source["title"]
         return ""
 
-    def serialize_document(self, document, accesses):
+    def serialize_document(self, document, accesses, text=None):
         """
         Convert a Document to the JSON format expected by La Suite Find.
 
         Args:
             document (Document): The document instance.
             accesses (dict): Mapping of document ID to user/team access.
+            text (str, optional): Text of the document content, decoded from the
+                content if not given.
 
         Returns:
             dict: A JSON-serializable dictionary.
         """
         doc_path = document.path
-        doc_content = document.content
-        text_content = base64_yjs_to_text(doc_content) if doc_content else ""
+        if text is None:
+            doc_content = document.content
+            text = base64_yjs_to_text(doc_content) if doc_content else ""
 
         return {
             "id": str(document.id),
             "title": document.title or "",
-            "content": text_content,
+            "content": text,
             "depth": document.depth,
             "path": document.path,
             "numchild": document.numchild,
@@ -335,10 +816,103 @@ class FindDocumentIndexer(BaseDocumentIndexer):
             "users": list(accesses.get(doc_path, {}).get("users", set())),
             "groups": list(accesses.get(doc_path, {}).get("teams", set())),
             "reach": document.computed_link_reach,
-            "size": len(text_content.encode("utf-8")),
+            "size": len(text.encode("utf-8")),
             "is_active": not bool(document.ancestors_deleted_at),
         }
 
+    def __init__(self):
+        """
+        Initialize the indexer and its session, keeping the connections to the
+        Find app alive between requests.
+        """
+        super().__init__()
+        self.indexer_url = settings.INDEXING_URL
+        self.indexer_secret = settings.SEARCH_INDEXER_SECRET
+        self.search_url = settings.SEARCH_URL
+
+        if not self.indexer_url:
+            raise ImproperlyConfigured("INDEXING_URL must be set in Django settings.")
+
+        if not self.indexer_secret:
+            raise ImproperlyConfigured(
+                "SEARCH_INDEXER_SECRET must be set in Django settings."
+            )
+
+        if not self.search_url:
+            raise ImproperlyConfigured("SEARCH_URL must be set in Django settings.")
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_maxsize=max(settings.SEARCH_INDEXER_PUSH_WORKERS, 10)
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @staticmethod
+    def get_retry_delay(attempt, response=None):
+        """
+        Return the delay before retrying a request: an exponential backoff with full
+        jitter, or the delay asked by the Find app in a "Retry-After" header.
+        """
+        delay = random.uniform(  # noqa: S311
+            0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2**attempt)
+        )
+        retry_after = (
+            response.headers.get("Retry-After") if response is not None else None
+        )
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(int(retry_after), RETRY_BACKOFF_MAX))
+        return delay
+
+    def post(self, url, data, token, retries=0, compress=False):
+        """
+        Post JSON data to the Find app, retrying on connection errors and
+        transient error statuses.
+
+        Args:
+            url (str): Find app endpoint.
+            data: JSON-serializable data.
+            token (str): token sent as bearer.
+            retries (int): maximum number of retries.
+            compress (bool): whether to send the data compressed with gzip.
+
+        Returns:
+            requests.Response: the response of the last attempt.
+        """
+        kwargs = {
+            "headers": {"Authorization": f"Bearer {token}"},
+            "timeout": 10,
+        }
+        if compress:
+            kwargs["data"] = gzip.compress(json.dumps(data).encode("utf-8"))
+            kwargs["headers"].update(
+                {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+            )
+        else:
+            kwargs["json"] = data
+
+        for attempt in range(retries + 1):
+            response = None
+            try:
+                response = self.session.post(url, **kwargs)
+            except requests.ConnectionError, requests.Timeout:
+                if attempt == retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == retries:
+                    return response
+
+            delay = self.get_retry_delay(attempt, response)
+            logger.warning(
+                "Request to %s failed (%s), retrying in %.1fs",
+                url,
+                response.status_code if response is not None else "connection error",
+                delay,
+            )
+            time.sleep(delay)
+
+        return response
+
     def search_query(self, data, token) -> requests.Response:
         """
         Retrieve documents from the Find app API.
@@ -350,26 +924,223 @@ class FindDocumentIndexer(BaseDocumentIndexer):
         Returns:
             dict: A JSON-serializable dictionary.
         """
-        response = requests.post(
-            self.search_url,
-            json=data,
-            headers={"Authorization": f"Bearer {token}"},
-            timeout=10,
-        )
+        response = self.post(self.search_url, data, token)
         response.raise_for_status()
         return response.json()
 
+    def delete(self, document_ids):
+        """
+        Delete a batch of documents from the Find backend.
+
+        Args:
+            document_ids (list): List of document ids.
+        """
+        if not settings.INDEXING_DELETE_URL:
+            raise ImproperlyConfigured(
+                "INDEXING_DELETE_URL must be set to delete documents from Find."
+            )
+
+        response = self.post(
+            settings.INDEXING_DELETE_URL,
+            document_ids,
+            self.indexer_secret,
+            retries=settings.SEARCH_INDEXER_PUSH_RETRIES,
+            compress=settings.SEARCH_INDEXER_PUSH_COMPRESS,
+        )
+        response.raise_for_status()
+
     def push(self, data):
         """
-        Push a batch of documents to the Find backend.
+        Push a batch of documents to the Find backend. Batches too large for the
+        Find app are split in two and pushed again.
 
         Args:
             data (list): List of document dictionaries.
         """
-        response = requests.post(
+        response = self.post(
             self.indexer_url,
-            json=data,
-            headers={"Authorization": f"Bearer {self.indexer_secret}"},
-            timeout=10,
+            data,
+            self.indexer_secret,
+            retries=settings.SEARCH_INDEXER_PUSH_RETRIES,
+            compress=settings.SEARCH_INDEXER_PUSH_COMPRESS,
         )
+        if (
+            response.status_code == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+            and len(data) > 1
+        ):
+            logger.info("Batch of %d documents too large, split in two", len(data))
+            middle = len(data) // 2
+            self.push(data[:middle])
+            self.push(data[middle:])
+            return
+
         response.raise_for_status()
+
+
+class PostgresDocumentIndexer(BaseDocumentIndexer):
+    """
+    Document indexer that stores the text of the documents in the database and
+    searches it by full-text with PostgreSQL, without an external service.
+    """
+
+    document_fields = FindDocumentIndexer.document_fields
+    push_in_threads = False
+
+    def serialize_document(self, document, accesses, text=None):
+        """
+        Convert a Document to the fields of its search entry.
+
+        Args:
+            document (Document): The document instance.
+            accesses (dict): Mapping of document path to user/team access.
+            text (str, optional): Text of the document content, decoded from the
+                content if not given.
+
+        Returns:
+            dict: A JSON-serializable dictionary.
+        """
+        if text is None:
+            doc_content = document.content
+            text = base64_yjs_to_text(doc_content) if doc_content else ""
+        document_accesses = accesses.get(document.path, {})
+
+        return {
+            "document_id": str(document.id),
+            "path": document.path,
+            "title": document.title or "",
+            "content": text,
+            "users": sorted(document_accesses.get("users", ())),
+            "teams": sorted(document_accesses.get("teams", ())),
+            "reach": document.computed_link_reach,
+            "is_active": not bool(document.ancestors_deleted_at),
+            "updated_at": document.updated_at.isoformat(),
+        }
+
+    def push(self, data):
+        """
+        Create or update the search entries of a batch of documents.
+
+        Args:
+            data (list): List of document dictionaries.
+        """
+        models.DocumentSearchEntry.objects.bulk_create(
+            [models.DocumentSearchEntry(**entry) for entry in data],
+            update_conflicts=True,
+            unique_fields=["document_id"],
+            update_fields=[
+                "path",
+                "title",
+                "content",
+                "users",
+                "teams",
+                "reach",
+                "is_active",
+                "updated_at",
+            ],
+        )
+
+    def delete(self, document_ids):
+        """
+        Delete the search entries of a batch of documents.
+
+        Args:
+            document_ids (list): List of document ids.
+        """
+        models.DocumentSearchEntry.objects.filter(document_id__in=document_ids).delete()
+
+    # pylint: disable=too-many-arguments, too-many-positional-arguments, unused-argument
+    def search(  # noqa : PLR0913, PLR0917
+        self,
+        q: str,
+        token: str,
+        visited: tuple[str, ...] = (),
+        nb_results: int = None,
+        path: str = None,
+        search_type: SearchType = None,
+        user=None,
+    ):
+        """
+        Search the documents the user can read, like the Find app: those the user
+        or one of the user's teams has access to, and the visited documents that
+        are not restricted.
+
+        The search type is ignored, titles and contents are always searched.
+        """
+        is_authenticated = user is not None and user.is_authenticated
+        return self.search_query(
+            data={
+                "q": q,
+                "visited": list(visited),
+                "nb_results": nb_results or self.search_limit,
+                "path": path,
+                "users": [user.sub] if is_authenticated else [],
+                "teams": list(user.teams) if is_authenticated else [],
+            },
+            token=token,
+        )
+
+    @staticmethod
+    def get_highlight(headline):
+        """
+        Escape a snippet computed by PostgreSQL and wrap its highlighted words in
+        "mark" tags. Returns None if no word of the snippet is highlighted.
+        """
+        if HIGHLIGHT_START not in headline:
+            return None
+        return (
+            escape(headline)
+            .replace(HIGHLIGHT_START, "<mark>")
+            .replace(HIGHLIGHT_STOP, "</mark>")
+        )
+
+    def search_query(self, data, token) -> list:  # pylint: disable=unused-argument
+        """
+        Search the entries matching a web search query, ranked by relevance then by
+        last update, with a snippet of their content highlighting the words found.
+
+        Args:
+            data (dict): search data
+            token (str): OICD token, unused
+
+        Returns:
+            list: The hits, with the id and title of their document.
+        """
+        query = SearchQuery(data["q"], search_type="websearch", config=SEARCH_CONFIG)
+
+        readable = Q(document_id__in=data["visited"]) & ~Q(
+            reach=models.LinkReachChoices.RESTRICTED
+        )
+        if data["users"]:
+            readable |= Q(users__overlap=data["users"])
+        if data["teams"]:
+            readable |= Q(teams__overlap=data["teams"])
+
+        entries = models.DocumentSearchEntry.objects.filter(
+            readable, is_active=True, search_vector=query
+        )
+        if data["path"]:
+            entries = entries.filter(path__startswith=data["path"])
+
+        entries = (
+            entries.annotate(
+                rank=SearchRank(F("search_vector"), query),
+                headline=SearchHeadline(
+                    "content",
+                    query,
+                    config=SEARCH_CONFIG,
+                    start_sel=HIGHLIGHT_START,
+                    stop_sel=HIGHLIGHT_STOP,
+                ),
+            )
+            .order_by("-rank", "-updated_at")
+            .values("document_id", "title", "headline")[: data["nb_results"]]
+        )
+
+        return [
+            {
+                "id": str(entry["document_id"]),
+                "title": entry["title"],
+                "highlight": self.get_highlight(entry["headline"]),
+            }
+            for entry in entries
+        ]
@@ -0,0 +1,146 @@
+"""Retention policy of document versions.
+
+The media bucket is versioned so every save of a document content creates a new
+version that is kept forever. The retention policy compacts this history:
+
+- all the versions saved during the last ``DOCUMENT_VERSIONS_RETENTION_KEEP_ALL_HOURS``
+  hours are kept;
+- older versions saved during the last ``DOCUMENT_VERSIONS_RETENTION_HOURLY_DAYS``
+  days are compacted to one snapshot per hour;
+- versions older than that are compacted to one snapshot per day.
+
+A snapshot is the most recent version of its hour (or day). The latest version of
+a document is always kept.
+"""
+
+from datetime import timedelta
+from logging import getLogger
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+logger = getLogger(__name__)
+
+# Maximum number of objects accepted by a single S3 "DeleteObjects" call
+DELETE_OBJECTS_MAX_KEYS = 1000
+
+
+def get_versions_to_delete(versions, now=None, keep_all_hours=None, hourly_days=None):
+    """
+    Select the versions that are not kept by the retention policy.
+
+    Args:
+        versions (list): versions as returned by S3 "ListObjectVersions", i.e. dicts
+            with at least the "VersionId", "LastModified" and "IsLatest" keys.
+        now (datetime, optional): reference date of the policy. Defaults to now.
+        keep_all_hours (int, optional): overrides the setting of the same name.
+        hourly_days (int, optional): overrides the setting of the same name.
+
+    Returns:
+        list: the versions to delete, most recent first.
+    """
+    now = now or timezone.now()
+    if keep_all_hours is None:
+        keep_all_hours = settings.DOCUMENT_VERSIONS_RETENTION_KEEP_ALL_HOURS
+    if hourly_days is None:
+        hourly_days = settings.DOCUMENT_VERSIONS_RETENTION_HOURLY_DAYS
+
+    keep_all_from = now - timedelta(hours=keep_all_hours)
+    hourly_from = now - timedelta(days=hourly_days)
+
+    snapshots = set()
+    versions_to_delete = []
+    for version in sorted(versions, key=lambda v: v["LastModified"], reverse=True):
+        last_modified = version["LastModified"]
+        if version["IsLatest"] or last_modified >= keep_all_from:
+            continue
+
+        if last_modified >= hourly_from:
+            snapshot = last_modified.replace(minute=0, second=0, microsecond=0)
+        else:
+            snapshot = last_modified.date()
+
+        # Versions are sorted most recent first: the first version met for a given
+        # hour (or day) is its snapshot, the others can be deleted.
+        if snapshot in snapshots:
+            versions_to_delete.append(version)
+        else:
+            snapshots.add(snapshot)
+
+    return versions_to_delete
+
+
+def list_document_versions(document):
+    """List all the versions of a document content in the object storage."""
+    s3_client = default_storage.connection.meta.client
+    paginator = s3_client.get_paginator("list_object_versions")
+
+    versions = []
+    for page in paginator.paginate(
+        Bucket=default_storage.bucket_name, Prefix=document.file_key
+    ):
+        versions.extend(
+            version
+            for version in page.get("Versions", [])
+            if version["Key"] == document.file_key
+        )
+    return versions
+
+
+def apply_versions_retention_policy(document, dry_run=False, now=None):
+    """
+    Delete the versions of a document content not kept by the retention policy.
+
+    Versions are deleted in batches with the S3 "DeleteObjects" API and removed
+    from the versions catalogue.
+
+    Returns:
+        dict: statistics with the number of versions found ("versions"), the number
+            of versions deleted ("deleted") and the size freed in bytes ("size").
+            In dry run mode, nothing is deleted and the statistics tell what would
+            have been deleted.
+    """
+    versions = list_document_versions(document)
+    versions_to_delete = get_versions_to_delete(versions, now=now)
+
+    stats = {"versions": len(versions), "deleted": 0, "size": 0}
+    if dry_run:
+        stats["deleted"] = len(versions_to_delete)
+        stats["size"] = sum(version["Size"] for version in versions_to_delete)
+        return stats
+
+    s3_client = default_storage.connection.meta.client
+    for i in range(0, len(versions_to_delete), DELETE_OBJECTS_MAX_KEYS):
+        batch = versions_to_delete[i : i + DELETE_OBJECTS_MAX_KEYS]
+        response = s3_client.delete_objects(
+            Bucket=default_storage.bucket_name,
+            Delete={
+                "Objects": [
+                    {"Key": document.file_key, "VersionId": version["VersionId"]}
+                    for version in batch
+                ],
+                "Quiet": True,
+            },
+        )
+
+        failed_ids = set()
+        for error in response.get("Errors", []):
+            logger.warning(
+                "Failed to delete version %s of document %s: %s",
+                error.get("VersionId"),
+                document.pk,
+                error.get("Message"),
+            )
+            failed_ids.add(error.get("VersionId"))
+
+        deleted = [
+            version for version in batch if version["VersionId"] not in failed_ids
+        ]
+        document.versions.filter(
+            version_id__in=[version["VersionId"] for version in deleted]
+        ).delete()
+        stats["deleted"] += len(deleted)
+        stats["size"] += sum(version["Size"] for version in deleted)
+
+    return stats
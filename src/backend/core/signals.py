@@ -2,48 +2,73 @@
 Declare and configure the signals for the impress core application
 """
 
-from functools import partial
-
 from django.core.cache import cache
-from django.db import transaction
 from django.db.models import signals
 from django.dispatch import receiver
 
 from core import models
-from core.tasks.search import trigger_batch_document_indexer
 from core.utils.users import get_users_sharing_documents_with_cache_key
 
 
 @receiver(signals.post_save, sender=models.Document)
 def document_post_save(sender, instance, **kwargs):  # pylint: disable=unused-argument
     """
-    Asynchronous call to the document indexer at the end of the transaction.
+    Record the change in the indexing journal, the document indexer is called
+    asynchronously at the end of the transaction.
     Note : Within the transaction we can have an empty content and a serialization
     error.
     """
-    transaction.on_commit(partial(trigger_batch_document_indexer, instance))
+    instance.record_indexing_change()
 
 
 @receiver(signals.post_save, sender=models.DocumentAccess)
 def document_access_post_save(sender, instance, created, **kwargs):  # pylint: disable=unused-argument
     """
-    Asynchronous call to the document indexer at the end of the transaction.
+    Record the change of the document and its descendants in the indexing journal.
     Clear cache for the affected user.
     """
-    if not created:
-        transaction.on_commit(
-            partial(trigger_batch_document_indexer, instance.document)
-        )
+    instance.document.record_indexing_change(include_descendants=True)
 
     # Invalidate cache for the user
     cache_key = get_users_sharing_documents_with_cache_key(instance.user_id)
     cache.delete(cache_key)
+    cache.delete_many(
+        [
+            models.get_visited_document_ids_cache_key(instance.user_id),
+            models.get_typeahead_cache_key(instance.user_id),
+        ]
+    )
 
 
 @receiver(signals.post_delete, sender=models.DocumentAccess)
-def document_access_post_delete(sender, instance, **kwargs):  # pylint: disable=unused-argument
+def document_access_post_delete(sender, instance, origin=None, **kwargs):  # pylint: disable=unused-argument
     """
-    Clear cache for the affected user when document access is deleted.
+    Reindex the document and its descendants and clear cache for the affected user
+    when document access is deleted.
     """
+    # Accesses deleted along with their document: there is nothing left to index
+    if not isinstance(origin, models.Document) and (
+        getattr(origin, "model", None) is not models.Document
+    ):
+        instance.document.record_indexing_change(include_descendants=True)
+
     cache_key = get_users_sharing_documents_with_cache_key(instance.user_id)
     cache.delete(cache_key)
+    cache.delete_many(
+        [
+            models.get_visited_document_ids_cache_key(instance.user_id),
+            models.get_typeahead_cache_key(instance.user_id),
+        ]
+    )
+
+
+@receiver(signals.post_save, sender=models.LinkTrace)
+@receiver(signals.post_delete, sender=models.LinkTrace)
+def link_trace_post_save_or_delete(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """Clear the caches of the documents visited by the user."""
+    cache.delete_many(
+        [
+            models.get_visited_document_ids_cache_key(instance.user_id),
+            models.get_typeahead_cache_key(instance.user_id),
+        ]
+    )
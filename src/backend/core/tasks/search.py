@@ -1,22 +1,24 @@
 """Trigger document indexation using celery task."""
 
+import math
+import time
 from logging import getLogger
 
 from django.conf import settings
 from django.core.cache import cache
-from django.db.models import Q
-
-from django_redis.cache import RedisCache
 
 from core import models
 from core.services.search_indexers import (
     get_document_indexer,
 )
+from core.utils import search_queue
 
 from impress.celery_app import app
 
 logger = getLogger(__file__)
 
+INDEXER_SCHEDULED_CACHE_KEY = "docs:search-indexer:scheduled"
+
 
 @app.task
 def document_indexer_task(document_id):
@@ -28,38 +30,68 @@ def document_indexer_task(document_id):
         indexer.index(models.Document.objects.filter(pk=document_id))
 
 
-def batch_indexer_throttle_acquire(timeout: int = 0, atomic: bool = True):
+def schedule_dirty_documents_indexer(due):
     """
-    Enable the task throttle flag for a delay.
-    Uses redis locks if available to ensure atomic changes
+    Schedule the indexation of the documents due at a given time, unless a task is
+    already scheduled: it schedules the next one when it is done.
     """
-    key = "document-batch-indexer-throttle"
+    delay = max(due - time.time(), 0)
+    if cache.add(INDEXER_SCHEDULED_CACHE_KEY, due, timeout=math.ceil(delay) + 1):
+        logger.info("Add task for dirty documents indexation in %d seconds", delay)
+        dirty_documents_indexer_task.apply_async(args=[due], countdown=delay)
 
-    # Redis is used as cache database (not in tests). Use the lock feature here
-    # to ensure atomicity of changes to the throttle flag.
-    if isinstance(cache, RedisCache) and atomic:
-        with cache.locks(key):
-            return batch_indexer_throttle_acquire(timeout, atomic=False)
 
-    # Use add() here :
-    #   - set the flag and returns true if not exist
-    #   - do nothing and return false if exist
-    return cache.add(key, 1, timeout=timeout)
+@app.task
+def dirty_documents_indexer_task(due_before=None):
+    """
+    Celery Task : Sends indexation query for the changes of the documents queued
+    until the given time, by batches, then schedule the next task if documents
+    remain in the queue.
+
+    Without a time, the task is run periodically by celery beat (see
+    CELERY_BEAT_SCHEDULE) and drains the documents due now: scheduling the next
+    task is only a way to index documents sooner, documents whose task failed or
+    was lost are indexed by the next periodic run.
+    """
+    if due_before is None:
+        due_before = time.time()
+    else:
+        cache.delete(INDEXER_SCHEDULED_CACHE_KEY)
+
+    indexer = get_document_indexer()
+
+    if not indexer:
+        return
+
+    count = 0
+    while document_ids := search_queue.pop_due(
+        due_before, settings.SEARCH_INDEXER_BATCH_SIZE
+    ):
+        try:
+            count += indexer.index_changes(document_ids=document_ids)
+        except Exception:
+            # Their changes are still in the journal, index them with the next task
+            # or, at the latest, with the next periodic one
+            search_queue.mark_dirty(document_ids, settings.SEARCH_INDEXER_COUNTDOWN)
+            raise
+
+    logger.info("Indexed %d documents", count)
+
+    next_due = search_queue.get_next_due()
+    if next_due is not None:
+        schedule_dirty_documents_indexer(next_due)
 
 
 @app.task
-def batch_document_indexer_task(timestamp):
-    """Celery Task : Sends indexation query for a batch of documents."""
+def batch_document_indexer_task():
+    """
+    Celery Task : Sends indexation query for the documents recorded in the
+    indexing journal.
+    """
     indexer = get_document_indexer()
 
     if indexer:
-        queryset = models.Document.objects.filter(
-            Q(updated_at__gte=timestamp)
-            | Q(deleted_at__gte=timestamp)
-            | Q(ancestors_deleted_at__gte=timestamp)
-        )
-
-        count = indexer.index(queryset)
+        count = indexer.index_changes()
         logger.info("Indexed %d documents", count)
 
 
@@ -67,6 +99,9 @@ def trigger_batch_document_indexer(document):
     """
     Trigger indexation task with debounce a delay set by the SEARCH_INDEXER_COUNTDOWN setting.
 
+    The document is queued, keeping its due time if it was already queued, and
+    indexed with the other documents due by the next task.
+
     Args:
         document (Document): The document instance.
     """
@@ -77,19 +112,8 @@ def trigger_batch_document_indexer(document):
         return
 
     if countdown > 0:
-        # Each time this method is called during a countdown, we increment the
-        # counter and each task decrease it, so the index be run only once.
-        if batch_indexer_throttle_acquire(timeout=countdown):
-            logger.info(
-                "Add task for batch document indexation from updated_at=%s in %d seconds",
-                document.updated_at.isoformat(),
-                countdown,
-            )
-
-            batch_document_indexer_task.apply_async(
-                args=[document.updated_at], countdown=countdown
-            )
-        else:
-            logger.info("Skip task for batch document %s indexation", document.pk)
+        # Queued again in case a task popped it before the transaction was committed
+        search_queue.mark_dirty([document.pk], countdown)
+        schedule_dirty_documents_indexer(search_queue.get_next_due())
     else:
-        document_indexer_task.apply(args=[document.pk])
+        batch_document_indexer_task.apply()
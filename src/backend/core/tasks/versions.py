@@ -0,0 +1,42 @@
+"""Tasks dedicated to document's versions."""
+
+from logging import getLogger
+
+from django.conf import settings
+
+from core import models
+from core.services.versions_retention import apply_versions_retention_policy
+
+from impress.celery_app import app
+
+logger = getLogger(__file__)
+
+
+@app.task
+def apply_versions_retention_policy_task(after_id=None):
+    """
+    Celery Task : Apply the versions retention policy to a batch of documents.
+
+    Documents are processed by batches of DOCUMENT_VERSIONS_RETENTION_BATCH_SIZE in
+    the order of their ids. Each task enqueues the task for the next batch so the
+    whole table is processed without holding a worker for too long.
+    """
+    batch_size = settings.DOCUMENT_VERSIONS_RETENTION_BATCH_SIZE
+
+    queryset = models.Document.objects.order_by("pk").only("pk")
+    if after_id:
+        queryset = queryset.filter(pk__gt=after_id)
+    documents = list(queryset[:batch_size])
+
+    deleted = 0
+    for document in documents:
+        deleted += apply_versions_retention_policy(document)["deleted"]
+
+    logger.info(
+        "Versions retention policy applied to %d documents: %d versions deleted",
+        len(documents),
+        deleted,
+    )
+
+    if len(documents) == batch_size:
+        apply_versions_retention_policy_task.delay(after_id=str(documents[-1].pk))
@@ -0,0 +1,75 @@
+"""Unit tests for the `apply_versions_retention_policy` management command."""
+
+from django.core.management import CommandError, call_command
+
+import pytest
+
+from core import factories
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(name="compact_everything")
+def fixture_compact_everything(settings):
+    """Compact all versions to one version per day."""
+    settings.DOCUMENT_VERSIONS_RETENTION_KEEP_ALL_HOURS = 0
+    settings.DOCUMENT_VERSIONS_RETENTION_HOURLY_DAYS = 0
+
+
+def _create_document(nb_versions):
+    document = factories.DocumentFactory()
+    for i in range(nb_versions - 1):
+        document.content = f"bar{i:d}"
+        document.save()
+    return document
+
+
+@pytest.mark.usefixtures("compact_everything")
+def test_apply_versions_retention_policy_dry_run(capsys):
+    """The dry run mode should print statistics and delete nothing."""
+    document = _create_document(4)
+
+    call_command("apply_versions_retention_policy", str(document.pk), "--dry-run")
+
+    output = capsys.readouterr().out
+    assert f"[DRY RUN] {document.pk!s}: 2/4 version(s) deleted" in output
+    assert "[DRY RUN] [INFO] 2/4 version(s) deleted in 1 document(s)" in output
+    assert document.versions.count() == 4
+
+
+@pytest.mark.usefixtures("compact_everything")
+def test_apply_versions_retention_policy(capsys):
+    """The command should delete versions document per document."""
+    document = _create_document(4)
+    other_document = _create_document(3)
+    untouched_document = _create_document(3)
+
+    call_command(
+        "apply_versions_retention_policy", str(document.pk), str(other_document.pk)
+    )
+
+    output = capsys.readouterr().out
+    assert f"{document.pk!s}: 2/4 version(s) deleted" in output
+    assert f"{other_document.pk!s}: 1/3 version(s) deleted" in output
+    assert "[INFO] 3/7 version(s) deleted in 2 document(s)" in output
+    assert document.versions.count() == 2
+    assert other_document.versions.count() == 2
+    assert untouched_document.versions.count() == 3
+
+
+@pytest.mark.usefixtures("compact_everything")
+def test_apply_versions_retention_policy_async(settings):
+    """The async mode should process all the documents by batches in celery tasks."""
+    settings.DOCUMENT_VERSIONS_RETENTION_BATCH_SIZE = 1
+    documents = [_create_document(3) for _ in range(3)]
+
+    call_command("apply_versions_retention_policy", "--async")
+
+    for document in documents:
+        assert document.versions.count() == 2
+
+
+def test_apply_versions_retention_policy_async_dry_run():
+    """The async mode can not be combined with a dry run."""
+    with pytest.raises(CommandError, match="--async option can not be combined"):
+        call_command("apply_versions_retention_policy", "--async", "--dry-run")
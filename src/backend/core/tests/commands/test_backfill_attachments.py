@@ -0,0 +1,63 @@
+"""Unit tests for the `backfill_attachments` management command."""
+
+from io import BytesIO
+from uuid import uuid4
+
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+
+import pytest
+
+from core import factories, models
+
+pytestmark = pytest.mark.django_db
+
+
+def _put_attachment(key, metadata):
+    default_storage.connection.meta.client.put_object(
+        Bucket=default_storage.bucket_name,
+        Key=key,
+        Body=BytesIO(b"my prose"),
+        ContentType="text/plain",
+        Metadata=metadata,
+    )
+
+
+def test_backfill_attachments(capsys):
+    """The command should register the attachments found in the object storage."""
+    user = factories.UserFactory()
+    document = factories.DocumentFactory()
+
+    ready_key = f"{document.id!s}/attachments/{uuid4()!s}.txt"
+    _put_attachment(ready_key, {"owner": str(user.id), "status": "ready"})
+    processing_key = f"{document.id!s}/attachments/{uuid4()!s}-unsafe.txt"
+    _put_attachment(processing_key, {"owner": "None", "status": "processing"})
+    legacy_key = f"{document.id!s}/attachments/{uuid4()!s}.txt"
+    _put_attachment(legacy_key, {})
+    # Attachment of a document that does not exist anymore
+    _put_attachment(f"{uuid4()!s}/attachments/{uuid4()!s}.txt", {})
+
+    registered = factories.AttachmentFactory(document=document)
+
+    call_command("backfill_attachments", "--batch-size", "2", "--workers", "2")
+
+    attachments = {
+        attachment.key: attachment
+        for attachment in models.Attachment.objects.filter(document=document)
+    }
+    assert set(attachments) == {ready_key, processing_key, legacy_key, registered.key}
+
+    assert attachments[ready_key].status == "ready"
+    assert attachments[ready_key].owner == user
+    assert attachments[ready_key].content_type == "text/plain"
+    assert attachments[ready_key].size == 8
+    assert attachments[processing_key].status == "processing"
+    assert attachments[processing_key].owner is None
+    # Attachments uploaded before the malware detection are ready
+    assert attachments[legacy_key].status == "ready"
+
+    assert "[INFO] 3 attachment(s) registered." in capsys.readouterr().out
+
+    # Running the command again should not register anything
+    call_command("backfill_attachments")
+    assert "[INFO] 0 attachment(s) registered." in capsys.readouterr().out
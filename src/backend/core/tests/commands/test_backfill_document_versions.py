@@ -0,0 +1,47 @@
+"""Unit tests for the `backfill_document_versions` management command."""
+
+from django.core.management import call_command
+
+import pytest
+
+from core import factories, models
+
+pytestmark = pytest.mark.django_db
+
+
+def test_backfill_document_versions(capsys):
+    """The command should register the versions missing from the catalogue."""
+    document = factories.DocumentFactory()
+    for i in range(3):
+        document.content = f"bar{i:d}"
+        document.save()
+    other_document = factories.DocumentFactory()
+
+    expected = set(
+        models.DocumentVersion.objects.values_list("document_id", "version_id")
+    )
+    assert len(expected) == 5
+    models.DocumentVersion.objects.all().delete()
+
+    call_command("backfill_document_versions", "--batch-size", "2")
+
+    assert (
+        set(models.DocumentVersion.objects.values_list("document_id", "version_id"))
+        == expected
+    )
+    assert other_document.versions.count() == 1
+    assert "[INFO] 5 version(s) registered in the catalogue." in capsys.readouterr().out
+
+
+def test_backfill_document_versions_idempotent(capsys):
+    """Running the command again should not register versions twice."""
+    document = factories.DocumentFactory()
+    document.versions.all().delete()
+
+    call_command("backfill_document_versions")
+    call_command("backfill_document_versions")
+
+    assert document.versions.count() == 1
+    output = capsys.readouterr().out
+    assert "[INFO] 1 version(s) registered in the catalogue." in output
+    assert "[INFO] 0 version(s) registered in the catalogue." in output
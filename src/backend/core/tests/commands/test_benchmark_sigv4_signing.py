@@ -0,0 +1,34 @@
+"""
+Unit test for `benchmark_sigv4_signing` command.
+"""
+
+from io import StringIO
+
+from django.core.management import call_command
+
+from freezegun import freeze_time
+
+from core.management.commands.benchmark_sigv4_signing import sign_with_botocore
+from core.utils.s3 import get_s3_authorization_signer
+
+
+def test_benchmark_sigv4_signing():
+    """The command should time both ways of signing."""
+    stdout = StringIO()
+
+    call_command(
+        "benchmark_sigv4_signing", "--number", "2", "--repeat", "1", stdout=stdout
+    )
+
+    output = stdout.getvalue()
+    assert "precomputed signer: " in output
+    assert "botocore: " in output
+    assert output.count("per call") == 2
+
+
+@freeze_time("2026-01-02 03:04:05")
+def test_benchmark_sigv4_signing_same_headers():
+    """Both ways of signing compared should produce the same headers."""
+    key = "doc/attachments/image.png"
+
+    assert get_s3_authorization_signer().sign(key) == sign_with_botocore(key)
@@ -0,0 +1,33 @@
+"""
+Unit test for `benchmark_title_search` command.
+"""
+
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+
+import pytest
+
+from core import factories
+
+pytestmark = pytest.mark.django_db
+
+
+def test_benchmark_title_search():
+    """The command should time both lookups on substrings of the titles."""
+    factories.DocumentFactory.create_batch(3)
+    stdout = StringIO()
+
+    call_command("benchmark_title_search", "--queries", "2", stdout=stdout)
+
+    output = stdout.getvalue()
+    assert "Searching 2 substrings among 3 documents" in output
+    assert "unaccent__icontains" in output
+    assert "unaccent_icontains (trigram index)" in output
+    assert output.count("median") == 2
+
+
+def test_benchmark_title_search_no_documents():
+    """The command should fail when there is no title to search."""
+    with pytest.raises(CommandError, match="No titled document to search"):
+        call_command("benchmark_title_search")
@@ -0,0 +1,25 @@
+"""
+Unit test for `benchmark_yjs_to_text` command.
+"""
+
+from io import StringIO
+
+from django.core.management import call_command
+
+
+def test_benchmark_yjs_to_text():
+    """The command should time both extractions for each size of document."""
+    stdout = StringIO()
+
+    call_command(
+        "benchmark_yjs_to_text", "--blocks", "1", "10", "--repeat", "1", stdout=stdout
+    )
+
+    lines = stdout.getvalue().splitlines()
+    assert len(lines) == 2
+    assert lines[0].startswith("    1 blocks (")
+    assert lines[1].startswith("   10 blocks (")
+    assert all(
+        "ms streaming the XML, " in line and line.endswith("ms building a soup")
+        for line in lines
+    )
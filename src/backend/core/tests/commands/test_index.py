@@ -2,6 +2,7 @@
 Unit test for `index` command.
 """
 
+import logging
 from operator import itemgetter
 from unittest import mock
 
@@ -9,8 +10,9 @@ from django.core.management import CommandError, call_command
 from django.db import transaction
 
 import pytest
+from freezegun import freeze_time
 
-from core import factories
+from core import factories, models
 from core.services.search_indexers import FindDocumentIndexer
 
 
@@ -63,3 +65,77 @@ def test_index_improperly_configured(indexer_settings):
         call_command("index")
 
     assert str(err.value) == "The indexer is not enabled or properly configured."
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("indexer_settings")
+def test_index_since():
+    """Only the documents updated or deleted since the given date should be indexed."""
+    with freeze_time("2026-01-01"):
+        factories.DocumentFactory()
+        deleted = factories.DocumentFactory()
+    with freeze_time("2026-03-01"):
+        updated = factories.DocumentFactory()
+        deleted.soft_delete()
+
+    with mock.patch.object(FindDocumentIndexer, "push") as mock_push:
+        call_command("index", "--since", "2026-02-01T00:00:00Z")
+
+    assert {doc["id"] for doc in mock_push.call_args.args[0]} == {
+        str(updated.pk),
+        str(deleted.pk),
+    }
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("indexer_settings")
+def test_index_since_invalid():
+    """The command should reject invalid dates."""
+    with pytest.raises(CommandError) as err:
+        call_command("index", "--since", "yesterday")
+
+    assert "yesterday is not a valid ISO 8601 datetime" in str(err.value)
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("indexer_settings")
+def test_index_only_changed(caplog):
+    """
+    Documents unchanged since they were last indexed should be skipped, and the
+    documents deleted from the database deleted from the index if possible.
+    """
+    document, deleted_document = factories.DocumentFactory.create_batch(2)
+
+    with mock.patch.object(FindDocumentIndexer, "push") as mock_push:
+        call_command("index", "--only-changed")
+        assert mock_push.call_count == 1
+
+        document.title = "changed"
+        document.save()
+        deleted_document.delete()
+        mock_push.reset_mock()
+
+        with caplog.at_level(logging.WARNING):
+            call_command("index", "--only-changed")
+
+    assert [doc["id"] for doc in mock_push.call_args.args[0]] == [str(document.pk)]
+    assert "Deleted documents were not removed" in caplog.text
+    assert models.DocumentIndexFingerprint.objects.filter(
+        document_id=deleted_document.pk
+    ).exists()
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.usefixtures("indexer_settings")
+def test_index_parallel():
+    """Documents should be indexed by ranges of ids in parallel."""
+    with mock.patch.object(FindDocumentIndexer, "push"):
+        documents = factories.DocumentFactory.create_batch(10)
+
+    with mock.patch.object(FindDocumentIndexer, "push") as mock_push:
+        call_command("index", "--parallel", "3")
+
+    pushed_ids = [
+        doc["id"] for call in mock_push.call_args_list for doc in call.args[0]
+    ]
+    assert sorted(pushed_ids) == sorted(str(document.pk) for document in documents)
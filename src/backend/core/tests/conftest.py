@@ -9,7 +9,9 @@ import pytest
 import responses
 
 from core import factories
+from core.tests.utils.find_server import FindServer
 from core.tests.utils.urls import reload_urls
+from core.utils.yjs import parsed_yjs_cache
 
 USER = "user"
 TEAM = "team"
@@ -18,8 +20,9 @@ VIA = [USER, TEAM]
 
 @pytest.fixture(autouse=True)
 def clear_cache():
-    """Fixture to clear the cache before each test."""
+    """Fixture to clear the caches before each test."""
     cache.clear()
+    parsed_yjs_cache.clear()
 
 
 @pytest.fixture
@@ -56,6 +59,23 @@ def indexer_settings_fixture(settings):
     get_document_indexer.cache_clear()
 
 
+@pytest.fixture(name="find_server")
+def find_server_fixture(indexer_settings):
+    """
+    Serve a local stand-in of the Find app API and point the indexer settings to it.
+    """
+    server = FindServer()
+    server.start()
+
+    indexer_settings.INDEXING_URL = f"{server.url:s}/api/v1.0/documents/index/"
+    indexer_settings.INDEXING_DELETE_URL = f"{server.url:s}/api/v1.0/documents/delete/"
+    indexer_settings.SEARCH_URL = f"{server.url:s}/api/v1.0/documents/search/"
+
+    yield server
+
+    server.stop()
+
+
 def resource_server_backend_setup(settings):
     """
     A fixture to create a user token for testing.
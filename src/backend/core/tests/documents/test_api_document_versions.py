@@ -460,6 +460,174 @@ def test_api_document_versions_retrieve_authenticated_related_parent(
     assert response.json()["content"] == "new content 1"
 
 
+@pytest.mark.parametrize("reach", models.LinkReachChoices.values)
+def test_api_document_versions_content_anonymous(reach):
+    """Anonymous users should not be allowed to stream the content of a version."""
+    document = factories.DocumentFactory(link_reach=reach)
+    document.content = "new content"
+    document.save()
+
+    version_id = document.get_versions_slice()["versions"][0]["version_id"]
+
+    response = APIClient().get(
+        f"/api/v1.0/documents/{document.id!s}/versions/{version_id:s}/content/"
+    )
+
+    assert response.status_code == 401
+
+
+@pytest.mark.parametrize("reach", models.LinkReachChoices.values)
+def test_api_document_versions_content_authenticated_unrelated(reach):
+    """
+    Authenticated users should not be allowed to stream the content of a version for
+    a document to which they are not related.
+    """
+    user = factories.UserFactory()
+
+    client = APIClient()
+    client.force_login(user)
+
+    document = factories.DocumentFactory(link_reach=reach)
+    document.content = "new content"
+    document.save()
+
+    version_id = document.get_versions_slice()["versions"][0]["version_id"]
+
+    response = client.get(
+        f"/api/v1.0/documents/{document.id!s}/versions/{version_id:s}/content/"
+    )
+
+    assert response.status_code == 403
+
+
+def _create_document_with_readable_version(user):
+    """Create a document with a version readable by the user and return its id."""
+    document = factories.DocumentFactory()
+    factories.UserDocumentAccessFactory(document=document, user=user)
+
+    time.sleep(1)  # minio stores datetimes with the precision of a second
+
+    document.content = "new content 1"
+    document.save()
+    document.content = "new content 2"
+    document.save()
+
+    version_id = document.get_versions_slice()["versions"][0]["version_id"]
+    return document, version_id
+
+
+def test_api_document_versions_content_authenticated_related():
+    """
+    A user related to a document should be able to stream the content of a version,
+    with the cache headers of the version.
+    """
+    user = factories.UserFactory()
+
+    client = APIClient()
+    client.force_login(user)
+
+    document, version_id = _create_document_with_readable_version(user)
+
+    response = client.get(
+        f"/api/v1.0/documents/{document.id!s}/versions/{version_id:s}/content/"
+    )
+
+    assert response.status_code == 200
+    assert response["Content-Type"] == "text/plain"
+    assert b"".join(response.streaming_content) == b"new content 1"
+    assert response["Content-Length"] == "13"
+    assert response["Accept-Ranges"] == "bytes"
+    assert response["ETag"] is not None
+    assert response["Last-Modified"] is not None
+    assert response["Cache-Control"] == "private, no-cache"
+
+
+def test_api_document_versions_content_range():
+    """A partial read of a version should return a 206 with the requested bytes."""
+    user = factories.UserFactory()
+
+    client = APIClient()
+    client.force_login(user)
+
+    document, version_id = _create_document_with_readable_version(user)
+
+    response = client.get(
+        f"/api/v1.0/documents/{document.id!s}/versions/{version_id:s}/content/",
+        headers={"Range": "bytes=4-10"},
+    )
+
+    assert response.status_code == 206
+    assert b"".join(response.streaming_content) == b"content"
+    assert response["Content-Length"] == "7"
+    assert response["Content-Range"] == "bytes 4-10/13"
+
+    response = client.get(
+        f"/api/v1.0/documents/{document.id!s}/versions/{version_id:s}/content/",
+        headers={"Range": "bytes=100-200"},
+    )
+
+    assert response.status_code == 416
+
+
+def test_api_document_versions_content_conditional():
+    """Fetching a version content reusing its ETag should return a 304."""
+    user = factories.UserFactory()
+
+    client = APIClient()
+    client.force_login(user)
+
+    document, version_id = _create_document_with_readable_version(user)
+    url = f"/api/v1.0/documents/{document.id!s}/versions/{version_id:s}/content/"
+
+    response = client.get(url)
+    assert response.status_code == 200
+
+    response = client.get(url, headers={"If-None-Match": response["ETag"]})
+    assert response.status_code == 304
+
+    response = client.get(url, headers={"If-None-Match": '"invalid"'})
+    assert response.status_code == 200
+
+
+def test_api_document_versions_content_before_access():
+    """Versions created before the user got access should not be streamed."""
+    user = factories.UserFactory()
+
+    client = APIClient()
+    client.force_login(user)
+
+    document = factories.DocumentFactory()
+    document.content = "new content"
+    document.save()
+    version_id = document.get_versions_slice()["versions"][0]["version_id"]
+
+    time.sleep(1)  # minio stores datetimes with the precision of a second
+    factories.UserDocumentAccessFactory(document=document, user=user)
+
+    response = client.get(
+        f"/api/v1.0/documents/{document.id!s}/versions/{version_id:s}/content/"
+    )
+
+    assert response.status_code == 404
+
+
+def test_api_document_versions_content_unknown_version():
+    """Streaming the content of an unknown version should return a 404."""
+    user = factories.UserFactory()
+
+    client = APIClient()
+    client.force_login(user)
+
+    document = factories.DocumentFactory()
+    factories.UserDocumentAccessFactory(document=document, user=user)
+
+    response = client.get(
+        f"/api/v1.0/documents/{document.id!s}/versions/unknown/content/"
+    )
+
+    assert response.status_code == 404
+
+
 def test_api_document_versions_create_anonymous():
     """Anonymous users should not be allowed to create document versions."""
     document = factories.DocumentFactory()
@@ -13,7 +13,7 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 import pytest
 from rest_framework.test import APIClient
 
-from core import factories
+from core import factories, models
 from core.api.viewsets import malware_detection
 from core.tests.conftest import TEAM, USER, VIA
 
@@ -91,6 +91,7 @@ def test_api_documents_attachment_upload_anonymous_success():
     assert file_head["Metadata"] == {"owner": "None", "status": "processing"}
     assert file_head["ContentType"] == "image/png"
     assert file_head["ContentDisposition"] == 'inline; filename="test.png"'
+    assert models.Attachment.objects.get(key=key).owner is None
 
 
 @pytest.mark.parametrize(
@@ -259,6 +260,13 @@ def test_api_documents_attachment_upload_success(via, role, mock_user_teams):
     assert file_head["ContentType"] == "image/png"
     assert file_head["ContentDisposition"] == 'inline; filename="test.png"'
 
+    attachment = models.Attachment.objects.get(key=key)
+    assert attachment.document == document
+    assert attachment.status == "processing"
+    assert attachment.content_type == "image/png"
+    assert attachment.size == len(PIXEL)
+    assert attachment.owner == user
+
 
 def test_api_documents_attachment_upload_invalid(client):
     """Attempt to upload without a file should return an explicit error."""
@@ -0,0 +1,422 @@
+"""
+Test the API endpoints uploading attachments directly to the object storage.
+"""
+
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+
+import pytest
+import requests
+from botocore.exceptions import ClientError
+from rest_framework.test import APIClient
+
+from core import factories, models
+from core.api.utils import get_attachment_upload_cache_key
+from core.api.viewsets import malware_detection
+from core.utils.s3 import get_s3_client
+
+pytestmark = pytest.mark.django_db
+
+PIXEL = (
+    b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00"
+    b"\x00\x00\x1f\x15\xc4\x89\x00\x00\x00\nIDATx\x9cc\xf8\xff\xff?\x00\x05\xfe\x02\xfe"
+    b"\xa7V\xbd\xfa\x00\x00\x00\x00IEND\xaeB`\x82"
+)
+
+
+def _upload(client, document, file_name, content):
+    """Start a direct upload and upload the content to the presigned urls."""
+    response = client.post(
+        f"/api/v1.0/documents/{document.id!s}/attachment-upload/multipart/",
+        {"file_name": file_name, "size": len(content)},
+        format="json",
+    )
+    assert response.status_code == 201
+    upload = response.json()
+
+    parts = []
+    for part in upload["parts"]:
+        offset = (part["part_number"] - 1) * upload["part_size"]
+        part_response = requests.put(
+            part["url"],
+            data=content[offset : offset + upload["part_size"]],
+            timeout=5,
+        )
+        part_response.raise_for_status()
+        parts.append(
+            {"part_number": part["part_number"], "etag": part_response.headers["ETag"]}
+        )
+
+    return upload, parts
+
+
+def _complete(client, document, upload, parts):
+    return client.post(
+        f"/api/v1.0/documents/{document.id!s}/attachment-upload/complete/",
+        {"upload_id": upload["upload_id"], "parts": parts},
+        format="json",
+    )
+
+
+def test_api_documents_attachment_upload_multipart_anonymous_forbidden():
+    """
+    Anonymous users should not be able to start a direct upload if the link reach
+    and role don't allow it.
+    """
+    document = factories.DocumentFactory(link_reach="public", link_role="reader")
+
+    response = APIClient().post(
+        f"/api/v1.0/documents/{document.id!s}/attachment-upload/multipart/",
+        {"file_name": "test.png", "size": len(PIXEL)},
+        format="json",
+    )
+
+    assert response.status_code == 401
+
+
+def test_api_documents_attachment_upload_multipart_reader_forbidden():
+    """Readers of a document should not be able to start a direct upload."""
+    user = factories.UserFactory()
+    client = APIClient()
+    client.force_login(user)
+
+    document = factories.DocumentFactory(
+        link_reach="restricted", users=[(user, "reader")]
+    )
+
+    response = client.post(
+        f"/api/v1.0/documents/{document.id!s}/attachment-upload/multipart/",
+        {"file_name": "test.png", "size": len(PIXEL)},
+        format="json",
+    )
+
+    assert response.status_code == 403
+
+
+def test_api_documents_attachment_upload_multipart_success():
+    """
+    Editors should be able to upload a file directly to the object storage and
+    register it as an attachment of the document.
+    """
+    user = factories.UserFactory()
+    client = APIClient()
+    client.force_login(user)
+
+    document = factories.DocumentFactory(
+        link_reach="restricted", users=[(user, "editor")]
+    )
+
+    upload, parts = _upload(client, document, "test.png", PIXEL)
+    key = upload["key"]
+    assert key.startswith(f"{document.id!s}/attachments/")
+    assert key.endswith(".png")
+    assert len(upload["parts"]) == 1
+
+    with mock.patch.object(malware_detection, "analyse_file") as mock_analyse_file:
+        response = _complete(client, document, upload, parts)
+
+    assert response.status_code == 201
+    url_parsed = urlparse(response.json()["file"])
+    assert url_parsed.path == f"/api/v1.0/documents/{document.id!s}/media-check/"
+    assert parse_qs(url_parsed.query)["key"] == [key]
+    mock_analyse_file.assert_called_once_with(key, document_id=document.id)
+
+    document.refresh_from_db()
+    assert document.attachments == [key]
+
+    attachment = models.Attachment.objects.get(key=key)
+    assert attachment.document == document
+    assert attachment.status == "processing"
+    assert attachment.content_type == "image/png"
+    assert attachment.size == len(PIXEL)
+    assert attachment.owner == user
+
+    file_head = default_storage.connection.meta.client.head_object(
+        Bucket=default_storage.bucket_name, Key=key
+    )
+    assert file_head["Metadata"] == {"owner": str(user.id), "status": "processing"}
+    assert file_head["ContentType"] == "image/png"
+    assert file_head["ContentDisposition"] == 'inline; filename="test.png"'
+    assert file_head["ContentLength"] == len(PIXEL)
+
+    # The upload can not be completed twice
+    response = _complete(client, document, upload, parts)
+    assert response.status_code == 400
+    assert response.json() == {"upload_id": ["Unknown upload."]}
+
+
+def test_api_documents_attachment_upload_multipart_parts(settings):
+    """Large files should be uploaded in several parts."""
+    settings.DOCUMENT_ATTACHMENT_UPLOAD_PART_SIZE = 5 * 1024 * 1024
+    user = factories.UserFactory()
+    client = APIClient()
+    client.force_login(user)
+
+    document = factories.DocumentFactory(
+        link_reach="restricted", users=[(user, "editor")]
+    )
+
+    response = client.post(
+        f"/api/v1.0/documents/{document.id!s}/attachment-upload/multipart/",
+        {"file_name": "test.pdf", "size": 7 * 1024 * 1024},
+        format="json",
+    )
+
+    assert response.status_code == 201
+    assert response.json()["part_size"] == 5 * 1024 * 1024
+    assert [part["part_number"] for part in response.json()["parts"]] == [1, 2]
+    assert cache.get(get_attachment_upload_cache_key(response.json()["upload_id"]))
+
+
+def test_api_documents_attachment_upload_multipart_too_large(settings):
+    """Files exceeding the maximum size should be rejected before being uploaded."""
+    settings.DOCUMENT_IMAGE_MAX_SIZE = 1024 * 1024
+    user = factories.UserFactory()
+    client = APIClient()
+    client.force_login(user)
+
+    document = factories.DocumentFactory(
+        link_reach="restricted", users=[(user, "editor")]
+    )
+
+    response = client.post(
+        f"/api/v1.0/documents/{document.id!s}/attachment-upload/multipart/",
+        {"file_name": "test.png", "size": 1024 * 1024 + 1},
+        format="json",
+    )
+
+    assert response.status_code == 400
+    assert response.json() == {"size": ["File size exceeds the maximum limit of 1 MB."]}
+
+
+def test_api_documents_attachment_upload_multipart_part_size_signed():
+    """
+    The length of each part should be signed in its url: the object storage must
+    refuse parts larger than the size declared.
+    """
+    user = factories.UserFactory()
+    client = APIClient()
+    client.force_login(user)
+
+    document = factories.DocumentFactory(
+        link_reach="restricted", users=[(user, "editor")]
+    )
+
+    response = client.post(
+        f"/api/v1.0/documents/{document.id!s}/attachment-upload/multipart/",
+        {"file_name": "test.png", "size": len(PIXEL)},
+        format="json",
+    )
+    upload = response.json()
+
+    part_response = requests.put(
+        upload["parts"][0]["url"], data=PIXEL + b"\x00" * 1024, timeout=5
+    )
+
+    assert part_response.status_code == 403
+
+
+def test_api_documents_attachment_upload_multipart_public_endpoint(settings):
+    """The part urls should be presigned on the endpoint reachable by browsers."""
+    settings.AWS_S3_PUBLIC_ENDPOINT_URL = "https://s3.example.com"
+    user = factories.UserFactory()
+    client = APIClient()
+    client.force_login(user)
+
+    document = factories.DocumentFactory(
+        link_reach="restricted", users=[(user, "editor")]
+    )
+
+    with mock.patch.dict("core.utils.s3._CLIENTS", clear=True):
+        response = client.post(
+            f"/api/v1.0/documents/{document.id!s}/attachment-upload/multipart/",
+            {"file_name": "test.png", "size": len(PIXEL)},
+            format="json",
+        )
+
+    assert response.status_code == 201
+    url = urlparse(response.json()["parts"][0]["url"])
+    assert f"{url.scheme:s}://{url.netloc:s}" == "https://s3.example.com"
+    assert "content-length" in parse_qs(url.query)["X-Amz-SignedHeaders"][0]
+
+
+def test_api_documents_attachment_upload_complete_size_verified(settings):
+    """
+    The size of the uploaded file should be verified again once uploaded, e.g. if
+    the maximum size was lowered meanwhile.
+    """
+    user = factories.UserFactory()
+    client = APIClient()
+    client.force_login(user)
+
+    document = factories.DocumentFactory(
+        link_reach="restricted", users=[(user, "editor")]
+    )
+
+    content = PIXEL + b"\x00" * (1024 * 1024)
+    upload, parts = _upload(client, document, "test.png", content)
+    settings.DOCUMENT_IMAGE_MAX_SIZE = 1024 * 1024
+
+    response = _complete(client, document, upload, parts)
+
+    assert response.status_code == 400
+    assert response.json() == {"file": ["File size exceeds the maximum limit of 1 MB."]}
+
+    document.refresh_from_db()
+    assert document.attachments == []
+    with pytest.raises(ClientError):
+        default_storage.connection.meta.client.head_object(
+            Bucket=default_storage.bucket_name, Key=upload["key"]
+        )
+
+
+def test_api_documents_attachment_upload_complete_type_verified():
+    """
+    The type of the uploaded file should be verified from its first bytes: a file
+    not matching its extension is stored as unsafe.
+    """
+    user = factories.UserFactory()
+    client = APIClient()
+    client.force_login(user)
+
+    document = factories.DocumentFactory(
+        link_reach="restricted", users=[(user, "editor")]
+    )
+
+    upload, parts = _upload(client, document, "test.png", b"just some text")
+
+    with mock.patch.object(malware_detection, "analyse_file"):
+        response = _complete(client, document, upload, parts)
+
+    assert response.status_code == 201
+    key = parse_qs(urlparse(response.json()["file"]).query)["key"][0]
+    assert key != upload["key"]
+    assert key.startswith(f"{document.id!s}/attachments/")
+    assert key.endswith("-unsafe.png")
+
+    document.refresh_from_db()
+    assert document.attachments == [key]
+
+    s3_client = default_storage.connection.meta.client
+    file_head = s3_client.head_object(Bucket=default_storage.bucket_name, Key=key)
+    assert file_head["Metadata"] == {
+        "owner": str(user.id),
+        "status": "processing",
+        "is_unsafe": "true",
+    }
+    assert file_head["ContentType"] == "text/plain"
+    assert file_head["ContentDisposition"] == 'attachment; filename="test.png"'
+
+    with pytest.raises(ClientError):
+        s3_client.head_object(Bucket=default_storage.bucket_name, Key=upload["key"])
+
+
+def test_api_documents_attachment_upload_complete_unversioned_bucket():
+    """
+    When the bucket is not versioned, the file should be copied and deleted
+    without addressing a version.
+    """
+    user = factories.UserFactory()
+    client = APIClient()
+    client.force_login(user)
+
+    document = factories.DocumentFactory(
+        link_reach="restricted", users=[(user, "editor")]
+    )
+
+    upload, parts = _upload(client, document, "test.png", b"just some text")
+
+    s3_client = get_s3_client()
+    get_object = s3_client.get_object
+
+    def get_object_unversioned(**kwargs):
+        response = get_object(**kwargs)
+        response.pop("VersionId", None)
+        return response
+
+    with (
+        mock.patch.object(s3_client, "get_object", side_effect=get_object_unversioned),
+        mock.patch.object(
+            s3_client, "copy_object", wraps=s3_client.copy_object
+        ) as mock_copy_object,
+        mock.patch.object(
+            s3_client, "delete_object", wraps=s3_client.delete_object
+        ) as mock_delete_object,
+        mock.patch.object(malware_detection, "analyse_file"),
+    ):
+        response = _complete(client, document, upload, parts)
+
+    assert response.status_code == 201
+    assert mock_copy_object.call_args.kwargs["CopySource"] == {
+        "Bucket": default_storage.bucket_name,
+        "Key": upload["key"],
+    }
+    mock_delete_object.assert_called_once_with(
+        Bucket=default_storage.bucket_name, Key=upload["key"]
+    )
+
+
+def test_api_documents_attachment_upload_complete_other_user():
+    """Only the user who started an upload should be able to complete it."""
+    user = factories.UserFactory()
+    other_user = factories.UserFactory()
+    client = APIClient()
+    client.force_login(user)
+
+    document = factories.DocumentFactory(
+        link_reach="restricted", users=[(user, "editor"), (other_user, "editor")]
+    )
+
+    upload, parts = _upload(client, document, "test.png", PIXEL)
+
+    client.force_login(other_user)
+    response = _complete(client, document, upload, parts)
+
+    assert response.status_code == 400
+    assert response.json() == {"upload_id": ["Unknown upload."]}
+
+    document.refresh_from_db()
+    assert document.attachments == []
+
+
+def test_api_documents_attachment_upload_complete_invalid_parts():
+    """Completing an upload with invalid parts should return a 400."""
+    user = factories.UserFactory()
+    client = APIClient()
+    client.force_login(user)
+
+    document = factories.DocumentFactory(
+        link_reach="restricted", users=[(user, "editor")]
+    )
+
+    upload, _parts = _upload(client, document, "test.png", PIXEL)
+
+    response = _complete(
+        client, document, upload, [{"part_number": 1, "etag": '"wrong"'}]
+    )
+
+    assert response.status_code == 400
+    assert response.json() == {"parts": ["The upload could not be completed."]}
+
+
+def test_api_documents_attachment_upload_complete_unannounced_parts():
+    """Completing an upload with more parts than announced should return a 400."""
+    user = factories.UserFactory()
+    client = APIClient()
+    client.force_login(user)
+
+    document = factories.DocumentFactory(
+        link_reach="restricted", users=[(user, "editor")]
+    )
+
+    upload, parts = _upload(client, document, "test.png", PIXEL)
+
+    response = _complete(
+        client, document, upload, [*parts, {"part_number": 2, "etag": '"other"'}]
+    )
+
+    assert response.status_code == 400
+    assert response.json() == {"parts": ["The upload has more parts than announced."]}
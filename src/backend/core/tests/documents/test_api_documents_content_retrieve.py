@@ -3,6 +3,7 @@ Tests for the GET /api/v1.0/documents/{id}/content/ endpoint.
 """
 
 from datetime import timedelta
+from unittest import mock
 from uuid import uuid4
 
 from django.core.cache import cache
@@ -15,8 +16,14 @@ from rest_framework import status
 from rest_framework.test import APIClient
 
 from core import factories
-from core.api.utils import get_content_metadata_cache_key
+from core.api.utils import (
+    get_content_head,
+    get_content_head_single_flight_cache_key,
+    get_content_metadata_cache_key,
+    get_content_single_flight_cache_key,
+)
 from core.tests.conftest import TEAM, USER, VIA
+from core.utils.s3 import get_s3_client
 
 pytestmark = pytest.mark.django_db
 
@@ -504,3 +511,174 @@ def test_api_documents_content_retrieve_reusing_last_modified_since_invalid():
     assert response["ETag"] is not None
     assert response["Last-Modified"] is not None
     assert response["Cache-Control"] == "private, no-cache"
+
+
+def test_api_documents_content_retrieve_single_flight_shares_fetch():
+    """
+    Requests for the same document content should share the object storage fetch
+    made by the first one instead of calling get_object again.
+    """
+    document = factories.DocumentFactory(link_reach="public")
+    client = APIClient()
+
+    with mock.patch.object(
+        get_s3_client(), "get_object", wraps=get_s3_client().get_object
+    ) as mock_get_object:
+        for _ in range(3):
+            response = client.get(f"/api/v1.0/documents/{document.id!s}/content/")
+
+            assert response.status_code == status.HTTP_200_OK
+            assert b"".join(
+                response.streaming_content
+            ) == factories.YDOC_HELLO_WORLD_BASE64.encode("utf-8")
+            assert response["ETag"] is not None
+
+    mock_get_object.assert_called_once()
+    assert cache.get(get_content_single_flight_cache_key(document.id, response["ETag"]))
+
+
+def test_api_documents_content_retrieve_single_flight_shares_head():
+    """
+    Requests for the same document content should share the metadata read by the
+    first one instead of calling head_object again.
+    """
+    document = factories.DocumentFactory(link_reach="public")
+    client = APIClient()
+
+    with mock.patch.object(
+        get_s3_client(), "head_object", wraps=get_s3_client().head_object
+    ) as mock_head_object:
+        for _ in range(3):
+            # Make sure the requests do not stop at the metadata cache
+            cache.delete(get_content_metadata_cache_key(document.id))
+            response = client.get(f"/api/v1.0/documents/{document.id!s}/content/")
+
+            assert response.status_code == status.HTTP_200_OK
+
+    mock_head_object.assert_called_once()
+    assert cache.get(get_content_head_single_flight_cache_key(document.file_key))
+
+
+def test_api_documents_content_retrieve_single_flight_head_invalidated():
+    """Updating the content through the API should forget the metadata shared."""
+    user = factories.UserFactory()
+    document = factories.DocumentFactory(users=[(user, "editor")])
+    client = APIClient()
+    client.force_login(user)
+
+    response = client.get(f"/api/v1.0/documents/{document.id!s}/content/")
+    assert response.status_code == status.HTTP_200_OK
+    assert cache.get(get_content_head_single_flight_cache_key(document.file_key))
+
+    response = client.patch(
+        f"/api/v1.0/documents/{document.id!s}/content/",
+        {"content": factories.YDOC_HELLO_WORLD_BASE64, "websocket": True},
+    )
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    assert not cache.get(get_content_head_single_flight_cache_key(document.file_key))
+
+
+def test_api_documents_content_retrieve_single_flight_etag():
+    """The conditional headers should be evaluated against the shared fetch."""
+    document = factories.DocumentFactory(link_reach="public")
+    client = APIClient()
+
+    response = client.get(f"/api/v1.0/documents/{document.id!s}/content/")
+    assert response.status_code == status.HTTP_200_OK
+    etag = response["ETag"]
+
+    # Make sure the 304 does not come from the metadata cache
+    cache.delete(get_content_metadata_cache_key(document.id))
+
+    with mock.patch.object(get_s3_client(), "get_object") as mock_get_object:
+        response = client.get(
+            f"/api/v1.0/documents/{document.id!s}/content/",
+            headers={"If-None-Match": etag},
+        )
+
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    mock_get_object.assert_not_called()
+
+
+def test_api_documents_content_retrieve_single_flight_saved():
+    """
+    A content saved again should not be served from the fetch shared for the
+    previous version.
+    """
+    document = factories.DocumentFactory(link_reach="public")
+    client = APIClient()
+
+    response = client.get(f"/api/v1.0/documents/{document.id!s}/content/")
+    assert response.status_code == status.HTTP_200_OK
+    previous_etag = response["ETag"]
+
+    document.content = "new content"
+    document.save()
+    cache.delete(get_content_metadata_cache_key(document.id))
+
+    response = client.get(f"/api/v1.0/documents/{document.id!s}/content/")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert b"".join(response.streaming_content) == b"new content"
+    assert response["ETag"] != previous_etag
+
+
+def test_api_documents_content_retrieve_single_flight_changed_while_fetching():
+    """
+    A content saved between the two object storage calls should be streamed from
+    the object storage instead of being fetched for the outdated etag.
+    """
+    document = factories.DocumentFactory(link_reach="public")
+    previous_head = get_content_head(document.file_key)
+
+    document.content = "new content"
+    document.save()
+
+    with mock.patch("core.api.utils.get_content_head", return_value=previous_head):
+        response = APIClient().get(f"/api/v1.0/documents/{document.id!s}/content/")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert b"".join(response.streaming_content) == b"new content"
+    assert not cache.get(
+        get_content_single_flight_cache_key(document.id, previous_head["etag"])
+    )
+
+
+def test_api_documents_content_retrieve_single_flight_too_large(settings):
+    """
+    Contents larger than the allowed size should be streamed from the object
+    storage, without being read in memory nor shared through the cache.
+    """
+    settings.CONTENT_SINGLE_FLIGHT_MAX_SIZE = 1
+    document = factories.DocumentFactory(link_reach="public")
+
+    with mock.patch(
+        "core.api.utils.fetch_content_single_flight"
+    ) as mock_fetch_content_single_flight:
+        response = APIClient().get(f"/api/v1.0/documents/{document.id!s}/content/")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert b"".join(
+        response.streaming_content
+    ) == factories.YDOC_HELLO_WORLD_BASE64.encode("utf-8")
+    mock_fetch_content_single_flight.assert_not_called()
+    assert not cache.get(
+        get_content_single_flight_cache_key(document.id, response["ETag"])
+    )
+
+
+def test_api_documents_content_retrieve_single_flight_disabled(settings):
+    """When single-flight is disabled, each request fetches the object storage."""
+    settings.CONTENT_SINGLE_FLIGHT_ENABLED = False
+    document = factories.DocumentFactory(link_reach="public")
+
+    response = APIClient().get(f"/api/v1.0/documents/{document.id!s}/content/")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert b"".join(
+        response.streaming_content
+    ) == factories.YDOC_HELLO_WORLD_BASE64.encode("utf-8")
+    assert not cache.get(
+        get_content_single_flight_cache_key(document.id, response["ETag"])
+    )
@@ -4,6 +4,7 @@ Tests for the PATCH /api/v1.0/documents/{id}/content/ endpoint.
 
 import base64
 from functools import cache
+from unittest import mock
 from uuid import uuid4
 
 from django.core.cache import cache as django_cache
@@ -585,3 +586,73 @@ def test_api_documents_content_upadte_invalid_yjs_doc():
     )
 
     assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def get_ydoc_with_images(*keys):
+    """Return a ydoc with an image block for each attachment key."""
+    ydoc = pycrdt.Doc()
+    ydoc["document-store"] = pycrdt.XmlFragment(
+        [pycrdt.XmlElement("image", {"url": f"/media/{key:s}"}) for key in keys]
+    )
+    return base64.b64encode(ydoc.get_update()).decode("utf-8")
+
+
+def test_api_documents_content_update_new_attachments_readable():
+    """
+    New attachments should be added to the document only if the user can read a
+    document holding them, directly or through one of its ancestors.
+    """
+    user = factories.UserFactory()
+    document = factories.DocumentFactory(users=[(user, "editor")])
+
+    readable_parent = factories.DocumentFactory(users=[user])
+    readable_child = factories.DocumentFactory(parent=readable_parent)
+    readable_key = f"{readable_child.id!s}/attachments/{uuid4()!s}.png"
+    readable_child.attachments = [readable_key]
+    readable_child.save()
+
+    other_document = factories.DocumentFactory(link_reach="restricted")
+    unreadable_key = f"{other_document.id!s}/attachments/{uuid4()!s}.png"
+    other_document.attachments = [unreadable_key]
+    other_document.save()
+
+    unknown_key = f"{uuid4()!s}/attachments/{uuid4()!s}.png"
+
+    client = APIClient()
+    client.force_login(user)
+
+    response = client.patch(
+        f"/api/v1.0/documents/{document.id!s}/content/",
+        {
+            "content": get_ydoc_with_images(readable_key, unreadable_key, unknown_key),
+            "websocket": True,
+        },
+    )
+
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    document.refresh_from_db()
+    assert document.attachments == [readable_key]
+
+
+def test_api_documents_content_update_known_attachments_not_materialized():
+    """
+    When the content references no attachment that is not already known, the
+    Yjs document should not be materialized to extract its attachments.
+    """
+    user = factories.UserFactory()
+    key = f"{uuid4()!s}/attachments/{uuid4()!s}.png"
+    document = factories.DocumentFactory(users=[(user, "editor")], attachments=[key])
+
+    client = APIClient()
+    client.force_login(user)
+
+    with mock.patch("core.utils.yjs.yjs_to_xml") as mock_yjs_to_xml:
+        response = client.patch(
+            f"/api/v1.0/documents/{document.id!s}/content/",
+            {"content": get_ydoc_with_images(key), "websocket": True},
+        )
+
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    mock_yjs_to_xml.assert_not_called()
+    document.refresh_from_db()
+    assert document.attachments == [key]
@@ -363,3 +363,28 @@ def test_api_documents_list_filter_title(query, nb_results):
     # Ensure all results contain the query in their title
     for result in results:
         assert query.lower().strip() in result["title"].lower()
+
+
+@pytest.mark.parametrize(
+    "query,nb_results",
+    [
+        ("velo", 2),  # Accents ignored in the titles
+        ("ÉLEC", 1),  # Accents and case ignored in the query
+        ("100%", 1),  # Wildcards matched literally
+        ("%", 1),
+        ("_", 1),
+    ],
+)
+def test_api_documents_list_filter_title_accents_and_wildcards(query, nb_results):
+    """Searching documents by title should ignore accents and escape wildcards."""
+    user = factories.UserFactory()
+    client = APIClient()
+    client.force_login(user)
+
+    for title in ["Vélo électrique", "velo", "Remboursé à 100%", "snake_case"]:
+        factories.DocumentFactory(title=title, users=[user])
+
+    response = client.get(f"/api/v1.0/documents/?{urlencode({'title': query})}")
+
+    assert response.status_code == 200
+    assert len(response.json()["results"]) == nb_results
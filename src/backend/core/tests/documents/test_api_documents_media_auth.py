@@ -19,6 +19,7 @@ from rest_framework.test import APIClient
 from core import factories, models
 from core.enums import DocumentAttachmentStatus
 from core.tests.conftest import TEAM, USER, VIA
+from core.utils import media_auth as media_auth_cache
 
 pytestmark = pytest.mark.django_db
 
@@ -547,21 +548,24 @@ def test_api_documents_media_auth_grant_via_deep_ancestor():
 
 
 # Number of DB queries a single media-auth authorization performs, end to end
-# (session + user resolution, the attachment lookup and the readable EXISTS).
+# (session + user resolution, the attachment lookup, the readable EXISTS and the
+# attachment status).
 # It is a small constant and, crucially, independent of how many documents the
 # instance holds -- that invariance is the regression guard for the thundering
 # herd, where the check used to materialise the user's entire readable set.
-MEDIA_AUTH_QUERY_COUNT = 5
+MEDIA_AUTH_QUERY_COUNT = 6
 
 
 def test_api_documents_media_auth_authorization_cost_is_bounded(
-    django_assert_num_queries,
+    django_assert_num_queries, settings
 ):
     """
     The authorization decision must not get more expensive as the instance
     grows: adding many unrelated readable documents leaves the query count
     unchanged.
     """
+    settings.MEDIA_AUTH_DECISION_CACHE_TIMEOUT = 0
+    settings.MEDIA_AUTH_READY_CACHE_TIMEOUT = 0
     user = factories.UserFactory()
     filename = f"{uuid4()!s}.jpg"
     document = factories.DocumentFactory(users=[user], link_reach="restricted")
@@ -578,3 +582,142 @@ def test_api_documents_media_auth_authorization_cost_is_bounded(
 
     with django_assert_num_queries(MEDIA_AUTH_QUERY_COUNT):
         assert _media_auth_ready(user, key).status_code == 200
+
+
+# -- Decision and ready caches --
+
+
+def test_api_documents_media_auth_decision_cached(django_assert_num_queries):
+    """
+    Repeated loads of an attachment should reuse the decision: neither the
+    attachment lookup, the readable EXISTS nor the object storage are called.
+    """
+    user = factories.UserFactory()
+    key = f"{uuid4()!s}/attachments/{uuid4()!s}.jpg"
+    factories.DocumentFactory(users=[user], link_reach="restricted", attachments=[key])
+
+    assert _media_auth_ready(user, key).status_code == 200
+
+    with (
+        # Only the session and user resolution remain
+        django_assert_num_queries(MEDIA_AUTH_QUERY_COUNT - 3),
+        patch.object(BaseClient, "_make_api_call") as mock_api_call,
+    ):
+        client = APIClient()
+        client.force_login(user)
+        response = client.get(
+            "/api/v1.0/documents/media-auth/",
+            HTTP_X_ORIGINAL_URL=f"http://localhost/media/{key:s}",
+        )
+
+    assert response.status_code == 200
+    assert "AWS4-HMAC-SHA256 Credential=" in response["Authorization"]
+    mock_api_call.assert_not_called()
+
+    # The decision is specific to the user
+    assert _media_auth_ready(factories.UserFactory(), key).status_code == 403
+
+
+def test_api_documents_media_auth_ready_cached():
+    """
+    An attachment declared ready should be served without checking its status in
+    the object storage.
+    """
+    key = f"{uuid4()!s}/attachments/{uuid4()!s}.jpg"
+    factories.DocumentFactory(link_reach="public", attachments=[key])
+    media_auth_cache.mark_attachment_ready(key)
+
+    with patch.object(BaseClient, "_make_api_call") as mock_api_call:
+        response = APIClient().get(
+            "/api/v1.0/documents/media-auth/",
+            HTTP_X_ORIGINAL_URL=f"http://localhost/media/{key:s}",
+        )
+
+    assert response.status_code == 200
+    mock_api_call.assert_not_called()
+
+
+def test_api_documents_media_auth_decision_invalidated_access_deleted():
+    """Deleting the access of a user should invalidate the cached decisions."""
+    user = factories.UserFactory()
+    root = factories.DocumentFactory(link_reach="restricted")
+    access = factories.UserDocumentAccessFactory(document=root, user=user)
+    key = f"{uuid4()!s}/attachments/{uuid4()!s}.jpg"
+    factories.DocumentFactory(parent=root, link_reach="restricted", attachments=[key])
+
+    assert _media_auth_ready(user, key).status_code == 200
+
+    access.delete()
+
+    assert _media_auth_ready(user, key).status_code == 403
+
+
+def test_api_documents_media_auth_decision_invalidated_link_configuration():
+    """Changing the link configuration should invalidate the cached decisions."""
+    owner = factories.UserFactory()
+    document = factories.DocumentFactory(
+        users=[(owner, "owner")], link_reach="public", link_role="reader"
+    )
+    key = f"{uuid4()!s}/attachments/{uuid4()!s}.jpg"
+    factories.DocumentFactory(
+        parent=document, link_reach="restricted", attachments=[key]
+    )
+
+    assert _media_auth_ready(None, key).status_code == 200
+
+    client = APIClient()
+    client.force_login(owner)
+    response = client.put(
+        f"/api/v1.0/documents/{document.id!s}/link-configuration/",
+        {"link_reach": "restricted", "link_role": "reader"},
+        format="json",
+    )
+    assert response.status_code == 200
+
+    assert _media_auth_ready(None, key).status_code == 403
+
+
+def test_api_documents_media_auth_decision_invalidated_move():
+    """Moving a document to another tree should invalidate the cached decisions."""
+    user = factories.UserFactory()
+    root = factories.DocumentFactory(users=[user], link_reach="restricted")
+    other_root = factories.DocumentFactory(link_reach="restricted")
+    key = f"{uuid4()!s}/attachments/{uuid4()!s}.jpg"
+    document = factories.DocumentFactory(
+        parent=root, link_reach="restricted", attachments=[key]
+    )
+
+    assert _media_auth_ready(user, key).status_code == 200
+
+    document.move(other_root, pos="first-child")
+
+    assert _media_auth_ready(user, key).status_code == 403
+
+
+def test_api_documents_media_auth_attachment_status_from_database():
+    """
+    The status of attachments registered in the database should be read from
+    there without calling the object storage.
+    """
+    document = factories.DocumentFactory(link_reach="public")
+    key = f"{document.id!s}/attachments/{uuid4()!s}.jpg"
+    document.attachments = [key]
+    document.save()
+    attachment = factories.AttachmentFactory(document=document, key=key)
+
+    original_url = f"http://localhost/media/{key:s}"
+    with patch.object(BaseClient, "_make_api_call") as mock_api_call:
+        response = APIClient().get(
+            "/api/v1.0/documents/media-auth/", HTTP_X_ORIGINAL_URL=original_url
+        )
+        assert response.status_code == 403
+
+        attachment.status = DocumentAttachmentStatus.READY
+        attachment.save()
+
+        response = APIClient().get(
+            "/api/v1.0/documents/media-auth/", HTTP_X_ORIGINAL_URL=original_url
+        )
+        assert response.status_code == 200
+
+    mock_api_call.assert_not_called()
@@ -276,3 +276,30 @@ def test_api_documents_media_check_restricted_document(via, mock_user_teams):
         "status": DocumentAttachmentStatus.READY,
         "file": f"/media/{key:s}",
     }
+
+
+@pytest.mark.parametrize("status", ["processing", "ready"])
+def test_api_documents_media_check_status_from_database(status):
+    """
+    The status of attachments registered in the database should be read from
+    there without calling the object storage.
+    """
+    document = factories.DocumentFactory(link_reach="public")
+    attachment = factories.AttachmentFactory(document=document, status=status)
+    document.attachments = [attachment.key]
+    document.save(update_fields=["attachments"])
+
+    with patch.object(
+        default_storage.connection.meta.client, "head_object"
+    ) as mock_head_object:
+        response = APIClient().get(
+            f"/api/v1.0/documents/{document.id!s}/media-check/",
+            {"key": attachment.key},
+        )
+
+    mock_head_object.assert_not_called()
+    assert response.status_code == 200
+    expected = {"status": status}
+    if status == "ready":
+        expected["file"] = f"/media/{attachment.key:s}"
+    assert response.json() == expected
@@ -0,0 +1,188 @@
+"""Test the "media_check_batch" endpoint."""
+
+from io import BytesIO
+from unittest.mock import patch
+from uuid import uuid4
+
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+import pytest
+from rest_framework.test import APIClient
+
+from core import factories
+from core.enums import DocumentAttachmentStatus
+from core.utils import media_auth as media_auth_cache
+
+pytestmark = pytest.mark.django_db
+
+
+def _put_attachment(document, status=None):
+    """Store an attachment of the document in the object storage, without row."""
+    key = f"{document.id!s}/attachments/{uuid4()!s}.jpg"
+    default_storage.connection.meta.client.put_object(
+        Bucket=default_storage.bucket_name,
+        Key=key,
+        Body=BytesIO(b"my prose"),
+        ContentType="text/plain",
+        Metadata={"status": status} if status else {},
+    )
+    return key
+
+
+def test_api_documents_media_check_batch_anonymous_non_public_document():
+    """Anonymous users should not be allowed to check medias of a private document."""
+    document = factories.DocumentFactory(link_reach="restricted")
+
+    response = APIClient().post(
+        f"/api/v1.0/documents/{document.id!s}/media-check/batch/",
+        {"keys": ["foo"]},
+        format="json",
+    )
+
+    assert response.status_code == 401
+
+
+def test_api_documents_media_check_batch_authenticated_no_access():
+    """Users without access to a restricted document should not check its medias."""
+    user = factories.UserFactory()
+    document = factories.DocumentFactory(link_reach="restricted")
+
+    client = APIClient()
+    client.force_login(user)
+
+    response = client.post(
+        f"/api/v1.0/documents/{document.id!s}/media-check/batch/",
+        {"keys": ["foo"]},
+        format="json",
+    )
+
+    assert response.status_code == 403
+
+
+@pytest.mark.parametrize("keys", [None, [], "foo"])
+def test_api_documents_media_check_batch_invalid_keys(keys):
+    """A non-empty list of keys should be required."""
+    document = factories.DocumentFactory(link_reach="public")
+    data = {} if keys is None else {"keys": keys}
+
+    response = APIClient().post(
+        f"/api/v1.0/documents/{document.id!s}/media-check/batch/",
+        data,
+        format="json",
+    )
+
+    assert response.status_code == 400
+    assert "keys" in response.json()
+
+
+def test_api_documents_media_check_batch_too_many_keys(settings):
+    """The number of keys checked at once should be limited by a setting."""
+    settings.MEDIA_CHECK_BATCH_MAX_KEYS = 2
+    document = factories.DocumentFactory(link_reach="public")
+
+    response = APIClient().post(
+        f"/api/v1.0/documents/{document.id!s}/media-check/batch/",
+        {"keys": ["a", "b", "c"]},
+        format="json",
+    )
+
+    assert response.status_code == 400
+    assert response.json() == {
+        "keys": ["Ensure this field has no more than 2 elements."]
+    }
+
+
+def test_api_documents_media_check_batch_mixed_statuses():
+    """
+    Each key should be answered with the body the "media-check" endpoint would
+    return for it, whatever the source of its status.
+    """
+    document = factories.DocumentFactory(link_reach="public")
+
+    ready = factories.AttachmentFactory(
+        document=document, status=DocumentAttachmentStatus.READY
+    )
+    processing = factories.AttachmentFactory(
+        document=document, status=DocumentAttachmentStatus.PROCESSING
+    )
+    legacy_ready = _put_attachment(document, DocumentAttachmentStatus.READY)
+    legacy_no_status = _put_attachment(document)
+    missing_on_storage = f"{document.id!s}/attachments/{uuid4()!s}.jpg"
+    unrelated = f"{document.id!s}/attachments/{uuid4()!s}.jpg"
+
+    document.attachments = [
+        ready.key,
+        processing.key,
+        legacy_ready,
+        legacy_no_status,
+        missing_on_storage,
+    ]
+    document.save(update_fields=["attachments"])
+
+    response = APIClient().post(
+        f"/api/v1.0/documents/{document.id!s}/media-check/batch/",
+        {
+            "keys": [
+                ready.key,
+                processing.key,
+                legacy_ready,
+                legacy_no_status,
+                missing_on_storage,
+                unrelated,
+            ]
+        },
+        format="json",
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {
+        ready.key: {"status": "ready", "file": f"/media/{ready.key:s}"},
+        processing.key: {"status": "processing"},
+        legacy_ready: {"status": "ready", "file": f"/media/{legacy_ready:s}"},
+        legacy_no_status: {"status": "processing"},
+        missing_on_storage: {"detail": "Media not found"},
+        unrelated: {"detail": "Attachment missing"},
+    }
+
+
+def test_api_documents_media_check_batch_bounded_cost():
+    """
+    Attachments known to be ready or registered in the database should be checked
+    with a number of queries that does not depend on the number of keys, and
+    without calling the object storage.
+    """
+    document = factories.DocumentFactory(link_reach="public")
+    attachments = factories.AttachmentFactory.create_batch(
+        5, document=document, status=DocumentAttachmentStatus.PROCESSING
+    )
+    cached_keys = [f"{document.id!s}/attachments/{uuid4()!s}.png" for _ in range(5)]
+    for key in cached_keys:
+        media_auth_cache.mark_attachment_ready(key)
+
+    keys = [attachment.key for attachment in attachments] + cached_keys
+    document.attachments = keys
+    document.save(update_fields=["attachments"])
+
+    client = APIClient()
+    queries_counts = []
+    with patch.object(
+        default_storage.connection.meta.client, "head_object"
+    ) as mock_head_object:
+        for batch in [keys[:1], keys]:
+            with CaptureQueriesContext(connection) as queries:
+                response = client.post(
+                    f"/api/v1.0/documents/{document.id!s}/media-check/batch/",
+                    {"keys": batch},
+                    format="json",
+                )
+            assert response.status_code == 200
+            queries_counts.append(len(queries))
+
+    mock_head_object.assert_not_called()
+    assert queries_counts[0] == queries_counts[1]
+    assert {key: body["status"] for key, body in response.json().items()} == {
+        **{attachment.key: "processing" for attachment in attachments},
+        **dict.fromkeys(cached_keys, "ready"),
+    }
@@ -4,6 +4,9 @@ Tests for Documents API endpoint in impress's core app: search
 
 from unittest import mock
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
 import pytest
 import responses
 from faker import Faker
@@ -143,6 +146,30 @@ def test_api_documents_search_fall_back_on_simple_search(
         "next": None,
         "previous": None,
         "results": [
+            {
+                "abilities": document.get_abilities(user),
+                "ancestors_link_role": None,
+                "ancestors_link_reach": None,
+                "computed_link_reach": document.computed_link_reach,
+                "computed_link_role": document.computed_link_role,
+                "created_at": document.created_at.isoformat().replace("+00:00", "Z"),
+                "creator": str(document.creator.id),
+                "deleted_at": None,
+                "depth": 1,
+                "excerpt": document.excerpt,
+                "id": str(document.id),
+                "is_favorite": False,
+                "link_reach": document.link_reach,
+                "link_role": document.link_role,
+                "numchild": 0,
+                "nb_accesses_ancestors": document.nb_accesses_ancestors,
+                "nb_accesses_direct": document.nb_accesses_direct,
+                "path": document.path,
+                "title": document.title,
+                "updated_at": document.updated_at.isoformat().replace("+00:00", "Z"),
+                "user_role": "owner",
+                "parent": None,
+            },
             {
                 "abilities": child.get_abilities(user),
                 "ancestors_link_reach": child.ancestors_link_reach,
@@ -189,30 +216,6 @@ def test_api_documents_search_fall_back_on_simple_search(
                     "user_role": "owner",
                 },
             },
-            {
-                "abilities": document.get_abilities(user),
-                "ancestors_link_role": None,
-                "ancestors_link_reach": None,
-                "computed_link_reach": document.computed_link_reach,
-                "computed_link_role": document.computed_link_role,
-                "created_at": document.created_at.isoformat().replace("+00:00", "Z"),
-                "creator": str(document.creator.id),
-                "deleted_at": None,
-                "depth": 1,
-                "excerpt": document.excerpt,
-                "id": str(document.id),
-                "is_favorite": False,
-                "link_reach": document.link_reach,
-                "link_role": document.link_role,
-                "numchild": 0,
-                "nb_accesses_ancestors": document.nb_accesses_ancestors,
-                "nb_accesses_direct": document.nb_accesses_direct,
-                "path": document.path,
-                "title": document.title,
-                "updated_at": document.updated_at.isoformat().replace("+00:00", "Z"),
-                "user_role": "owner",
-                "parent": None,
-            },
         ],
     }
 
@@ -260,52 +263,6 @@ def test_api_documents_search_simple_search_only_match_in_depth(settings):
         "next": None,
         "previous": None,
         "results": [
-            {
-                "abilities": child.get_abilities(user),
-                "ancestors_link_reach": child.ancestors_link_reach,
-                "ancestors_link_role": child.ancestors_link_role,
-                "computed_link_reach": child.computed_link_reach,
-                "computed_link_role": child.computed_link_role,
-                "created_at": child.created_at.isoformat().replace("+00:00", "Z"),
-                "creator": str(child.creator.id),
-                "deleted_at": None,
-                "depth": 2,
-                "excerpt": child.excerpt,
-                "id": str(child.id),
-                "is_favorite": False,
-                "link_reach": child.link_reach,
-                "link_role": child.link_role,
-                "numchild": 0,
-                "nb_accesses_ancestors": child.nb_accesses_ancestors,
-                "nb_accesses_direct": child.nb_accesses_direct,
-                "path": child.path,
-                "title": child.title,
-                "updated_at": child.updated_at.isoformat().replace("+00:00", "Z"),
-                "user_role": "owner",
-                "parent": {
-                    "abilities": parent.get_abilities(user),
-                    "ancestors_link_role": None,
-                    "ancestors_link_reach": None,
-                    "computed_link_reach": parent.computed_link_reach,
-                    "computed_link_role": parent.computed_link_role,
-                    "created_at": parent.created_at.isoformat().replace("+00:00", "Z"),
-                    "creator": str(parent.creator.id),
-                    "deleted_at": None,
-                    "depth": 1,
-                    "excerpt": parent.excerpt,
-                    "id": str(parent.id),
-                    "is_favorite": False,
-                    "link_reach": parent.link_reach,
-                    "link_role": parent.link_role,
-                    "numchild": 1,
-                    "nb_accesses_ancestors": parent.nb_accesses_ancestors,
-                    "nb_accesses_direct": parent.nb_accesses_direct,
-                    "path": parent.path,
-                    "title": parent.title,
-                    "updated_at": parent.updated_at.isoformat().replace("+00:00", "Z"),
-                    "user_role": "owner",
-                },
-            },
             {
                 "abilities": subdocument.get_abilities(user),
                 "ancestors_link_role": subdocument.ancestors_link_role,
@@ -356,6 +313,52 @@ def test_api_documents_search_simple_search_only_match_in_depth(settings):
                     "user_role": "owner",
                 },
             },
+            {
+                "abilities": child.get_abilities(user),
+                "ancestors_link_reach": child.ancestors_link_reach,
+                "ancestors_link_role": child.ancestors_link_role,
+                "computed_link_reach": child.computed_link_reach,
+                "computed_link_role": child.computed_link_role,
+                "created_at": child.created_at.isoformat().replace("+00:00", "Z"),
+                "creator": str(child.creator.id),
+                "deleted_at": None,
+                "depth": 2,
+                "excerpt": child.excerpt,
+                "id": str(child.id),
+                "is_favorite": False,
+                "link_reach": child.link_reach,
+                "link_role": child.link_role,
+                "numchild": 0,
+                "nb_accesses_ancestors": child.nb_accesses_ancestors,
+                "nb_accesses_direct": child.nb_accesses_direct,
+                "path": child.path,
+                "title": child.title,
+                "updated_at": child.updated_at.isoformat().replace("+00:00", "Z"),
+                "user_role": "owner",
+                "parent": {
+                    "abilities": parent.get_abilities(user),
+                    "ancestors_link_role": None,
+                    "ancestors_link_reach": None,
+                    "computed_link_reach": parent.computed_link_reach,
+                    "computed_link_role": parent.computed_link_role,
+                    "created_at": parent.created_at.isoformat().replace("+00:00", "Z"),
+                    "creator": str(parent.creator.id),
+                    "deleted_at": None,
+                    "depth": 1,
+                    "excerpt": parent.excerpt,
+                    "id": str(parent.id),
+                    "is_favorite": False,
+                    "link_reach": parent.link_reach,
+                    "link_role": parent.link_role,
+                    "numchild": 1,
+                    "nb_accesses_ancestors": parent.nb_accesses_ancestors,
+                    "nb_accesses_direct": parent.nb_accesses_direct,
+                    "path": parent.path,
+                    "title": parent.title,
+                    "updated_at": parent.updated_at.isoformat().replace("+00:00", "Z"),
+                    "user_role": "owner",
+                },
+            },
         ],
     }
 
@@ -411,31 +414,27 @@ def test_api_documents_search_with_title_also_matching_link_traces(settings):
         "previous": None,
         "results": [
             {
-                "abilities": document_link_trace.get_abilities(user),
+                "abilities": document.get_abilities(user),
                 "ancestors_link_role": None,
                 "ancestors_link_reach": None,
-                "computed_link_reach": document_link_trace.computed_link_reach,
-                "computed_link_role": document_link_trace.computed_link_role,
-                "created_at": document_link_trace.created_at.isoformat().replace(
-                    "+00:00", "Z"
-                ),
-                "creator": str(document_link_trace.creator.id),
+                "computed_link_reach": document.computed_link_reach,
+                "computed_link_role": document.computed_link_role,
+                "created_at": document.created_at.isoformat().replace("+00:00", "Z"),
+                "creator": str(document.creator.id),
                 "deleted_at": None,
                 "depth": 1,
-                "excerpt": document_link_trace.excerpt,
-                "id": str(document_link_trace.id),
+                "excerpt": document.excerpt,
+                "id": str(document.id),
                 "is_favorite": False,
-                "link_reach": document_link_trace.link_reach,
-                "link_role": document_link_trace.link_role,
+                "link_reach": document.link_reach,
+                "link_role": document.link_role,
                 "numchild": 0,
-                "nb_accesses_ancestors": document_link_trace.nb_accesses_ancestors,
-                "nb_accesses_direct": document_link_trace.nb_accesses_direct,
-                "path": document_link_trace.path,
-                "title": document_link_trace.title,
-                "updated_at": document_link_trace.updated_at.isoformat().replace(
-                    "+00:00", "Z"
-                ),
-                "user_role": None,
+                "nb_accesses_ancestors": document.nb_accesses_ancestors,
+                "nb_accesses_direct": document.nb_accesses_direct,
+                "path": document.path,
+                "title": document.title,
+                "updated_at": document.updated_at.isoformat().replace("+00:00", "Z"),
+                "user_role": "owner",
                 "parent": None,
             },
             {
@@ -485,33 +484,74 @@ def test_api_documents_search_with_title_also_matching_link_traces(settings):
                 },
             },
             {
-                "abilities": document.get_abilities(user),
+                "abilities": document_link_trace.get_abilities(user),
                 "ancestors_link_role": None,
                 "ancestors_link_reach": None,
-                "computed_link_reach": document.computed_link_reach,
-                "computed_link_role": document.computed_link_role,
-                "created_at": document.created_at.isoformat().replace("+00:00", "Z"),
-                "creator": str(document.creator.id),
+                "computed_link_reach": document_link_trace.computed_link_reach,
+                "computed_link_role": document_link_trace.computed_link_role,
+                "created_at": document_link_trace.created_at.isoformat().replace(
+                    "+00:00", "Z"
+                ),
+                "creator": str(document_link_trace.creator.id),
                 "deleted_at": None,
                 "depth": 1,
-                "excerpt": document.excerpt,
-                "id": str(document.id),
+                "excerpt": document_link_trace.excerpt,
+                "id": str(document_link_trace.id),
                 "is_favorite": False,
-                "link_reach": document.link_reach,
-                "link_role": document.link_role,
+                "link_reach": document_link_trace.link_reach,
+                "link_role": document_link_trace.link_role,
                 "numchild": 0,
-                "nb_accesses_ancestors": document.nb_accesses_ancestors,
-                "nb_accesses_direct": document.nb_accesses_direct,
-                "path": document.path,
-                "title": document.title,
-                "updated_at": document.updated_at.isoformat().replace("+00:00", "Z"),
-                "user_role": "owner",
+                "nb_accesses_ancestors": document_link_trace.nb_accesses_ancestors,
+                "nb_accesses_direct": document_link_trace.nb_accesses_direct,
+                "path": document_link_trace.path,
+                "title": document_link_trace.title,
+                "updated_at": document_link_trace.updated_at.isoformat().replace(
+                    "+00:00", "Z"
+                ),
+                "user_role": None,
                 "parent": None,
             },
         ],
     }
 
 
+def test_api_documents_search_ranked_by_title_similarity(settings):
+    """
+    Without an explicit ordering, documents found in database should be ranked by
+    similarity of their title with the query.
+    """
+    assert get_document_indexer() is None
+
+    user = factories.UserFactory()
+    titles = ["alpha", "alpha beta gamma delta", "the alphabet"]
+    for title in titles:
+        factories.DocumentFactory(users=[user], title=title)
+
+    client = APIClient()
+    client.force_login(user)
+
+    response = client.get("/api/v1.0/documents/search/", data={"q": "ALPHA"})
+
+    assert response.status_code == 200
+    assert [result["title"] for result in response.json()["results"]] == [
+        "alpha",
+        "the alphabet",
+        "alpha beta gamma delta",
+    ]
+
+    # An explicit ordering takes precedence
+    response = client.get(
+        "/api/v1.0/documents/search/", data={"q": "alpha", "ordering": "-updated_at"}
+    )
+
+    assert response.status_code == 200
+    assert [result["title"] for result in response.json()["results"]] == [
+        "the alphabet",
+        "alpha beta gamma delta",
+        "alpha",
+    ]
+
+
 @mock.patch("core.api.viewsets.DocumentViewSet._search_using_database")
 def test_api_documents_search_indexer_crashes(
     mock_search_using_database, indexer_settings
@@ -579,36 +619,178 @@ def test_api_documents_search_invalid_params(indexer_settings):
     assert response.json() == {"q": ["This field is required."]}
 
 
-@responses.activate
-def test_api_documents_search_success(indexer_settings):
-    """Validate the format of documents as returned by the search view."""
-    indexer_settings.SEARCH_URL = "http://find/api/v1.0/search"
-    assert get_document_indexer() is not None
-
-    document = {"id": "doc-123", "title": "alpha", "path": "path/to/alpha.pdf"}
-
-    # Find response
+def _mock_find_hits(*documents):
+    """Mock a response of Find ranking the given documents."""
     responses.add(
         responses.POST,
         "http://find/api/v1.0/search",
         json=[
             {
-                "_id": str(document["id"]),
-                "_source": {"title": document["title"], "path": document["path"]},
-            },
+                "_id": str(document.id),
+                "_source": {"title": document.title, "path": document.path},
+            }
+            for document in documents
         ],
         status=200,
     )
-    response = APIClient().get("/api/v1.0/documents/search/", data={"q": "alpha"})
+
+
+@responses.activate
+def test_api_documents_search_success(indexer_settings):
+    """
+    Documents found by the indexer should be loaded from the database and returned
+    in ranking order, with their abilities, role, favorite status and top parent.
+    """
+    indexer_settings.SEARCH_URL = "http://find/api/v1.0/search"
+    assert get_document_indexer() is not None
+
+    user = factories.UserFactory()
+    parent = factories.DocumentFactory(users=[(user, "owner")], title="top parent")
+    child = factories.DocumentFactory(parent=parent, title="alpha blondy")
+    document = factories.DocumentFactory(
+        users=[(user, "editor")], favorited_by=[user], title="alpha"
+    )
+
+    _mock_find_hits(child, document)
+
+    client = APIClient()
+    client.force_login(user)
+    response = client.get("/api/v1.0/documents/search/", data={"q": "alpha"})
 
     assert response.status_code == 200
     content = response.json()
     results = content.pop("results")
     assert content == {
-        "count": 1,
+        "count": 2,
         "next": None,
         "previous": None,
     }
-    assert results == [
-        {"id": document["id"], "title": document["title"], "path": document["path"]}
+    assert [result["id"] for result in results] == [str(child.id), str(document.id)]
+
+    assert results[0]["abilities"] == child.get_abilities(user)
+    assert results[0]["user_role"] == "owner"
+    assert results[0]["is_favorite"] is False
+    assert results[0]["ancestors_link_reach"] == child.ancestors_link_reach
+    assert results[0]["computed_link_reach"] == child.computed_link_reach
+    assert results[0]["parent"]["id"] == str(parent.id)
+    assert results[0]["parent"]["abilities"] == parent.get_abilities(user)
+    assert results[0]["parent"]["user_role"] == "owner"
+
+    assert results[1]["abilities"] == document.get_abilities(user)
+    assert results[1]["user_role"] == "editor"
+    assert results[1]["is_favorite"] is True
+    assert results[1]["parent"] is None
+
+
+@responses.activate
+def test_api_documents_search_drop_unreadable(indexer_settings):
+    """
+    Documents found by the indexer that the user can no longer read, that were
+    deleted or that do not exist should not be returned.
+    """
+    indexer_settings.SEARCH_URL = "http://find/api/v1.0/search"
+
+    user = factories.UserFactory()
+    readable = factories.DocumentFactory(users=[user], title="alpha")
+    restricted = factories.DocumentFactory(
+        link_reach=LinkReachChoices.RESTRICTED, title="alpha"
+    )
+    deleted = factories.DocumentFactory(users=[(user, "owner")], title="alpha")
+    deleted_child = factories.DocumentFactory(parent=deleted, title="alpha")
+    deleted.soft_delete()
+    public = factories.DocumentFactory(link_reach=LinkReachChoices.PUBLIC)
+
+    responses.add(
+        responses.POST,
+        "http://find/api/v1.0/search",
+        json=[
+            {"_id": "doc-123", "_source": {}},
+            {"_id": str(restricted.id), "_source": {}},
+            {"_id": str(public.id), "_source": {}},
+            {"_id": str(deleted.id), "_source": {}},
+            {"_id": str(deleted_child.id), "_source": {}},
+            {"_id": str(fake.uuid4()), "_source": {}},
+            {"_id": str(readable.id), "_source": {}},
+        ],
+        status=200,
+    )
+
+    client = APIClient()
+    client.force_login(user)
+    response = client.get("/api/v1.0/documents/search/", data={"q": "alpha"})
+
+    assert response.status_code == 200
+    assert response.json()["count"] == 2
+    assert [result["id"] for result in response.json()["results"]] == [
+        str(public.id),
+        str(readable.id),
+    ]
+
+
+@responses.activate
+def test_api_documents_search_parent_link_trace(indexer_settings):
+    """
+    The top parent of a document found by the indexer should be its highest
+    ancestor visited by the user, unless it is restricted.
+    """
+    indexer_settings.SEARCH_URL = "http://find/api/v1.0/search"
+
+    user = factories.UserFactory()
+    grand_parent = factories.DocumentFactory(
+        link_reach=LinkReachChoices.RESTRICTED, link_traces=[user]
+    )
+    parent = factories.DocumentFactory(
+        parent=grand_parent,
+        link_reach=LinkReachChoices.AUTHENTICATED,
+        link_traces=[user],
+    )
+    document = factories.DocumentFactory(parent=parent, title="alpha")
+
+    _mock_find_hits(document)
+
+    client = APIClient()
+    client.force_login(user)
+    response = client.get("/api/v1.0/documents/search/", data={"q": "alpha"})
+
+    assert response.status_code == 200
+    (result,) = response.json()["results"]
+    assert result["id"] == str(document.id)
+    assert result["ancestors_link_reach"] == LinkReachChoices.AUTHENTICATED
+    assert result["parent"]["id"] == str(parent.id)
+    assert result["parent"]["ancestors_link_reach"] == LinkReachChoices.RESTRICTED
+
+
+@responses.activate
+def test_api_documents_search_hydration_queries(indexer_settings):
+    """
+    The number of queries hydrating the documents found by the indexer should not
+    depend on the number of documents.
+    """
+    indexer_settings.SEARCH_URL = "http://find/api/v1.0/search"
+
+    user = factories.UserFactory()
+    parent = factories.DocumentFactory(users=[user])
+    documents = [
+        factories.DocumentFactory(parent=factories.DocumentFactory(parent=parent))
+        for _ in range(5)
     ]
+
+    client = APIClient()
+    client.force_login(user)
+
+    def count_queries(hits):
+        responses.replace(
+            responses.POST,
+            "http://find/api/v1.0/search",
+            json=[{"_id": str(hit.id), "_source": {}} for hit in hits],
+            status=200,
+        )
+        # The number of accesses of each document is cached by a first request
+        client.get("/api/v1.0/documents/search/", data={"q": "alpha"})
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get("/api/v1.0/documents/search/", data={"q": "alpha"})
+        assert response.json()["count"] == len(hits)
+        return len(queries)
+
+    _mock_find_hits()
+    assert count_queries(documents[:1]) == count_queries(documents)
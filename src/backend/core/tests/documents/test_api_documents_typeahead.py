@@ -0,0 +1,289 @@
+"""
+Tests for Documents API endpoint in impress's core app: typeahead
+"""
+
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection
+from django.utils import timezone
+
+import pytest
+from rest_framework.test import APIClient
+
+from core import factories, models
+from core.api import typeahead
+
+pytestmark = pytest.mark.django_db
+
+
+def _typeahead(client, q):
+    """Return the titles suggested for a query."""
+    response = client.get("/api/v1.0/documents/typeahead/", data={"q": q})
+    assert response.status_code == 200
+    return [result["title"] for result in response.json()]
+
+
+def test_api_documents_typeahead_anonymous():
+    """Anonymous users should not be allowed to use the typeahead."""
+    response = APIClient().get("/api/v1.0/documents/typeahead/", data={"q": "alpha"})
+
+    assert response.status_code == 401
+
+
+def test_api_documents_typeahead_prefix():
+    """
+    Documents whose title has a word starting with the query should be suggested,
+    those whose title starts with it first, with only their id, title and path.
+    """
+    user = factories.UserFactory()
+    client = APIClient()
+    client.force_login(user)
+
+    document = factories.DocumentFactory(users=[user], title="Réunion budget")
+    factories.DocumentFactory(users=[user], title="Compte-rendu de réunion")
+    factories.DocumentFactory(users=[user], title="Préréunion")
+    factories.DocumentFactory(title="Réunion secrète")
+
+    response = client.get("/api/v1.0/documents/typeahead/", data={"q": "REU"})
+
+    assert response.status_code == 200
+    assert response.json()[0] == {
+        "id": str(document.id),
+        "title": "Réunion budget",
+        "path": document.path,
+    }
+    assert _typeahead(client, "reu") == ["Réunion budget", "Compte-rendu de réunion"]
+    assert _typeahead(client, "rendu") == ["Compte-rendu de réunion"]
+    assert _typeahead(client, " ") == []
+
+
+def test_api_documents_typeahead_readable(settings):
+    """
+    Descendants of the documents the user has access to or visited, if they are
+    not restricted, should be suggested, the most recently updated first.
+    """
+    settings.TYPEAHEAD_MAX_RESULTS = 3
+    user = factories.UserFactory()
+    client = APIClient()
+    client.force_login(user)
+
+    parent = factories.DocumentFactory(users=[user], title="alpha parent")
+    factories.DocumentFactory(parent=parent, title="alpha child")
+    visited = factories.DocumentFactory(link_reach="public", title="alpha visited")
+    restricted = factories.DocumentFactory(
+        link_reach="restricted", title="alpha restricted"
+    )
+    factories.DocumentFactory(users=[user], title="alpha deleted").soft_delete()
+    for document in [visited, restricted]:
+        models.LinkTrace.objects.create(document=document, user=user)
+
+    assert _typeahead(client, "alpha") == [
+        "alpha visited",
+        "alpha child",
+        "alpha parent",
+    ]
+
+
+def test_api_documents_typeahead_cached(django_assert_num_queries):
+    """Candidates should be served from the cache between two refreshes."""
+    user = factories.UserFactory()
+    factories.DocumentFactory(users=[user], title="alpha")
+
+    typeahead.get_candidates(user)
+
+    with django_assert_num_queries(0):
+        candidates = typeahead.get_candidates(user)
+
+    assert typeahead.search(candidates, "alp", 10)[0]["title"] == "alpha"
+
+
+def test_api_documents_typeahead_refreshed_incrementally(settings):
+    """
+    Candidates should be refreshed with the documents updated since the last
+    refresh, without being built again.
+    """
+    settings.TYPEAHEAD_REFRESH_INTERVAL = 0
+    user = factories.UserFactory()
+    parent = factories.DocumentFactory(users=[user], title="alpha")
+    deleted = factories.DocumentFactory(parent=parent, title="alpha deleted")
+
+    typeahead.get_candidates(user)
+
+    models.Document.objects.filter(pk=parent.pk).update(
+        title="beta", updated_at=timezone.now()
+    )
+    factories.DocumentFactory(parent=parent, title="alpha new")
+    deleted.soft_delete()
+
+    with mock.patch.object(typeahead, "_build_candidates", side_effect=AssertionError):
+        candidates = typeahead.get_candidates(user)
+
+    assert [hit["title"] for hit in typeahead.search(candidates, "alpha", 10)] == [
+        "alpha new"
+    ]
+    assert [hit["title"] for hit in typeahead.search(candidates, "beta", 10)] == [
+        "beta"
+    ]
+
+
+def test_api_documents_typeahead_refreshed_capped(settings):
+    """
+    Candidates refreshed should be capped like candidates built, keeping the
+    documents updated last.
+    """
+    settings.TYPEAHEAD_REFRESH_INTERVAL = 0
+    settings.TYPEAHEAD_MAX_CANDIDATES = 2
+    user = factories.UserFactory()
+    parent = factories.DocumentFactory(users=[user], title="alpha parent")
+    child = factories.DocumentFactory(parent=parent, title="alpha child")
+
+    assert len(typeahead.get_candidates(user)["documents"]) == 2
+
+    factories.DocumentFactory(parent=parent, title="alpha new")
+    models.Document.objects.filter(pk=parent.pk).update(
+        updated_at=timezone.now() - timedelta(days=1)
+    )
+    models.Document.objects.filter(pk=child.pk).update(updated_at=timezone.now())
+
+    with mock.patch.object(typeahead, "_build_candidates", side_effect=AssertionError):
+        candidates = typeahead.get_candidates(user)
+
+    assert sorted(
+        hit["title"] for hit in typeahead.search(candidates, "alpha", 10)
+    ) == ["alpha child", "alpha new"]
+
+
+def test_api_documents_typeahead_access_invalidates():
+    """Candidates should be built again when the accesses of the user change."""
+    user = factories.UserFactory()
+    client = APIClient()
+    client.force_login(user)
+    document = factories.DocumentFactory(title="alpha")
+
+    assert _typeahead(client, "alpha") == []
+
+    factories.UserDocumentAccessFactory(document=document, user=user)
+
+    assert _typeahead(client, "alpha") == ["alpha"]
+
+    models.DocumentAccess.objects.filter(document=document, user=user).delete()
+
+    assert _typeahead(client, "alpha") == []
+
+
+def test_api_documents_typeahead_moved_out():
+    """
+    Candidates should be built again when a document is moved out of the documents
+    the user has access to.
+    """
+    user = factories.UserFactory()
+    client = APIClient()
+    client.force_login(user)
+    parent = factories.DocumentFactory(users=[user], title="parent")
+    document = factories.DocumentFactory(parent=parent, title="alpha")
+    other = factories.DocumentFactory(title="other")
+
+    assert _typeahead(client, "alpha") == ["alpha"]
+
+    document.move(other, pos="first-child")
+
+    assert _typeahead(client, "alpha") == []
+
+
+def test_api_documents_typeahead_moved_in():
+    """
+    Candidates should be built again when a document is moved into the documents
+    the user has access to.
+    """
+    user = factories.UserFactory()
+    client = APIClient()
+    client.force_login(user)
+    parent = factories.DocumentFactory(users=[user], title="parent")
+    document = factories.DocumentFactory(title="alpha")
+
+    assert _typeahead(client, "alpha") == []
+
+    document.move(parent, pos="first-child")
+
+    assert _typeahead(client, "alpha") == ["alpha"]
+
+
+def test_api_documents_typeahead_reach_restricted():
+    """
+    Candidates should be built again when a document visited by the user becomes
+    restricted.
+    """
+    owner, user = factories.UserFactory.create_batch(2)
+    document = factories.DocumentFactory(
+        users=[(owner, "owner")],
+        link_reach="public",
+        link_traces=[user],
+        title="alpha",
+    )
+    client = APIClient()
+    client.force_login(user)
+
+    assert _typeahead(client, "alpha") == ["alpha"]
+
+    owner_client = APIClient()
+    owner_client.force_login(owner)
+    with mock.patch("core.api.viewsets.reset_service_connections_in_cascade.delay"):
+        response = owner_client.put(
+            f"/api/v1.0/documents/{document.id!s}/link-configuration/",
+            {"link_reach": "restricted"},
+            format="json",
+        )
+    assert response.status_code == 200
+
+    assert _typeahead(client, "alpha") == []
+
+
+def test_api_documents_typeahead_refresh_root_paths_changed(settings):
+    """
+    Candidates should be built again on refresh when the documents the user has
+    access to or visited changed, even if the cache was not invalidated.
+    """
+    settings.TYPEAHEAD_REFRESH_INTERVAL = 0
+    user = factories.UserFactory()
+    factories.DocumentFactory(users=[user], title="alpha")
+    visited = factories.DocumentFactory(
+        link_reach="public", link_traces=[user], title="alpha visited"
+    )
+
+    typeahead.get_candidates(user)
+
+    models.Document.objects.filter(pk=visited.pk).update(link_reach="restricted")
+
+    candidates = typeahead.get_candidates(user)
+
+    assert [hit["title"] for hit in typeahead.search(candidates, "alpha", 10)] == [
+        "alpha"
+    ]
+
+
+def test_api_documents_typeahead_query_timeout(settings):
+    """
+    Candidates should be served as cached when refreshing them exceeds the query
+    timeout, which is restored after.
+    """
+    settings.TYPEAHEAD_REFRESH_INTERVAL = 0
+    settings.TYPEAHEAD_QUERY_TIMEOUT = 10
+    user = factories.UserFactory()
+    factories.DocumentFactory(users=[user], title="alpha")
+
+    def slow_query(*args):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_sleep(1)")
+
+    with mock.patch.object(typeahead, "_build_candidates", side_effect=slow_query):
+        assert typeahead.get_candidates(user) == {"documents": {}}
+
+    candidates = typeahead.get_candidates(user)
+
+    with mock.patch.object(typeahead, "_refresh_candidates", side_effect=slow_query):
+        assert typeahead.get_candidates(user) == candidates
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT current_setting('statement_timeout')")
+        assert cursor.fetchone()[0] == "0"
@@ -10,8 +10,10 @@ import pytest
 from lasuite.malware_detection.enums import ReportStatus
 
 from core.enums import DocumentAttachmentStatus
-from core.factories import DocumentFactory
+from core.factories import AttachmentFactory, DocumentFactory
 from core.malware_detection import malware_detection_callback
+from core.models import Attachment
+from core.utils.media_auth import is_attachment_ready
 
 pytestmark = pytest.mark.django_db
 
@@ -56,6 +58,9 @@ def test_malware_detection_callback_safe_status(safe_file):
     metadata = head_resp.get("Metadata", {})
     assert metadata["status"] == DocumentAttachmentStatus.READY
 
+    # media-auth should not need to check the status in the object storage again
+    assert is_attachment_ready(safe_file) is True
+
 
 def test_malware_detection_callback_safe_status_uppercase_metadata(safe_file):
     """
@@ -92,6 +97,29 @@ def test_malware_detection_callback_safe_status_uppercase_metadata(safe_file):
     }
 
 
+def test_malware_detection_callback_safe_status_attachment(safe_file):
+    """
+    The status of an attachment registered in the database should be updated there
+    without copying the object to update its metadata.
+    """
+    document = DocumentFactory(attachments=[safe_file])
+    attachment = AttachmentFactory(document=document, key=safe_file)
+
+    s3_client = default_storage.connection.meta.client
+    with patch.object(s3_client, "copy_object") as mock_copy_object:
+        malware_detection_callback(
+            safe_file,
+            ReportStatus.SAFE,
+            error_info={},
+            document_id=document.id,
+        )
+
+    mock_copy_object.assert_not_called()
+    attachment.refresh_from_db()
+    assert attachment.status == DocumentAttachmentStatus.READY
+    assert is_attachment_ready(safe_file) is True
+
+
 def test_malware_detection_callback_unsafe_status(unsafe_file):
     """Test malware detection callback with unsafe status."""
 
@@ -110,3 +138,18 @@ def test_malware_detection_callback_unsafe_status(unsafe_file):
 
     assert unsafe_file not in document.attachments
     assert not default_storage.exists(unsafe_file)
+
+
+def test_malware_detection_callback_unsafe_status_attachment(unsafe_file):
+    """The attachment of an infected file should be deleted from the database."""
+    document = DocumentFactory(attachments=[unsafe_file])
+    AttachmentFactory(document=document, key=unsafe_file)
+
+    malware_detection_callback(
+        unsafe_file,
+        ReportStatus.UNSAFE,
+        error_info={"error": "test", "error_code": 4001},
+        document_id=document.id,
+    )
+
+    assert not Attachment.objects.filter(key=unsafe_file).exists()
@@ -5,6 +5,7 @@ Unit tests for the Document model
 
 import random
 import smtplib
+from datetime import timedelta
 from logging import Logger
 from unittest import mock
 
@@ -1056,6 +1057,208 @@ def test_models_documents_version_duplicate():
     assert len(response["Versions"]) == 2
 
 
+def test_models_documents_versions_catalogue_maintained():
+    """
+    Saving a new content should register its version in the catalogue and deleting
+    a version should remove it from the catalogue.
+    """
+    document = factories.DocumentFactory()
+    assert document.versions.count() == 1
+
+    # Save again with the same content
+    document.save()
+    assert document.versions.count() == 1
+
+    document.content = "new content"
+    document.save()
+    assert document.versions.count() == 2
+
+    response = default_storage.connection.meta.client.list_object_versions(
+        Bucket=default_storage.bucket_name, Prefix=document.file_key
+    )
+    assert sorted(document.versions.values_list("version_id", flat=True)) == sorted(
+        version["VersionId"] for version in response["Versions"]
+    )
+
+    version_id = document.get_versions_slice()["versions"][0]["version_id"]
+    document.delete_version(version_id)
+
+    assert not document.versions.filter(version_id=version_id).exists()
+    assert document.versions.count() == 1
+
+
+def test_models_documents_get_versions_slice_catalogue(settings):
+    """
+    Reading versions from the catalogue should give the same result as listing
+    versions from the object storage.
+    """
+    settings.DOCUMENT_VERSIONS_PAGE_SIZE = 4
+
+    document = factories.DocumentFactory()
+    for i in range(6):
+        document.content = f"bar{i:d}"
+        document.save()
+
+    # Add a document version not related to the first document
+    factories.DocumentFactory()
+
+    def without_dates(versions_slice):
+        # The catalogue records the dates read with head_object, to the second
+        return {
+            **versions_slice,
+            "versions": [
+                {**version, "last_modified": None}
+                for version in versions_slice["versions"]
+            ],
+        }
+
+    for kwargs in [{}, {"page_size": 2}]:
+        settings.DOCUMENT_VERSIONS_CATALOGUE_ENABLED = False
+        expected = document.get_versions_slice(**kwargs)
+        settings.DOCUMENT_VERSIONS_CATALOGUE_ENABLED = True
+        with mock.patch.object(
+            default_storage.connection.meta.client, "list_object_versions"
+        ) as mock_list:
+            assert without_dates(document.get_versions_slice(**kwargs)) == (
+                without_dates(expected)
+            )
+        mock_list.assert_not_called()
+
+    settings.DOCUMENT_VERSIONS_CATALOGUE_ENABLED = True
+    first_page = document.get_versions_slice()
+    response = document.get_versions_slice(
+        from_version_id=first_page["next_version_id_marker"]
+    )
+    assert response["is_truncated"] is False
+    assert response["count"] == 2
+    assert response["next_version_id_marker"] == ""
+    assert {version["version_id"] for version in response["versions"]}.isdisjoint(
+        version["version_id"] for version in first_page["versions"]
+    )
+
+
+def test_models_documents_get_versions_slice_catalogue_min_datetime(settings):
+    """
+    Versions anterior to the min datetime should be filtered in the database so
+    pages are full even when many versions predate the access of the user.
+    """
+    settings.DOCUMENT_VERSIONS_CATALOGUE_ENABLED = True
+    settings.DOCUMENT_VERSIONS_PAGE_SIZE = 2
+
+    document = factories.DocumentFactory()
+    for i in range(6):
+        document.content = f"bar{i:d}"
+        document.save()
+
+    # Dates read from the object storage are to the second: spread them
+    versions = list(document.versions.order_by("last_modified", "version_id"))
+    for i, version in enumerate(versions):
+        version.last_modified = versions[0].last_modified + timedelta(minutes=i)
+    models.DocumentVersion.objects.bulk_update(versions, ["last_modified"])
+    min_datetime = versions[3].last_modified
+
+    response = document.get_versions_slice(min_datetime=min_datetime)
+
+    assert response["count"] == 2
+    assert response["is_truncated"] is True
+    for version in response["versions"]:
+        assert version["last_modified"] >= min_datetime
+
+    response = document.get_versions_slice(
+        min_datetime=min_datetime, from_version_id=response["next_version_id_marker"]
+    )
+    assert response["count"] == 1
+    assert response["is_truncated"] is False
+
+
+def test_models_documents_get_versions_min_datetime_cached(django_assert_num_queries):
+    """
+    The date from which a user can see versions should be cached and the cache
+    invalidated when an access of the user or of their teams changes.
+    """
+    user = factories.UserFactory()
+    document = factories.DocumentFactory()
+    assert document.get_versions_min_datetime(user) is None
+
+    access = factories.UserDocumentAccessFactory(document=document, user=user)
+
+    with django_assert_num_queries(1):
+        assert document.get_versions_min_datetime(user) == access.created_at
+    with django_assert_num_queries(0):
+        assert document.get_versions_min_datetime(user) == access.created_at
+
+    access.delete()
+    assert document.get_versions_min_datetime(user) is None
+
+    with mock.patch.object(
+        models.User, "teams", new_callable=mock.PropertyMock, return_value=["team"]
+    ):
+        team_access = factories.TeamDocumentAccessFactory(
+            document=document, team="team"
+        )
+        assert document.get_versions_min_datetime(user) == team_access.created_at
+
+        team_access.delete()
+        assert document.get_versions_min_datetime(user) is None
+
+
+def test_models_documents_record_version_last_modified():
+    """
+    Versions should be recorded in the catalogue with the modification date of the
+    object storage, to which they are compared when they are retrieved.
+    """
+    document = factories.DocumentFactory()
+    document.content = "bar"
+    document.save()
+
+    version = document.versions.order_by("-last_modified").first()
+    response = document.get_content_response(version_id=version.version_id)
+    assert version.last_modified == response["LastModified"]
+
+
+def test_models_documents_get_versions_min_datetime_invalidated_on_tree(
+    django_assert_num_queries,
+):
+    """
+    The date from which a user can see versions should be invalidated on the whole
+    tree of a document when its accesses change, without listing its descendants.
+    """
+    user = factories.UserFactory()
+    parent = factories.DocumentFactory()
+    child = factories.DocumentFactory(parent=parent)
+    other = factories.DocumentFactory(users=[user])
+    access = factories.UserDocumentAccessFactory(document=parent, user=user)
+    assert child.get_versions_min_datetime(user) == access.created_at
+    assert other.get_versions_min_datetime(user) is not None
+
+    with django_assert_num_queries(0):
+        parent.invalidate_versions_min_datetime_cache()
+
+    access.delete()
+
+    assert child.get_versions_min_datetime(user) is None
+    with django_assert_num_queries(0):
+        assert other.get_versions_min_datetime(user) is not None
+
+
+def test_models_documents_get_versions_min_datetime_moved():
+    """
+    The date from which a user can see versions should be invalidated on the
+    descendants of a document moved under another parent.
+    """
+    user = factories.UserFactory()
+    parent, target = factories.DocumentFactory.create_batch(2)
+    document = factories.DocumentFactory(parent=parent)
+    access = factories.UserDocumentAccessFactory(document=parent, user=user)
+    child = factories.DocumentFactory(parent=document)
+    assert child.get_versions_min_datetime(user) == access.created_at
+
+    document.move(target, pos="first-child")
+    child.refresh_from_db()
+
+    assert child.get_versions_min_datetime(user) is None
+
+
 def test_models_documents__email_invitation__success():
     """
     The email invitation is sent successfully.
@@ -3,6 +3,7 @@ Unit tests for FindDocumentIndexer
 """
 # pylint: disable=too-many-lines
 
+import time
 from operator import itemgetter
 from unittest import mock
 
@@ -10,27 +11,18 @@ from django.core.cache import cache
 from django.db import transaction
 
 import pytest
+from requests import HTTPError
+from rest_framework.test import APIClient
 
 from core import factories, models
 from core.enums import SearchType
 from core.services.search_indexers import FindDocumentIndexer
+from core.tasks.search import INDEXER_SCHEDULED_CACHE_KEY, dirty_documents_indexer_task
+from core.utils import search_queue
 
 pytestmark = pytest.mark.django_db
 
 
-def reset_batch_indexer_throttle():
-    """Reset throttle flag"""
-    cache.delete("document-batch-indexer-throttle")
-
-
-@pytest.fixture(autouse=True)
-def reset_throttle():
-    """Reset throttle flag before each test"""
-    reset_batch_indexer_throttle()
-    yield
-    reset_batch_indexer_throttle()
-
-
 @mock.patch.object(FindDocumentIndexer, "push")
 @pytest.mark.usefixtures("indexer_settings")
 @pytest.mark.django_db(transaction=True)
@@ -56,8 +48,9 @@ def test_models_documents_post_save_indexer(mock_push):
         key=itemgetter("id"),
     )
 
-    # The throttle counters should be reset
-    assert cache.get("document-batch-indexer-throttle") == 1
+    # The queue should be drained and no task scheduled
+    assert search_queue.get_next_due() is None
+    assert cache.get(INDEXER_SCHEDULED_CACHE_KEY) is None
 
 
 @pytest.mark.django_db(transaction=True)
@@ -74,12 +67,9 @@ def test_models_documents_post_save_indexer_no_batches(indexer_settings):
 
     indexer = FindDocumentIndexer()
 
-    # 3 calls
-    assert len(data) == 3
-    # one document per call
-    assert [len(d) for d in data] == [1] * 3
-    # all documents are indexed
-    assert sorted([d[0] for d in data], key=itemgetter("id")) == sorted(
+    # The first task indexes the changes of the whole transaction
+    assert len(data) == 1
+    assert sorted(data[0], key=itemgetter("id")) == sorted(
         [
             indexer.serialize_document(doc1, accesses),
             indexer.serialize_document(doc2, accesses),
@@ -88,8 +78,8 @@ def test_models_documents_post_save_indexer_no_batches(indexer_settings):
         key=itemgetter("id"),
     )
 
-    # The throttle counters should be reset
-    assert cache.get("file-batch-indexer-throttle") is None
+    # Documents are not queued
+    assert search_queue.get_next_due() is None
 
 
 @mock.patch.object(FindDocumentIndexer, "push")
@@ -182,9 +172,6 @@ def test_models_documents_post_save_indexer_deleted(mock_push):
         factories.UserDocumentAccessFactory(document=main_doc, user=user)
         factories.UserDocumentAccessFactory(document=child_doc, user=user)
 
-    # Manually reset the throttle flag here or the next indexation will be ignored for 1 second
-    reset_batch_indexer_throttle()
-
     with transaction.atomic():
         main_doc_deleted = models.Document.objects.get(pk=main_doc.pk)
         main_doc_deleted.soft_delete()
@@ -286,9 +273,6 @@ def test_models_documents_post_save_indexer_restored(mock_push):
     assert doc_ancestor_deleted.deleted_at is None
     assert doc_ancestor_deleted.ancestors_deleted_at is not None
 
-    # Manually reset the throttle flag here or the next indexation will be ignored for 1 second
-    reset_batch_indexer_throttle()
-
     with transaction.atomic():
         doc_restored = models.Document.objects.get(pk=doc_deleted.pk)
         doc_restored.restore()
@@ -336,8 +320,11 @@ def test_models_documents_post_save_indexer_restored(mock_push):
 
 @pytest.mark.django_db(transaction=True)
 @pytest.mark.usefixtures("indexer_settings")
-def test_models_documents_post_save_indexer_throttle():
-    """Test indexation task skipping on document update"""
+def test_models_documents_post_save_indexer_debounce():
+    """
+    Documents changed while a task is scheduled should be queued and indexed by
+    this task, with their first due time.
+    """
     indexer = FindDocumentIndexer()
     user = factories.UserFactory()
 
@@ -348,26 +335,24 @@ def test_models_documents_post_save_indexer_throttle():
     accesses = {str(item.path): {"users": [user.sub]} for item in docs}
 
     with mock.patch.object(FindDocumentIndexer, "push") as mock_push:
-        # Simulate 1 running task
-        cache.set("document-batch-indexer-throttle", 1)
+        # Simulate a scheduled task
+        cache.set(INDEXER_SCHEDULED_CACHE_KEY, 1)
 
-        # save doc to trigger the indexer, but nothing should be done since
-        # the flag is up
+        # save docs to queue them, nothing should be indexed until the task runs
         with transaction.atomic():
             docs[0].save()
             docs[2].save()
-            docs[3].save()
-
-        assert [call.args[0] for call in mock_push.call_args_list] == []
-
-    with mock.patch.object(FindDocumentIndexer, "push") as mock_push:
-        # No waiting task
-        cache.delete("document-batch-indexer-throttle")
+        due = search_queue.get_next_due()
 
         with transaction.atomic():
-            docs[0].save()
-            docs[2].save()
             docs[3].save()
+            docs[0].save()
+
+        assert mock_push.call_count == 0
+        # The due time of a queued document is not postponed
+        assert search_queue.get_next_due() == due
+
+        dirty_documents_indexer_task(time.time() + 1)
 
         data = [call.args[0] for call in mock_push.call_args_list]
 
@@ -383,6 +368,79 @@ def test_models_documents_post_save_indexer_throttle():
             key=itemgetter("id"),
         )
 
+    assert search_queue.get_next_due() is None
+    assert not models.DocumentIndexingChange.objects.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.usefixtures("indexer_settings")
+def test_models_documents_indexer_debounce_not_due():
+    """Documents not due yet should be left in the queue for the next task."""
+    with mock.patch.object(FindDocumentIndexer, "push") as mock_push:
+        cache.set(INDEXER_SCHEDULED_CACHE_KEY, 1)
+        with transaction.atomic():
+            document = factories.DocumentFactory()
+
+        with mock.patch(
+            "core.tasks.search.dirty_documents_indexer_task.apply_async"
+        ) as mock_apply_async:
+            dirty_documents_indexer_task(time.time() - 1)
+
+        mock_push.assert_not_called()
+        due = search_queue.get_next_due()
+        assert mock_apply_async.call_args.kwargs["args"] == [due]
+
+        dirty_documents_indexer_task(due)
+
+    assert mock_push.call_args.args[0][0]["id"] == str(document.pk)
+    assert search_queue.get_next_due() is None
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.usefixtures("indexer_settings")
+def test_models_documents_indexer_debounce_errors():
+    """Documents should be queued again when their indexation fails."""
+    cache.set(INDEXER_SCHEDULED_CACHE_KEY, 1)
+    with transaction.atomic():
+        document = factories.DocumentFactory()
+
+    with (
+        mock.patch.object(FindDocumentIndexer, "push", side_effect=HTTPError),
+        pytest.raises(HTTPError),
+    ):
+        dirty_documents_indexer_task(time.time() + 1)
+
+    assert search_queue.pop_due(time.time() + 10, 10) == [str(document.pk)]
+    assert models.DocumentIndexingChange.objects.filter(document=document).exists()
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.usefixtures("indexer_settings")
+def test_models_documents_indexer_periodic_drain(settings):
+    """
+    The periodic task should index the documents due, even if the task scheduled
+    for them was lost, without forgetting the scheduled task.
+    """
+    assert settings.CELERY_BEAT_SCHEDULE["index-dirty-documents"]["task"] == (
+        dirty_documents_indexer_task.name
+    )
+
+    # Simulate a scheduled task that is lost
+    cache.set(INDEXER_SCHEDULED_CACHE_KEY, 1)
+    with transaction.atomic():
+        document = factories.DocumentFactory()
+
+    with (
+        mock.patch.object(FindDocumentIndexer, "push") as mock_push,
+        mock.patch("core.tasks.search.time") as mock_time,
+    ):
+        mock_time.time.return_value = search_queue.get_next_due() + 1
+        dirty_documents_indexer_task()
+
+    assert mock_push.call_args.args[0][0]["id"] == str(document.pk)
+    assert search_queue.get_next_due() is None
+    assert cache.get(INDEXER_SCHEDULED_CACHE_KEY) == 1
+
 
 @pytest.mark.django_db(transaction=True)
 @pytest.mark.usefixtures("indexer_settings")
@@ -397,8 +455,6 @@ def test_models_documents_access_post_save_indexer():
                 "user__sub"
             )
 
-    reset_batch_indexer_throttle()
-
     with mock.patch.object(FindDocumentIndexer, "push") as mock_push:
         with transaction.atomic():
             for doc_access in doc_accesses:
@@ -425,8 +481,6 @@ def test_models_items_access_post_save_indexer_no_throttle(indexer_settings):
             "user__sub"
         )
 
-    reset_batch_indexer_throttle()
-
     with mock.patch.object(FindDocumentIndexer, "push") as mock_push:
         with transaction.atomic():
             for doc_access in doc_accesses:
@@ -434,12 +488,111 @@ def test_models_items_access_post_save_indexer_no_throttle(indexer_settings):
 
         data = [call.args[0] for call in mock_push.call_args_list]
 
-        # 3 calls
-        assert len(data) == 3
-        # one document per call
-        assert [len(d) for d in data] == [1] * 3
-        # the same document is indexed 3 times
-        assert [d[0]["id"] for d in data] == [str(doc.pk)] * 3
+        # The changes of the document are coalesced
+        assert len(data) == 1
+        assert [d["id"] for d in data[0]] == [str(doc.pk)]
+
+    assert not models.DocumentIndexingChange.objects.exists()
+
+
+@mock.patch.object(FindDocumentIndexer, "push")
+@pytest.mark.usefixtures("indexer_settings")
+@pytest.mark.django_db(transaction=True)
+def test_models_documents_access_created_indexer_descendants(mock_push):
+    """Creating or deleting an access should reindex the descendants."""
+    with transaction.atomic():
+        parent = factories.DocumentFactory()
+        child = factories.DocumentFactory(parent=parent)
+        factories.DocumentFactory()
+
+    user = factories.UserFactory()
+    mock_push.reset_mock()
+
+    with transaction.atomic():
+        access = factories.UserDocumentAccessFactory(document=parent, user=user)
+
+    assert {d["id"]: d["users"] for d in mock_push.call_args.args[0]} == {
+        str(parent.pk): [str(user.sub)],
+        str(child.pk): [str(user.sub)],
+    }
+
+    mock_push.reset_mock()
+
+    with transaction.atomic():
+        access.delete()
+
+    assert {d["id"]: d["users"] for d in mock_push.call_args.args[0]} == {
+        str(parent.pk): [],
+        str(child.pk): [],
+    }
+    assert not models.DocumentIndexingChange.objects.exists()
+
+
+@mock.patch.object(FindDocumentIndexer, "push")
+@pytest.mark.usefixtures("indexer_settings")
+@pytest.mark.django_db(transaction=True)
+def test_models_documents_link_configuration_indexer_descendants(mock_push):
+    """Updating the link configuration should reindex the reach of descendants."""
+    user = factories.UserFactory()
+    with transaction.atomic():
+        parent = factories.DocumentFactory(
+            link_reach=models.LinkReachChoices.RESTRICTED, users=[(user, "owner")]
+        )
+        child = factories.DocumentFactory(
+            parent=parent, link_reach=models.LinkReachChoices.RESTRICTED
+        )
+
+    mock_push.reset_mock()
+
+    client = APIClient()
+    client.force_login(user)
+    with mock.patch("core.api.viewsets.reset_service_connections_in_cascade.delay"):
+        response = client.put(
+            f"/api/v1.0/documents/{parent.id!s}/link-configuration/",
+            {"link_reach": "public", "link_role": "reader"},
+            format="json",
+        )
+
+    assert response.status_code == 200
+    assert {d["id"]: d["reach"] for d in mock_push.call_args.args[0]} == {
+        str(parent.pk): "public",
+        str(child.pk): "public",
+    }
+
+
+@mock.patch.object(FindDocumentIndexer, "push")
+@pytest.mark.usefixtures("indexer_settings")
+@pytest.mark.django_db(transaction=True)
+def test_models_documents_move_indexer_descendants(mock_push):
+    """Moving a document should reindex the path of its descendants."""
+    with transaction.atomic():
+        target = factories.DocumentFactory()
+        parent = factories.DocumentFactory()
+        child = factories.DocumentFactory(parent=parent)
+
+    mock_push.reset_mock()
+
+    parent.move(target, pos="first-child")
+
+    parent.refresh_from_db()
+    child.refresh_from_db()
+    assert {d["id"]: d["path"] for d in mock_push.call_args.args[0]} == {
+        str(parent.pk): parent.path,
+        str(child.pk): child.path,
+    }
+
+
+@pytest.mark.django_db(transaction=True)
+def test_models_documents_indexer_changes_not_configured(indexer_settings):
+    """No change should be recorded when the indexer is disabled."""
+    indexer_settings.SEARCH_INDEXER_CLASS = None
+
+    with transaction.atomic():
+        doc = factories.DocumentFactory()
+        factories.UserDocumentAccessFactory(document=doc)
+        doc.soft_delete()
+
+    assert not models.DocumentIndexingChange.objects.exists()
 
 
 @mock.patch.object(FindDocumentIndexer, "search_query")
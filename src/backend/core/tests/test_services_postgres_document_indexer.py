@@ -0,0 +1,276 @@
+"""
+Unit tests for PostgresDocumentIndexer
+"""
+
+from datetime import timedelta
+from unittest import mock
+
+from django.utils import timezone
+
+import pytest
+from rest_framework.test import APIClient
+from waffle.testutils import override_flag
+
+from core import factories, models
+from core.enums import FeatureFlag
+from core.services.search_indexers import (
+    PostgresDocumentIndexer,
+    get_document_indexer,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(name="postgres_indexer_settings")
+def postgres_indexer_settings_fixture(settings):
+    """Enable the PostgreSQL indexer, without any setting of the Find app."""
+    get_document_indexer.cache_clear()
+
+    settings.SEARCH_INDEXER_CLASS = (
+        "core.services.search_indexers.PostgresDocumentIndexer"
+    )
+    settings.SEARCH_INDEXER_COUNTDOWN = 0
+    settings.INDEXING_URL = None
+    settings.SEARCH_INDEXER_SECRET = None
+    settings.SEARCH_URL = None
+
+    yield settings
+
+    get_document_indexer.cache_clear()
+
+
+def _push_entry(document, **kwargs):
+    """Push the search entry of a document, with the given fields."""
+    PostgresDocumentIndexer().push(
+        [
+            {
+                "document_id": str(document.id),
+                "path": document.path,
+                "title": document.title,
+                "content": "",
+                "users": [],
+                "teams": [],
+                "reach": models.LinkReachChoices.RESTRICTED,
+                "is_active": True,
+                "updated_at": document.updated_at.isoformat(),
+                **kwargs,
+            }
+        ]
+    )
+
+
+def _search(q, user=None, **kwargs):
+    """Search the ids of the documents matching a query."""
+    return [
+        hit["id"]
+        for hit in PostgresDocumentIndexer().search(
+            q=q, token=None, user=user, **kwargs
+        )
+    ]
+
+
+@pytest.mark.usefixtures("postgres_indexer_settings")
+def test_services_postgres_indexer_configured_without_find():
+    """The indexer should not require the settings of the Find app."""
+    assert isinstance(get_document_indexer(), PostgresDocumentIndexer)
+
+
+def test_services_postgres_indexer_serialize_document():
+    """Documents should be serialized with their text and accesses."""
+    user = factories.UserFactory()
+    document = factories.DocumentFactory(
+        users=[user], teams=["team"], link_reach="authenticated"
+    )
+    accesses = {document.path: {"users": {user.sub}, "teams": {"team"}}}
+
+    assert PostgresDocumentIndexer().serialize_document(document, accesses) == {
+        "document_id": str(document.id),
+        "path": document.path,
+        "title": document.title,
+        "content": "Hello w or ld",
+        "users": [user.sub],
+        "teams": ["team"],
+        "reach": "authenticated",
+        "is_active": True,
+        "updated_at": document.updated_at.isoformat(),
+    }
+
+
+def test_services_postgres_indexer_index():
+    """Indexed documents should be found by their content, then updated."""
+    user = factories.UserFactory()
+    document = factories.DocumentFactory(users=[user], title="Minutes")
+    indexer = PostgresDocumentIndexer()
+
+    assert indexer.index() == 1
+
+    entry = models.DocumentSearchEntry.objects.get()
+    assert entry.document_id == document.id
+    assert entry.content == "Hello w or ld"
+    assert entry.users == [user.sub]
+    assert _search("hello", user) == [str(document.id)]
+
+    models.Document.objects.filter(pk=document.pk).update(title="Budget")
+    indexer.index()
+
+    assert models.DocumentSearchEntry.objects.get().title == "Budget"
+    assert _search("budget", user) == [str(document.id)]
+    assert _search("minutes", user) == []
+
+
+def test_services_postgres_indexer_search_readable():
+    """
+    Users should only find the documents to which they or their teams have access,
+    and the documents they visited if they are not restricted.
+    """
+    user = factories.UserFactory()
+    user_document, team_document, visited, visited_restricted, other, inactive = (
+        factories.DocumentFactory.create_batch(6, title="alpha")
+    )
+    _push_entry(user_document, users=[user.sub])
+    _push_entry(team_document, teams=["team"])
+    _push_entry(visited, reach=models.LinkReachChoices.AUTHENTICATED)
+    _push_entry(visited_restricted)
+    _push_entry(other, users=["other"], reach=models.LinkReachChoices.PUBLIC)
+    _push_entry(inactive, users=[user.sub], is_active=False)
+
+    with mock.patch.object(
+        models.User, "teams", new_callable=mock.PropertyMock, return_value=["team"]
+    ):
+        results = _search(
+            "alpha", user, visited=(str(visited.id), str(visited_restricted.id))
+        )
+
+    assert sorted(results) == sorted([str(user_document.id), str(team_document.id)])
+
+    results = _search("alpha", user, visited=(str(visited.id),))
+    assert sorted(results) == sorted([str(user_document.id), str(visited.id)])
+
+
+def test_services_postgres_indexer_search_anonymous():
+    """Anonymous users should only find the public documents they visited."""
+    public, restricted = factories.DocumentFactory.create_batch(2, title="alpha")
+    _push_entry(public, reach=models.LinkReachChoices.PUBLIC)
+    _push_entry(restricted, users=["sub"])
+
+    assert _search("alpha", visited=(str(public.id), str(restricted.id))) == [
+        str(public.id)
+    ]
+
+
+def test_services_postgres_indexer_search_ranking():
+    """
+    Titles should weigh more than contents, then the most recently updated
+    documents come first.
+    """
+    user = factories.UserFactory()
+    in_content_old, in_content, in_title = factories.DocumentFactory.create_batch(3)
+    _push_entry(
+        in_content_old,
+        title="Notes",
+        content="Agenda of the meeting",
+        users=[user.sub],
+        updated_at=(timezone.now() - timedelta(days=1)).isoformat(),
+    )
+    _push_entry(
+        in_content, title="Notes", content="Agenda of the meeting", users=[user.sub]
+    )
+    _push_entry(in_title, title="Meeting", content="Agenda", users=[user.sub])
+
+    assert _search("meeting", user) == [
+        str(in_title.id),
+        str(in_content.id),
+        str(in_content_old.id),
+    ]
+
+
+def test_services_postgres_indexer_search_syntax_and_accents():
+    """Queries should follow the web search syntax and ignore accents and case."""
+    user = factories.UserFactory()
+    budget, minutes = factories.DocumentFactory.create_batch(2)
+    _push_entry(budget, title="Réunion budget", users=[user.sub])
+    _push_entry(minutes, title="Compte rendu de réunion", users=[user.sub])
+
+    assert sorted(_search("REUNION", user)) == sorted([str(budget.id), str(minutes.id)])
+    assert _search("réunion -budget", user) == [str(minutes.id)]
+    assert _search('"rendu de reunion"', user) == [str(minutes.id)]
+    assert _search('"reunion de rendu"', user) == []
+
+
+def test_services_postgres_indexer_search_path_and_limit():
+    """Searches should be limited to the descendants of a path, and in number."""
+    user = factories.UserFactory()
+    parent = factories.DocumentFactory(title="alpha")
+    children = factories.DocumentFactory.create_batch(3, parent=parent, title="alpha")
+    other = factories.DocumentFactory(title="alpha")
+    for document in [parent, *children, other]:
+        _push_entry(document, users=[user.sub])
+
+    results = _search("alpha", user, path=parent.path)
+    assert sorted(results) == sorted(
+        str(document.id) for document in [parent, *children]
+    )
+    assert len(_search("alpha", user, nb_results=2)) == 2
+
+
+def test_services_postgres_indexer_search_highlight():
+    """Hits should have an escaped snippet of their content highlighting the query."""
+    user = factories.UserFactory()
+    document, title_only = factories.DocumentFactory.create_batch(2)
+    _push_entry(
+        document,
+        title="Notes",
+        content="Réunion du budget & co",
+        users=[user.sub],
+    )
+    _push_entry(title_only, title="Budget", content="Notes", users=[user.sub])
+
+    hits = {
+        hit["id"]: hit
+        for hit in PostgresDocumentIndexer().search(
+            q="reunion budget", token=None, user=user
+        )
+    }
+
+    assert hits[str(document.id)]["highlight"] == (
+        "<mark>Réunion</mark> du <mark>budget</mark> &amp; co"
+    )
+    assert hits[str(title_only.id)]["highlight"] is None
+
+
+def test_services_postgres_indexer_delete_vanished():
+    """Entries of the documents deleted from the database should be deleted."""
+    kept, deleted = factories.DocumentFactory.create_batch(2)
+    indexer = PostgresDocumentIndexer()
+    indexer.index()
+    assert models.DocumentSearchEntry.objects.count() == 2
+
+    deleted.delete()
+
+    assert indexer.delete_vanished() == 1
+    assert list(
+        models.DocumentSearchEntry.objects.values_list("document_id", flat=True)
+    ) == [kept.id]
+
+
+@pytest.mark.usefixtures("postgres_indexer_settings")
+def test_api_documents_search_postgres_indexer():
+    """
+    The search endpoint should return the documents found by the PostgreSQL
+    indexer, with the snippet highlighting the query.
+    """
+    user = factories.UserFactory()
+    document = factories.DocumentFactory(users=[user], title="Notes")
+    factories.DocumentFactory(title="Hello")
+    PostgresDocumentIndexer().index()
+
+    client = APIClient()
+    client.force_login(user)
+
+    with override_flag(FeatureFlag.FLAG_FIND_FULL_TEXT_SEARCH, active=True):
+        response = client.get("/api/v1.0/documents/search/", data={"q": "hello"})
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["id"] for result in results] == [str(document.id)]
+    assert results[0]["highlight"] == "<mark>Hello</mark> w or ld"
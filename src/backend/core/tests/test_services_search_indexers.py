@@ -1,18 +1,29 @@
 """Tests for Documents search indexers"""
 
+import logging
+import threading
+import uuid
+from datetime import timedelta
 from functools import partial
 from json import dumps as json_dumps
+from json import loads as json_loads
 from unittest.mock import patch
 
 from django.contrib.auth.models import AnonymousUser
 from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.utils.module_loading import import_string
 
 import pytest
+import requests
 import responses
-from requests import HTTPError
+from requests import HTTPError, Response
+from rest_framework.test import APIClient
 
 from core import factories, models
+from core.services import search_indexers
 from core.services.search_indexers import (
     BaseDocumentIndexer,
     FindDocumentIndexer,
@@ -27,7 +38,7 @@ pytestmark = pytest.mark.django_db
 class FakeDocumentIndexer(BaseDocumentIndexer):
     """Fake indexer for test purpose"""
 
-    def serialize_document(self, document, accesses):
+    def serialize_document(self, document, accesses, text=None):
         return {}
 
     def push(self, data):
@@ -334,6 +345,414 @@ def test_services_search_indexers_batch_size_argument(mock_push):
     assert seen_doc_ids == {str(d.id) for d in documents}
 
 
+@pytest.mark.usefixtures("indexer_settings")
+def test_services_search_indexers_index_pipeline_overlaps_stages(settings):
+    """
+    Batches should be fetched from the database while previous batches are
+    being pushed, and pushed in order.
+    """
+    settings.SEARCH_INDEXER_PIPELINE_DEPTH = 2
+    documents = factories.DocumentFactory.create_batch(5)
+    third_batch_fetched = threading.Event()
+    pushed = []
+
+    def push(data):
+        # The first push only ends once the third batch was fetched
+        pushed.append(([doc["id"] for doc in data], third_batch_fetched.wait(5)))
+
+    get_accesses = search_indexers.get_batch_accesses_by_users_and_teams
+    calls = []
+
+    def get_batch_accesses(paths):
+        calls.append(paths)
+        if len(calls) == 3:
+            third_batch_fetched.set()
+        return get_accesses(paths)
+
+    with (
+        patch.object(FindDocumentIndexer, "push", side_effect=push),
+        patch.object(
+            search_indexers,
+            "get_batch_accesses_by_users_and_teams",
+            side_effect=get_batch_accesses,
+        ),
+    ):
+        assert FindDocumentIndexer().index(batch_size=2) == 5
+
+    ids = sorted(str(document.id) for document in documents)
+    assert pushed == [(ids[:2], True), (ids[2:4], True), (ids[4:], True)]
+
+
+@patch.object(FindDocumentIndexer, "push")
+@pytest.mark.usefixtures("indexer_settings")
+def test_services_search_indexers_index_contents_errors(mock_push):
+    """Errors raised while loading the contents should be raised by index()."""
+    factories.DocumentFactory.create_batch(3)
+
+    with (
+        patch.object(
+            search_indexers, "base64_yjs_to_text_many", side_effect=ValueError
+        ),
+        pytest.raises(ValueError),
+    ):
+        FindDocumentIndexer().index(batch_size=2)
+
+    mock_push.assert_not_called()
+
+
+@patch.object(FindDocumentIndexer, "push")
+@pytest.mark.usefixtures("indexer_settings")
+def test_services_search_indexers_index_invalid_content(mock_push, settings):
+    """
+    A document whose content can't be decoded should be pushed without text, the
+    texts decoded for the batch being passed to serialize_document even when they
+    are not memoized.
+    """
+    settings.YJS_PARSED_CACHE_MAX_SIZE = 0
+    valid = factories.DocumentFactory()
+    invalid = factories.DocumentFactory(content="invalid content")
+
+    with patch.object(
+        search_indexers, "base64_yjs_to_text", side_effect=AssertionError
+    ):
+        assert FindDocumentIndexer().index() == 2
+
+    contents = {
+        document["id"]: document["content"] for document in mock_push.call_args[0][0]
+    }
+    assert contents == {str(valid.id): "Hello w or ld", str(invalid.id): ""}
+
+
+@patch.object(FindDocumentIndexer, "push")
+@pytest.mark.usefixtures("indexer_settings")
+def test_services_search_indexers_index_logs_stages_throughput(mock_push, caplog):
+    """The throughput of each stage of the pipeline should be logged."""
+    factories.DocumentFactory.create_batch(3)
+
+    with caplog.at_level(logging.INFO, logger="core.services.search_indexers"):
+        FindDocumentIndexer().index(batch_size=2)
+
+    messages = [
+        record.getMessage()
+        for record in caplog.records
+        if record.getMessage().startswith("Indexing stage")
+    ]
+    assert [message.split()[2] for message in messages] == [
+        "fetch:",
+        "contents:",
+        "decode:",
+        "serialize:",
+        "push:",
+    ]
+    assert all(" 3 document(s) in " in message for message in messages)
+
+
+@patch.object(FindDocumentIndexer, "push")
+@pytest.mark.usefixtures("indexer_settings")
+def test_services_search_indexers_index_payload_max_size(mock_push, settings):
+    """
+    Documents of a batch should be pushed in payloads whose JSON encoding fits in
+    SEARCH_INDEXER_PUSH_MAX_SIZE.
+    """
+    documents = [
+        factories.DocumentFactory(title=title, link_reach="public")
+        for title in ["a" * 50, "b" * 50, "c" * 50, "d" * 250, "e" * 50]
+    ]
+    indexer = FindDocumentIndexer()
+    document_size = len(json_dumps(indexer.serialize_document(documents[0], {})))
+    settings.SEARCH_INDEXER_PUSH_MAX_SIZE = 2 * document_size + 10
+
+    assert indexer.index(batch_size=10) == 5
+
+    payloads = [call.args[0] for call in mock_push.call_args_list]
+    assert [[doc["title"][0] for doc in payload] for payload in payloads] == [
+        ["a", "b"],
+        ["c"],
+        ["d"],
+        ["e"],
+    ]
+    assert all(
+        len(json_dumps(payload)) <= settings.SEARCH_INDEXER_PUSH_MAX_SIZE
+        for payload in payloads
+        if len(payload) > 1
+    )
+
+
+@patch.object(FindDocumentIndexer, "push")
+@pytest.mark.usefixtures("indexer_settings")
+def test_services_search_indexers_index_only_needed_fields(mock_push):
+    """
+    Only the fields needed to serialize documents should be fetched and the number
+    of queries should not depend on the number of documents.
+    """
+    factories.DocumentFactory.create_batch(
+        3, attachments=["a" * 200], excerpt="excerpt"
+    )
+
+    queries_counts = []
+    for _i in range(2):
+        with CaptureQueriesContext(connection) as queries:
+            FindDocumentIndexer().index(batch_size=10)
+        queries_counts.append(len(queries))
+        factories.DocumentFactory.create_batch(3)
+
+    assert queries_counts[0] == queries_counts[1]
+    documents_query = queries.captured_queries[0]["sql"]
+    assert '"core_document"."title"' in documents_query
+    assert '"core_document"."attachments"' not in documents_query
+    assert '"core_document"."excerpt"' not in documents_query
+    assert mock_push.call_count == 2
+
+
+@patch.object(FindDocumentIndexer, "push")
+@pytest.mark.usefixtures("indexer_settings")
+def test_services_search_indexers_index_changes(mock_push):
+    """
+    Changes of the journal should be indexed in order, by batches, coalescing the
+    changes of a same document, and removed from the journal.
+    """
+    document1, document2 = factories.DocumentFactory.create_batch(2)
+    child = factories.DocumentFactory(parent=document1)
+    document2.save()
+    document1.record_indexing_change(include_descendants=True)
+    assert models.DocumentIndexingChange.objects.count() == 5
+
+    assert FindDocumentIndexer().index_changes(batch_size=3) == 6
+
+    assert [
+        sorted(doc["id"] for doc in call.args[0]) for call in mock_push.call_args_list
+    ] == [
+        sorted([str(document1.pk), str(document2.pk), str(child.pk)]),
+        sorted([str(document1.pk), str(document2.pk), str(child.pk)]),
+    ]
+    assert not models.DocumentIndexingChange.objects.exists()
+
+
+@pytest.mark.usefixtures("indexer_settings")
+def test_services_search_indexers_index_changes_push_errors():
+    """Changes should be kept in the journal until their documents are pushed."""
+    document = factories.DocumentFactory()
+
+    with (
+        patch.object(FindDocumentIndexer, "push", side_effect=HTTPError),
+        pytest.raises(HTTPError),
+    ):
+        FindDocumentIndexer().index_changes()
+
+    assert models.DocumentIndexingChange.objects.get().document == document
+
+    with patch.object(FindDocumentIndexer, "push") as mock_push:
+        assert FindDocumentIndexer().index_changes() == 1
+
+    assert mock_push.call_args.args[0][0]["id"] == str(document.pk)
+    assert not models.DocumentIndexingChange.objects.exists()
+
+
+@pytest.mark.usefixtures("indexer_settings")
+def test_services_search_indexers_index_changes_claimed_before_push():
+    """
+    Changes should be claimed, not removed from the journal, while their
+    documents are indexed, so that no lock is held on the journal while pushing
+    and that they are not lost if the task dies meanwhile.
+    """
+    document = factories.DocumentFactory()
+    journal = []
+
+    def index(_documents):
+        journal.extend(
+            models.DocumentIndexingChange.objects.values_list(
+                "document_id", "claimed_by"
+            )
+        )
+        # A concurrent task does not index the changes claimed
+        assert FindDocumentIndexer().index_changes() == 0
+        return 1
+
+    with patch.object(FindDocumentIndexer, "index", side_effect=index) as mock_index:
+        assert FindDocumentIndexer().index_changes() == 1
+
+    assert mock_index.call_count == 1
+    assert len(journal) == 1
+    assert journal[0][0] == document.pk
+    assert journal[0][1] is not None
+    assert not models.DocumentIndexingChange.objects.exists()
+
+    document.record_indexing_change()
+
+    def index_deleted(_documents):
+        models.Document.objects.filter(pk=document.pk).delete()
+        raise HTTPError
+
+    with (
+        patch.object(FindDocumentIndexer, "index", side_effect=index_deleted),
+        pytest.raises(HTTPError),
+    ):
+        FindDocumentIndexer().index_changes()
+
+    # The changes of the documents deleted meanwhile are deleted with them
+    assert not models.DocumentIndexingChange.objects.exists()
+
+
+@pytest.mark.usefixtures("indexer_settings")
+def test_services_search_indexers_index_changes_expired_claims(settings):
+    """
+    Changes claimed by a task that died before pushing their documents should be
+    claimed again once their claim expired.
+    """
+    settings.SEARCH_INDEXER_CLAIM_TIMEOUT = 60
+    document = factories.DocumentFactory()
+    models.DocumentIndexingChange.objects.update(
+        claimed_at=timezone.now() - timedelta(seconds=30), claimed_by=uuid.uuid4()
+    )
+
+    with patch.object(FindDocumentIndexer, "push") as mock_push:
+        assert FindDocumentIndexer().index_changes() == 0
+
+    mock_push.assert_not_called()
+    assert models.DocumentIndexingChange.objects.get().document == document
+
+    models.DocumentIndexingChange.objects.update(
+        claimed_at=timezone.now() - timedelta(seconds=90)
+    )
+
+    with patch.object(FindDocumentIndexer, "push") as mock_push:
+        assert FindDocumentIndexer().index_changes() == 1
+
+    assert mock_push.call_args.args[0][0]["id"] == str(document.pk)
+    assert not models.DocumentIndexingChange.objects.exists()
+
+
+@pytest.mark.usefixtures("indexer_settings")
+def test_services_search_indexers_index_changes_claimed_again():
+    """
+    Changes claimed again by another task while their documents were indexed,
+    their claim having expired, should be left to that task.
+    """
+    document = factories.DocumentFactory()
+    other_claim = uuid.uuid4()
+
+    def index(_documents):
+        models.DocumentIndexingChange.objects.update(claimed_by=other_claim)
+        return 1
+
+    with patch.object(FindDocumentIndexer, "index", side_effect=index):
+        assert FindDocumentIndexer().index_changes() == 1
+
+    change = models.DocumentIndexingChange.objects.get()
+    assert change.document == document
+    assert change.claimed_by == other_claim
+
+
+def test_services_search_indexers_get_changed_documents():
+    """Changes including descendants should be expanded to the subtree."""
+    parent = factories.DocumentFactory()
+    child = factories.DocumentFactory(parent=parent)
+    grand_child = factories.DocumentFactory(parent=child)
+    other = factories.DocumentFactory()
+    other_child = factories.DocumentFactory(parent=other)
+    factories.DocumentFactory()
+
+    changes = [
+        (1, child.pk, True),
+        (2, parent.pk, True),
+        (3, other.pk, False),
+        (4, other.pk, False),
+    ]
+
+    assert set(search_indexers.get_changed_documents(changes)) == {
+        parent,
+        child,
+        grand_child,
+        other,
+    }
+    assert other_child not in search_indexers.get_changed_documents(changes)
+
+
+@patch.object(FindDocumentIndexer, "push")
+@pytest.mark.usefixtures("indexer_settings")
+def test_services_search_indexers_index_only_changed(mock_push):
+    """
+    Documents whose fingerprint did not change since they were pushed should be
+    skipped without reading their content.
+    """
+    document1, document2, document3 = factories.DocumentFactory.create_batch(3)
+
+    assert FindDocumentIndexer().index() == 3
+    assert models.DocumentIndexFingerprint.objects.count() == 3
+
+    mock_push.reset_mock()
+    with patch.object(models.Document, "get_content_response") as mock_content:
+        assert FindDocumentIndexer().index(only_changed=True) == 0
+
+    mock_push.assert_not_called()
+    mock_content.assert_not_called()
+
+    document1.title = "new title"
+    document1.save()
+    factories.UserDocumentAccessFactory(document=document2)
+
+    assert FindDocumentIndexer().index(only_changed=True) == 2
+    assert {doc["id"] for doc in mock_push.call_args.args[0]} == {
+        str(document1.pk),
+        str(document2.pk),
+    }
+    assert models.DocumentIndexFingerprint.objects.get(
+        document_id=document3.pk
+    ).fingerprint == FindDocumentIndexer.get_fingerprint(document3, {})
+
+
+@patch.object(FindDocumentIndexer, "push", side_effect=HTTPError)
+@pytest.mark.usefixtures("indexer_settings")
+def test_services_search_indexers_index_fingerprints_not_pushed(_mock_push):
+    """Fingerprints should not be recorded when pushing fails."""
+    factories.DocumentFactory()
+
+    with pytest.raises(HTTPError):
+        FindDocumentIndexer().index()
+
+    assert not models.DocumentIndexFingerprint.objects.exists()
+
+
+@responses.activate
+@patch.object(FindDocumentIndexer, "push")
+def test_services_search_indexers_delete_vanished(_mock_push, indexer_settings):
+    """Documents deleted from the database should be deleted from the index."""
+    indexer_settings.INDEXING_DELETE_URL = "http://app-find/api/v1.0/documents/delete/"
+    document, deleted_document = factories.DocumentFactory.create_batch(2)
+    FindDocumentIndexer().index()
+    deleted_id = str(deleted_document.pk)
+    deleted_document.delete()
+
+    responses.add(
+        responses.POST, "http://app-find/api/v1.0/documents/delete/", status=200
+    )
+
+    assert FindDocumentIndexer().delete_vanished() == 1
+
+    assert len(responses.calls) == 1
+    request = responses.calls[0].request
+    assert json_loads(request.body) == [deleted_id]
+    assert request.headers["Authorization"] == "Bearer ThisIsAKeyForTest"
+    assert list(
+        models.DocumentIndexFingerprint.objects.values_list("document_id", flat=True)
+    ) == [document.pk]
+    assert FindDocumentIndexer().delete_vanished() == 0
+
+
+@patch.object(FindDocumentIndexer, "push")
+@pytest.mark.usefixtures("indexer_settings")
+def test_services_search_indexers_delete_vanished_not_configured(_mock_push):
+    """Deleting documents requires the deletion endpoint of Find to be set."""
+    document = factories.DocumentFactory()
+    FindDocumentIndexer().index()
+    document.delete()
+
+    with pytest.raises(ImproperlyConfigured):
+        FindDocumentIndexer().delete_vanished()
+
+    assert models.DocumentIndexFingerprint.objects.count() == 1
+
+
 @patch.object(FindDocumentIndexer, "push")
 @pytest.mark.usefixtures("indexer_settings")
 def test_services_search_indexers_ignore_empty_documents(mock_push):
@@ -442,10 +861,49 @@ def test_services_search_indexers_ancestors_teams(mock_push):
     assert set(results[str(document.id)]["groups"]) == {"team_gp", "team_p", "team_d"}
 
 
-@patch("requests.post")
+def test_services_search_indexers_get_batch_accesses_single_query(
+    django_assert_num_queries,
+):
+    """
+    Accesses of the documents and of their ancestors should be aggregated per
+    document in a single query, ignoring the documents of other trees.
+    """
+    user_gp, user_d, user_other = factories.UserFactory.create_batch(3)
+
+    grand_parent = factories.DocumentFactory(users=[user_gp], teams=["team_gp"])
+    parent = factories.DocumentFactory(parent=grand_parent)
+    document = factories.DocumentFactory(parent=parent, users=[user_d, user_gp])
+    sibling = factories.DocumentFactory(parent=parent, teams=["team_s"])
+    factories.DocumentFactory(users=[user_other], teams=["team_other"])
+    orphan = factories.DocumentFactory()
+
+    with django_assert_num_queries(1):
+        accesses = search_indexers.get_batch_accesses_by_users_and_teams(
+            [parent.path, document.path, sibling.path, orphan.path]
+        )
+
+    assert accesses == {
+        parent.path: {"users": {str(user_gp.sub)}, "teams": {"team_gp"}},
+        document.path: {
+            "users": {str(user_gp.sub), str(user_d.sub)},
+            "teams": {"team_gp"},
+        },
+        sibling.path: {"users": {str(user_gp.sub)}, "teams": {"team_gp", "team_s"}},
+    }
+
+
+def test_services_search_indexers_get_batch_accesses_no_paths(
+    django_assert_num_queries,
+):
+    """No query should be made without paths."""
+    with django_assert_num_queries(0):
+        assert search_indexers.get_batch_accesses_by_users_and_teams([]) == {}
+
+
+@patch("requests.Session.post")
 def test_push_uses_correct_url_and_data(mock_post, indexer_settings):
     """
-    push() should call requests.post with the correct URL from settings
+    push() should post with the correct URL from settings
     the timeout set to 10 seconds and the data as JSON.
     """
     indexer_settings.INDEXING_URL = "http://example.com/index"
@@ -466,6 +924,181 @@ def test_push_uses_correct_url_and_data(mock_post, indexer_settings):
     assert kwargs.get("timeout") == 10
 
 
+@pytest.mark.usefixtures("indexer_settings")
+def test_services_search_indexers_index_session_keep_alive(find_server):
+    """All the batches should be pushed through the same connection."""
+    documents = factories.DocumentFactory.create_batch(3)
+
+    assert FindDocumentIndexer().index(batch_size=1) == 3
+
+    assert len(find_server.requests) == 3
+    assert {request["client_address"] for request in find_server.requests} == {
+        find_server.requests[0]["client_address"]
+    }
+    assert sorted(
+        doc["id"] for request in find_server.requests for doc in request["json"]
+    ) == sorted(str(document.id) for document in documents)
+    assert find_server.requests[0]["headers"]["Authorization"] == (
+        "Bearer ThisIsAKeyForTest"
+    )
+
+
+def test_services_search_indexers_push_compress(find_server, settings):
+    """Batches should be pushed compressed with gzip if enabled."""
+    data = [{"id": "123", "title": "Test"}]
+
+    FindDocumentIndexer().push(data)
+
+    assert "Content-Encoding" not in find_server.requests[0]["headers"]
+
+    settings.SEARCH_INDEXER_PUSH_COMPRESS = True
+    FindDocumentIndexer().push(data)
+
+    assert find_server.requests[1]["headers"]["Content-Encoding"] == "gzip"
+    assert find_server.requests[1]["json"] == data
+
+
+@patch("core.services.search_indexers.time.sleep")
+def test_services_search_indexers_push_retries(mock_sleep, find_server):
+    """Transient errors of the Find app should be retried with a backoff."""
+    find_server.statuses = [503, 429]
+
+    FindDocumentIndexer().push([{"id": "123"}])
+
+    assert len(find_server.requests) == 3
+    assert mock_sleep.call_count == 2
+    assert all(0 <= call.args[0] <= 1 for call in mock_sleep.call_args_list)
+
+
+@patch("core.services.search_indexers.time.sleep")
+def test_services_search_indexers_push_retries_exhausted(
+    mock_sleep, find_server, settings
+):
+    """The error should be raised once all the retries failed."""
+    settings.SEARCH_INDEXER_PUSH_RETRIES = 1
+    find_server.statuses = [500, 500, 200]
+
+    with pytest.raises(HTTPError):
+        FindDocumentIndexer().push([{"id": "123"}])
+
+    assert len(find_server.requests) == 2
+    assert mock_sleep.call_count == 1
+
+
+@patch("core.services.search_indexers.time.sleep")
+def test_services_search_indexers_push_errors_not_retried(mock_sleep, find_server):
+    """Errors other than transient ones should not be retried."""
+    find_server.statuses = [401]
+
+    with pytest.raises(HTTPError):
+        FindDocumentIndexer().push([{"id": "123"}])
+
+    assert len(find_server.requests) == 1
+    mock_sleep.assert_not_called()
+
+
+@patch("core.services.search_indexers.time.sleep")
+@patch("requests.Session.post")
+def test_services_search_indexers_push_retries_connection_errors(
+    mock_post, mock_sleep, indexer_settings
+):
+    """Connection errors should be retried, and raised once the retries failed."""
+    indexer_settings.SEARCH_INDEXER_PUSH_RETRIES = 2
+    mock_post.side_effect = [
+        requests.ConnectionError,
+        requests.Timeout,
+        mock_post.return_value,
+    ]
+    mock_post.return_value.status_code = 200
+
+    FindDocumentIndexer().push([{"id": "123"}])
+    assert mock_post.call_count == 3
+
+    mock_post.side_effect = requests.ConnectionError
+    with pytest.raises(requests.ConnectionError):
+        FindDocumentIndexer().push([{"id": "123"}])
+    assert mock_post.call_count == 6
+    assert mock_sleep.call_count == 4
+
+
+def test_services_search_indexers_get_retry_delay():
+    """The delay should grow with the attempts, up to the "Retry-After" header."""
+    response = Response()
+
+    with patch("core.services.search_indexers.random.uniform") as mock_uniform:
+        mock_uniform.side_effect = lambda low, high: high
+        assert FindDocumentIndexer.get_retry_delay(0) == 0.5
+        assert FindDocumentIndexer.get_retry_delay(3, response) == 4
+        assert FindDocumentIndexer.get_retry_delay(10) == 30
+
+        response.headers["Retry-After"] = "12"
+        assert FindDocumentIndexer.get_retry_delay(0, response) == 12
+        response.headers["Retry-After"] = "3600"
+        assert FindDocumentIndexer.get_retry_delay(0, response) == 30
+
+
+@pytest.mark.usefixtures("indexer_settings")
+def test_services_search_indexers_index_split_too_large(find_server):
+    """Batches too large for the Find app should be split until accepted."""
+    find_server.max_documents = 2
+    documents = factories.DocumentFactory.create_batch(5)
+
+    assert FindDocumentIndexer().index() == 5
+
+    assert [len(request["json"]) for request in find_server.requests] == [
+        5,
+        2,
+        3,
+        1,
+        2,
+    ]
+    assert sorted(
+        doc["id"]
+        for request in find_server.requests
+        if len(request["json"]) <= 2
+        for doc in request["json"]
+    ) == sorted(str(document.id) for document in documents)
+    # The fingerprints of all the documents are recorded
+    assert models.DocumentIndexFingerprint.objects.count() == 5
+
+
+def test_services_search_indexers_push_single_document_too_large(find_server):
+    """A single document too large for the Find app should raise an error."""
+    find_server.max_documents = 0
+
+    with pytest.raises(HTTPError):
+        FindDocumentIndexer().push([{"id": "123"}])
+
+    assert len(find_server.requests) == 1
+
+
+@patch("core.services.search_indexers.time.sleep")
+def test_services_search_indexers_search_not_retried(mock_sleep, find_server):
+    """Searches should not be retried so as not to keep users waiting."""
+    find_server.statuses = [503]
+
+    with pytest.raises(HTTPError):
+        FindDocumentIndexer().search(q="alpha", token="mytoken")
+
+    assert len(find_server.requests) == 1
+    mock_sleep.assert_not_called()
+
+
+@patch("core.services.search_indexers.time.sleep")
+def test_services_search_indexers_delete_retries(mock_sleep, find_server):
+    """Deletions should be retried like pushes."""
+    find_server.statuses = [502]
+
+    FindDocumentIndexer().delete(["123"])
+
+    assert [request["json"] for request in find_server.requests] == [
+        ["123"],
+        ["123"],
+    ]
+    assert find_server.requests[0]["path"] == "/api/v1.0/documents/delete/"
+    assert mock_sleep.call_count == 1
+
+
 def test_get_visited_document_ids_of():
     """
     get_visited_document_ids_of() returns the ids of the documents viewed
@@ -474,10 +1107,9 @@ def test_get_visited_document_ids_of():
     user = factories.UserFactory()
     other = factories.UserFactory()
     anonymous = AnonymousUser()
-    queryset = models.Document.objects.all()
 
-    assert not get_visited_document_ids_of(queryset, anonymous)
-    assert not get_visited_document_ids_of(queryset, user)
+    assert not get_visited_document_ids_of(anonymous)
+    assert not get_visited_document_ids_of(user)
 
     doc1, doc2, _ = factories.DocumentFactory.create_batch(3)
 
@@ -487,7 +1119,7 @@ def test_get_visited_document_ids_of():
     create_link(document=doc2)
 
     # The third document is not visited
-    assert sorted(get_visited_document_ids_of(queryset, user)) == sorted(
+    assert sorted(get_visited_document_ids_of(user)) == sorted(
         [str(doc1.pk), str(doc2.pk)]
     )
 
@@ -495,7 +1127,7 @@ def test_get_visited_document_ids_of():
     factories.UserDocumentAccessFactory(user=user, document=doc2)
 
     # The second document have an access for the user
-    assert get_visited_document_ids_of(queryset, user) == (str(doc1.pk),)
+    assert get_visited_document_ids_of(user) == (str(doc1.pk),)
 
 
 @pytest.mark.usefixtures("indexer_settings")
@@ -506,10 +1138,9 @@ def test_get_visited_document_ids_of_deleted():
     """
     user = factories.UserFactory()
     anonymous = AnonymousUser()
-    queryset = models.Document.objects.all()
 
-    assert not get_visited_document_ids_of(queryset, anonymous)
-    assert not get_visited_document_ids_of(queryset, user)
+    assert not get_visited_document_ids_of(anonymous)
+    assert not get_visited_document_ids_of(user)
 
     doc = factories.DocumentFactory()
     doc_deleted = factories.DocumentFactory()
@@ -522,14 +1153,88 @@ def test_get_visited_document_ids_of_deleted():
     create_link(document=doc_ancestor_deleted)
 
     # The all documents are visited
-    assert sorted(get_visited_document_ids_of(queryset, user)) == sorted(
+    assert sorted(get_visited_document_ids_of(user)) == sorted(
         [str(doc.pk), str(doc_deleted.pk), str(doc_ancestor_deleted.pk)]
     )
 
     doc_deleted.soft_delete()
 
     # Only the first document is not deleted
-    assert get_visited_document_ids_of(queryset, user) == (str(doc.pk),)
+    assert get_visited_document_ids_of(user) == (str(doc.pk),)
+
+
+def test_get_visited_document_ids_of_cached(django_assert_num_queries):
+    """
+    The visited documents should be cached per user, only their deletion being
+    checked on each call.
+    """
+    user, other = factories.UserFactory.create_batch(2)
+    document = factories.DocumentFactory(
+        link_reach=models.LinkReachChoices.PUBLIC, link_traces=[user, other]
+    )
+
+    assert get_visited_document_ids_of(user) == (str(document.pk),)
+
+    with django_assert_num_queries(1):
+        assert get_visited_document_ids_of(user) == (str(document.pk),)
+
+    # Changes of other users do not invalidate the cache
+    factories.UserDocumentAccessFactory(user=other, document=document)
+    with django_assert_num_queries(1):
+        assert get_visited_document_ids_of(user) == (str(document.pk),)
+
+
+def test_get_visited_document_ids_of_access_deleted():
+    """The visited documents should be invalidated when an access is deleted."""
+    user = factories.UserFactory()
+    document = factories.DocumentFactory(link_traces=[user])
+    access = factories.UserDocumentAccessFactory(user=user, document=document)
+
+    assert get_visited_document_ids_of(user) == ()
+
+    access.delete()
+
+    assert get_visited_document_ids_of(user) == (str(document.pk),)
+
+
+def test_get_visited_document_ids_of_leave():
+    """The visited documents should be invalidated when the user leaves a document."""
+    user = factories.UserFactory()
+    parent = factories.DocumentFactory(
+        link_reach=models.LinkReachChoices.PUBLIC, link_traces=[user]
+    )
+    child = factories.DocumentFactory(parent=parent, link_traces=[user])
+
+    assert sorted(get_visited_document_ids_of(user)) == sorted(
+        [str(parent.pk), str(child.pk)]
+    )
+
+    client = APIClient()
+    client.force_login(user)
+    response = client.post(f"/api/v1.0/documents/{parent.id!s}/leave/")
+    assert response.status_code == 204
+
+    assert get_visited_document_ids_of(user) == ()
+
+
+def test_get_visited_document_ids_of_restored():
+    """
+    Documents restored should be visited again, without the cache of their
+    visitors being invalidated.
+    """
+    user = factories.UserFactory()
+    parent = factories.DocumentFactory()
+    child = factories.DocumentFactory(parent=parent, link_traces=[user])
+
+    assert get_visited_document_ids_of(user) == (str(child.pk),)
+
+    parent.soft_delete()
+
+    assert get_visited_document_ids_of(user) == ()
+
+    parent.restore()
+
+    assert get_visited_document_ids_of(user) == (str(child.pk),)
 
 
 @responses.activate
@@ -552,10 +1257,10 @@ def test_services_search_indexers_search_errors(indexer_settings):
         FindDocumentIndexer().search(q="alpha", token="mytoken")
 
 
-@patch("requests.post")
+@patch("requests.Session.post")
 def test_services_search_indexers_search(mock_post, indexer_settings):
     """
-    search() should call requests.post to SEARCH_URL with the
+    search() should post to SEARCH_URL with the
     document ids from linktraces.
     """
     user = factories.UserFactory()
@@ -571,7 +1276,7 @@ def test_services_search_indexers_search(mock_post, indexer_settings):
     create_link(document=doc1)
     create_link(document=doc2)
 
-    visited = get_visited_document_ids_of(models.Document.objects.all(), user)
+    visited = get_visited_document_ids_of(user)
 
     indexer.search(q="alpha", visited=visited, token="mytoken")
 
@@ -591,7 +1296,7 @@ def test_services_search_indexers_search(mock_post, indexer_settings):
     assert kwargs.get("timeout") == 10
 
 
-@patch("requests.post")
+@patch("requests.Session.post")
 def test_services_search_indexers_search_nb_results(mock_post, indexer_settings):
     """
     Find API call should have nb_results == SEARCH_INDEXER_QUERY_LIMIT
@@ -612,7 +1317,7 @@ def test_services_search_indexers_search_nb_results(mock_post, indexer_settings)
     create_link(document=doc1)
     create_link(document=doc2)
 
-    visited = get_visited_document_ids_of(models.Document.objects.all(), user)
+    visited = get_visited_document_ids_of(user)
 
     indexer.search(q="alpha", visited=visited, token="mytoken")
 
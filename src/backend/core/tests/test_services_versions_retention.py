@@ -0,0 +1,150 @@
+"""Test the retention policy of document versions."""
+
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.core.files.storage import default_storage
+
+import pytest
+
+from core import factories
+from core.services.versions_retention import (
+    apply_versions_retention_policy,
+    get_versions_to_delete,
+)
+
+NOW = datetime(2026, 10, 19, 12, 30, tzinfo=dt_timezone.utc)
+
+
+def _version(version_id, last_modified, is_latest=False):
+    return {
+        "VersionId": version_id,
+        "LastModified": last_modified,
+        "IsLatest": is_latest,
+        "Size": 10,
+    }
+
+
+# -- get_versions_to_delete --
+
+
+def test_versions_retention_keep_all_recent_versions():
+    """All the versions saved during the "keep all" window should be kept."""
+    versions = [
+        _version(str(i), NOW - timedelta(minutes=i), is_latest=i == 0)
+        for i in range(10)
+    ]
+
+    assert get_versions_to_delete(versions, NOW, keep_all_hours=1, hourly_days=7) == []
+
+
+def test_versions_retention_hourly_snapshots():
+    """Versions of the hourly window should be compacted to one per hour."""
+    versions = [
+        _version("latest", NOW, is_latest=True),
+        _version("a1", datetime(2026, 10, 19, 9, 50, tzinfo=dt_timezone.utc)),
+        _version("a2", datetime(2026, 10, 19, 9, 10, tzinfo=dt_timezone.utc)),
+        _version("b1", datetime(2026, 10, 19, 8, 59, tzinfo=dt_timezone.utc)),
+        _version("c1", datetime(2026, 10, 18, 8, 40, tzinfo=dt_timezone.utc)),
+        _version("c2", datetime(2026, 10, 18, 8, 30, tzinfo=dt_timezone.utc)),
+        _version("c3", datetime(2026, 10, 18, 8, 20, tzinfo=dt_timezone.utc)),
+    ]
+
+    versions_to_delete = get_versions_to_delete(
+        versions, NOW, keep_all_hours=1, hourly_days=7
+    )
+
+    assert [version["VersionId"] for version in versions_to_delete] == [
+        "a2",
+        "c2",
+        "c3",
+    ]
+
+
+def test_versions_retention_daily_snapshots():
+    """Versions older than the hourly window should be compacted to one per day."""
+    versions = [
+        _version("a1", datetime(2026, 10, 1, 20, 0, tzinfo=dt_timezone.utc)),
+        _version("a2", datetime(2026, 10, 1, 10, 0, tzinfo=dt_timezone.utc)),
+        _version("a3", datetime(2026, 10, 1, 0, 10, tzinfo=dt_timezone.utc)),
+        _version("b1", datetime(2026, 9, 30, 23, 0, tzinfo=dt_timezone.utc)),
+        # The hourly window starts on 2026-10-12 at 12:30
+        _version("c1", datetime(2026, 10, 12, 12, 40, tzinfo=dt_timezone.utc)),
+        _version("c2", datetime(2026, 10, 12, 12, 20, tzinfo=dt_timezone.utc)),
+        _version("c3", datetime(2026, 10, 12, 8, 20, tzinfo=dt_timezone.utc)),
+    ]
+
+    versions_to_delete = get_versions_to_delete(
+        versions, NOW, keep_all_hours=1, hourly_days=7
+    )
+
+    assert [version["VersionId"] for version in versions_to_delete] == [
+        "c3",
+        "a2",
+        "a3",
+    ]
+
+
+def test_versions_retention_latest_version_kept():
+    """The latest version should be kept even if a more recent one exists."""
+    last_modified = datetime(2026, 10, 1, 10, 0, tzinfo=dt_timezone.utc)
+    versions = [
+        _version("a1", last_modified + timedelta(minutes=1)),
+        _version("a2", last_modified, is_latest=True),
+    ]
+
+    assert get_versions_to_delete(versions, NOW, keep_all_hours=1, hourly_days=7) == []
+
+
+def test_versions_retention_settings(settings):
+    """The policy should be configured by settings by default."""
+    settings.DOCUMENT_VERSIONS_RETENTION_KEEP_ALL_HOURS = 0
+    settings.DOCUMENT_VERSIONS_RETENTION_HOURLY_DAYS = 0
+
+    versions = [
+        _version("a1", NOW - timedelta(minutes=1)),
+        _version("a2", NOW - timedelta(minutes=2)),
+    ]
+
+    assert get_versions_to_delete(versions, NOW) == [versions[1]]
+
+
+# -- apply_versions_retention_policy --
+
+
+@pytest.mark.django_db
+def test_versions_retention_apply():
+    """Versions not kept by the policy should be deleted from S3 and the catalogue."""
+    document = factories.DocumentFactory()
+    for i in range(4):
+        document.content = f"bar{i:d}"
+        document.save()
+    assert document.versions.count() == 5
+
+    s3_client = default_storage.connection.meta.client
+    response = s3_client.list_object_versions(
+        Bucket=default_storage.bucket_name, Prefix=document.file_key
+    )
+    # Only the latest version and the snapshot of the day should be kept
+    expected = {
+        "versions": 5,
+        "deleted": 3,
+        "size": sum(version["Size"] for version in response["Versions"][2:]),
+    }
+
+    # All versions are in the daily window and were saved during the same day
+    now = document.created_at + timedelta(days=30)
+    assert apply_versions_retention_policy(document, dry_run=True, now=now) == expected
+    assert document.versions.count() == 5
+
+    assert apply_versions_retention_policy(document, now=now) == expected
+
+    response = s3_client.list_object_versions(
+        Bucket=default_storage.bucket_name, Prefix=document.file_key
+    )
+    version_ids = [version["VersionId"] for version in response["Versions"]]
+    assert len(version_ids) == 2
+    assert sorted(document.versions.values_list("version_id", flat=True)) == sorted(
+        version_ids
+    )
+    assert document.content == "bar3"
@@ -1,7 +1,9 @@
 """Test util base64_yjs_to_text."""
 
 import base64
+import logging
 import uuid
+from unittest import mock
 
 from django.core.cache import cache
 
@@ -9,16 +11,28 @@ import pycrdt
 import pytest
 
 from core import factories
+from core.management.commands.benchmark_yjs_to_text import (
+    base64_yjs_to_text_with_soup,
+    generate_blocknote_ydoc,
+)
 from core.utils.dicts import get_value_by_pattern, lowercase_keys
-from core.utils.paths import get_ancestor_to_descendants_map
 from core.utils.users import (
     get_users_sharing_documents_with_cache_key,
     users_sharing_documents_with,
 )
 from core.utils.yjs import (
     base64_yjs_to_text,
+    base64_yjs_to_text_many,
     base64_yjs_to_xml,
+    base64_yjs_to_xml_many,
     extract_attachments,
+    extract_attachments_many,
+    extract_new_attachments,
+    get_yjs_worker_pool,
+    iter_xml_text,
+    parsed_yjs_cache,
+    shutdown_yjs_worker_pool,
+    yjs_to_xml,
 )
 
 pytestmark = pytest.mark.django_db
@@ -63,6 +77,27 @@ def test_utils_base64_yjs_to_xml():
     )
 
 
+@pytest.mark.parametrize("blocks_count", [0, 1, 10, 100])
+def test_utils_base64_yjs_to_text_same_as_soup(blocks_count):
+    """Streaming the XML should extract the same text as parsing it in a soup."""
+    content = generate_blocknote_ydoc(blocks_count, seed=blocks_count)
+
+    assert base64_yjs_to_text(content) == base64_yjs_to_text_with_soup(content)
+
+
+def test_utils_iter_xml_text_chunks():
+    """Text nodes split between chunks fed to the parser should be kept whole."""
+    xml_content = "<p>hello <b>big</b> world</p><p>again</p>"
+
+    with mock.patch("core.utils.yjs.XML_PARSING_CHUNK_SIZE", 3):
+        assert list(iter_xml_text(xml_content)) == [
+            "hello ",
+            "big",
+            " world",
+            "again",
+        ]
+
+
 def test_utils_extract_attachments():
     """
     All attachment keys in the document content should be extracted.
@@ -93,29 +128,202 @@ def test_utils_extract_attachments():
     assert extract_attachments(base64_string) == [image_key1, image_key3]
 
 
-def test_utils_get_ancestor_to_descendants_map_single_path():
-    """Test ancestor mapping of a single path."""
-    paths = ["000100020005"]
-    result = get_ancestor_to_descendants_map(paths, steplen=4)
+def test_utils_extract_new_attachments():
+    """Only the attachment keys missing from the existing ones should be returned."""
+    key1 = f"{uuid.uuid4()!s}/attachments/{uuid.uuid4()!s}.png"
+    key2 = f"{uuid.uuid4()!s}/attachments/{uuid.uuid4()!s}.pdf"
 
-    assert result == {
-        "0001": {"000100020005"},
-        "00010002": {"000100020005"},
-        "000100020005": {"000100020005"},
-    }
+    ydoc = pycrdt.Doc()
+    ydoc["document-store"] = pycrdt.XmlFragment(
+        [
+            pycrdt.XmlElement("image", {"url": f"http://localhost/media/{key1:s}"}),
+            pycrdt.XmlElement("file", {"url": f"/media/{key2:s}"}),
+        ]
+    )
+    base64_string = base64.b64encode(ydoc.get_update()).decode("utf-8")
 
+    assert extract_new_attachments(base64_string, []) == {key1, key2}
+    assert extract_new_attachments(base64_string, [key1]) == {key2}
+    assert extract_new_attachments(base64_string, [key1, key2]) == set()
 
-def test_utils_get_ancestor_to_descendants_map_multiple_paths():
-    """Test ancestor mapping of multiple paths with shared prefixes."""
-    paths = ["000100020005", "00010003"]
-    result = get_ancestor_to_descendants_map(paths, steplen=4)
 
-    assert result == {
-        "0001": {"000100020005", "00010003"},
-        "00010002": {"000100020005"},
-        "000100020005": {"000100020005"},
-        "00010003": {"00010003"},
-    }
+def test_utils_extract_new_attachments_no_candidate_not_materialized():
+    """
+    A content without any new media url should not be materialized, but should
+    still be validated.
+    """
+    with mock.patch("core.utils.yjs.yjs_to_xml") as mock_yjs_to_xml:
+        assert extract_new_attachments(TEST_BASE64_STRING, []) == set()
+
+        with pytest.raises(ValueError):
+            extract_new_attachments(
+                base64.b64encode(b"invalid yjs").decode("utf-8"), []
+            )
+
+    mock_yjs_to_xml.assert_not_called()
+
+
+def _generate_split_url_ydoc(url, start, end):
+    """
+    Generate a base64 yjs document with a url written in a paragraph, the part
+    between start and end being inserted last so the url is split in 3 items.
+    """
+    ydoc = pycrdt.Doc()
+    text = pycrdt.XmlText()
+    ydoc["document-store"] = pycrdt.XmlFragment(
+        [pycrdt.XmlElement("paragraph", {}, [text])]
+    )
+    text.insert(0, f"see {url[:start]:s}{url[end:]:s}")
+    text.insert(4 + start, url[start:end])
+    return base64.b64encode(ydoc.get_update()).decode("utf-8")
+
+
+def test_utils_extract_new_attachments_split_url():
+    """
+    A url split between several items of the update should be found by
+    materializing the document.
+    """
+    key = f"{uuid.uuid4()!s}/attachments/{uuid.uuid4()!s}.png"
+    url = f"/media/{key:s}"
+    content = _generate_split_url_ydoc(url, 20, 40)
+    assert url.encode("utf-8") not in base64.b64decode(content)
+
+    assert extract_new_attachments(content, []) == {key}
+
+
+def test_utils_extract_new_attachments_split_url_limitation():
+    """
+    A url split both in its prefix and in its folder of attachments is not found
+    by the byte level scan: the document is not materialized.
+    """
+    key = f"{uuid.uuid4()!s}/attachments/{uuid.uuid4()!s}.png"
+    url = f"/media/{key:s}"
+    content = _generate_split_url_ydoc(url, 3, 50)
+
+    assert extract_attachments(content) == [key]
+    assert extract_new_attachments(content, []) == set()
+
+
+def test_utils_parsed_yjs_cache_derivations_memoized():
+    """An unchanged content should be decoded once for all its derivations."""
+    content = generate_blocknote_ydoc(10)
+
+    with mock.patch("core.utils.yjs.yjs_to_xml", wraps=yjs_to_xml) as mock_yjs_to_xml:
+        xml_content = base64_yjs_to_xml(content)
+        text = base64_yjs_to_text(content)
+        attachments = extract_attachments(content)
+
+        assert base64_yjs_to_xml(content) == xml_content
+        assert base64_yjs_to_text(content) == text
+        assert extract_attachments(content) == attachments
+
+    mock_yjs_to_xml.assert_called_once()
+
+
+def test_utils_parsed_yjs_cache_lru_eviction(settings):
+    """Least recently used contents should be evicted beyond the maximum size."""
+    contents = [generate_blocknote_ydoc(10, seed=seed) for seed in range(3)]
+    xml_size = max(len(base64_yjs_to_xml(content)) for content in contents)
+    parsed_yjs_cache.clear()
+    settings.YJS_PARSED_CACHE_MAX_SIZE = 2 * xml_size
+
+    with mock.patch("core.utils.yjs.yjs_to_xml", wraps=yjs_to_xml) as mock_yjs_to_xml:
+        base64_yjs_to_xml(contents[0])
+        base64_yjs_to_xml(contents[1])
+        base64_yjs_to_xml(contents[0])  # contents[1] is now the least recently used
+        base64_yjs_to_xml(contents[2])
+        assert mock_yjs_to_xml.call_count == 3
+
+        base64_yjs_to_xml(contents[0])
+        assert mock_yjs_to_xml.call_count == 3
+
+        base64_yjs_to_xml(contents[1])
+        assert mock_yjs_to_xml.call_count == 4
+
+
+def test_utils_parsed_yjs_cache_invalid_content_not_cached():
+    """Errors should be raised each time and nothing should be memoized."""
+    content = base64.b64encode(b"invalid yjs").decode("utf-8")
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            base64_yjs_to_xml(content)
+
+
+def test_utils_yjs_many_inline(settings):
+    """
+    Batch APIs should derive values in order, once per distinct content, and
+    inline when the worker pool is disabled.
+    """
+    settings.YJS_WORKER_POOL_SIZE = 0
+    contents = [generate_blocknote_ydoc(10, seed=seed) for seed in range(3)]
+    batch = [contents[0], "", contents[1], contents[0], None, contents[2]]
+
+    with mock.patch("core.utils.yjs.yjs_to_xml", wraps=yjs_to_xml) as mock_yjs_to_xml:
+        texts = base64_yjs_to_text_many(batch)
+    assert mock_yjs_to_xml.call_count == 3
+
+    assert texts == [
+        base64_yjs_to_text(content) if content else "" for content in batch
+    ]
+    assert base64_yjs_to_xml_many(batch) == [
+        base64_yjs_to_xml(content) if content else "" for content in batch
+    ]
+    assert extract_attachments_many(batch) == [
+        extract_attachments(content) for content in batch
+    ]
+
+
+def test_utils_yjs_many_invalid_content(settings, caplog):
+    """
+    A content that can't be decoded should get the empty value and be logged,
+    without failing the other contents of the batch.
+    """
+    settings.YJS_WORKER_POOL_SIZE = 0
+    content = generate_blocknote_ydoc(10)
+
+    with caplog.at_level(logging.WARNING, logger="core.utils.yjs"):
+        texts = base64_yjs_to_text_many([content, "invalid content"])
+
+    assert texts == [base64_yjs_to_text(content), ""]
+    assert "Could not derive text from a yjs document" in caplog.text
+
+
+def test_utils_yjs_many_worker_pool(settings):
+    """Batch APIs should decode documents in the worker pool when it is enabled."""
+    settings.YJS_WORKER_POOL_SIZE = 2
+    key = f"{uuid.uuid4()!s}/attachments/{uuid.uuid4()!s}.png"
+    ydoc = pycrdt.Doc()
+    ydoc["document-store"] = pycrdt.XmlFragment(
+        [pycrdt.XmlElement("image", {"url": f"/media/{key:s}"})]
+    )
+    with_attachment = base64.b64encode(ydoc.get_update()).decode("utf-8")
+    contents = [generate_blocknote_ydoc(10, seed=seed) for seed in range(4)]
+
+    try:
+        with mock.patch(
+            "core.utils.yjs.yjs_to_xml", side_effect=AssertionError
+        ) as mock_yjs_to_xml:
+            texts = base64_yjs_to_text_many(contents)
+            attachments = extract_attachments_many([with_attachment, ""])
+            # Values decoded by the workers are memoized in this process
+            assert base64_yjs_to_text_many(contents) == texts
+        mock_yjs_to_xml.assert_not_called()
+    finally:
+        shutdown_yjs_worker_pool()
+
+    parsed_yjs_cache.clear()
+    assert texts == [base64_yjs_to_text(content) for content in contents]
+    assert attachments == [[key], []]
+
+
+def test_utils_yjs_worker_pool_disabled_in_daemonic_processes(settings):
+    """Daemonic processes, like celery workers, can not have a worker pool."""
+    settings.YJS_WORKER_POOL_SIZE = 2
+
+    with mock.patch("multiprocessing.current_process") as mock_current_process:
+        mock_current_process.return_value.daemon = True
+        assert get_yjs_worker_pool() is None
 
 
 def test_utils_users_sharing_documents_with_cache_miss():
@@ -0,0 +1,34 @@
+"""Test the debounced queue of the documents to index."""
+
+from unittest import mock
+
+from core.utils import search_queue
+
+
+@mock.patch("core.utils.search_queue.time.time", return_value=1000)
+def test_utils_search_queue_mark_dirty_keeps_due_time(mock_time):
+    """Documents already queued should keep their due time."""
+    search_queue.mark_dirty(["a", "b"], 10)
+
+    mock_time.return_value = 1005
+    search_queue.mark_dirty(["b", "c"], 10)
+
+    assert search_queue.get_next_due() == 1010
+    assert search_queue.pop_due(1010, 10) == ["a", "b"]
+    assert search_queue.pop_due(1014, 10) == []
+    assert search_queue.pop_due(1015, 10) == ["c"]
+    assert search_queue.get_next_due() is None
+
+
+@mock.patch("core.utils.search_queue.time.time", return_value=1000)
+def test_utils_search_queue_pop_due_by_batches(mock_time):
+    """Due documents should be popped in order of due time, by batches."""
+    for index, document_id in enumerate(["c", "b", "a", "d"]):
+        mock_time.return_value = 1000 + index
+        search_queue.mark_dirty([document_id], 10)
+
+    assert search_queue.pop_due(1012, 2) == ["c", "b"]
+    assert search_queue.pop_due(1012, 2) == ["a"]
+    assert search_queue.get_next_due() == 1013
+    assert search_queue.pop_due(1020, 2) == ["d"]
+    assert search_queue.pop_due(1020, 2) == []
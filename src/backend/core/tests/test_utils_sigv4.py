@@ -0,0 +1,118 @@
+"""Test the precomputed SigV4 signer of S3 GET requests."""
+
+from datetime import UTC, datetime, timedelta
+from unittest import mock
+
+from django.core.files.storage import default_storage
+
+import botocore
+import pytest
+from botocore.credentials import Credentials, RefreshableCredentials
+from freezegun import freeze_time
+
+from core.utils.s3 import get_s3_authorization_signer, get_unsigned_s3_client
+from core.utils.sigv4 import KEY_PLACEHOLDER, S3AuthorizationSigner
+
+NOW = datetime(2026, 1, 2, 3, 4, 5, tzinfo=UTC)
+
+
+def _sign_with_botocore(credentials, key):
+    """Sign a GET request of the object the way media-auth used to do it."""
+    url = get_unsigned_s3_client().generate_presigned_url(
+        "get_object",
+        ExpiresIn=0,
+        Params={"Bucket": default_storage.bucket_name, "Key": key},
+    )
+    request = botocore.awsrequest.AWSRequest(method="get", url=url)
+    botocore.auth.S3SigV4Auth(
+        credentials.get_frozen_credentials(), "s3", "us-east-1"
+    ).add_auth(request)
+    return dict(request.headers)
+
+
+def _get_signer(credentials):
+    url_template = get_unsigned_s3_client().generate_presigned_url(
+        "get_object",
+        ExpiresIn=0,
+        Params={"Bucket": default_storage.bucket_name, "Key": KEY_PLACEHOLDER},
+    )
+    return S3AuthorizationSigner(credentials, "us-east-1", url_template)
+
+
+@pytest.mark.parametrize("token", [None, "session-token"])
+@pytest.mark.parametrize(
+    "key",
+    [
+        "5e0e7c2e-9a1c-4bb3-9d63-3b2f30a5f2b1/attachments/image.png",
+        "doc/attachments/espace é+%&=?.png",
+        "tilde~/key",
+    ],
+)
+def test_utils_sigv4_same_headers_as_botocore(key, token):
+    """The signer should produce exactly the headers computed by botocore."""
+    credentials = Credentials("access-key", "secret-key", token)
+
+    with freeze_time(NOW):
+        assert _get_signer(credentials).sign(key) == _sign_with_botocore(
+            credentials, key
+        )
+
+
+def test_utils_sigv4_signing_key_derived_once_per_day():
+    """The signing key should only be derived again when the date changes."""
+    signer = _get_signer(Credentials("access-key", "secret-key"))
+
+    with mock.patch(
+        "core.utils.sigv4._hmac", side_effect=lambda key, msg: b"k" * 32
+    ) as mock_hmac:
+        signer.sign("a", now=NOW)
+        signer.sign("b", now=NOW.replace(hour=23))
+        assert mock_hmac.call_count == 4
+
+        signer.sign("c", now=NOW.replace(day=3))
+        assert mock_hmac.call_count == 8
+
+
+def test_utils_sigv4_credentials_rotation():
+    """
+    Credentials refreshed outside the signer, e.g. by an S3 call of the client
+    sharing them, should be used to sign right away.
+    """
+    credentials = RefreshableCredentials.create_from_metadata(
+        {
+            "access_key": "old-key",
+            "secret_key": "old-secret",
+            "token": "old-token",
+            "expiry_time": (NOW + timedelta(hours=1)).isoformat(),
+        },
+        refresh_using=lambda: {
+            "access_key": "new-key",
+            "secret_key": "new-secret",
+            "token": "new-token",
+            "expiry_time": (NOW + timedelta(hours=2)).isoformat(),
+        },
+        method="sts-assume-role",
+    )
+    signer = _get_signer(credentials)
+
+    with freeze_time(NOW):
+        assert "Credential=old-key/" in signer.sign("a")["Authorization"]
+
+    # The client refreshes the credentials in the advisory window before expiry
+    with freeze_time(NOW + timedelta(minutes=55)):
+        assert credentials.get_frozen_credentials().access_key == "new-key"
+        assert not credentials.refresh_needed()
+
+        assert signer.sign("a") == _sign_with_botocore(credentials, "a")
+        assert "Credential=new-key/" in signer.sign("a")["Authorization"]
+
+
+def test_utils_sigv4_process_global_signer():
+    """The signer of the media bucket should be built once per process."""
+    assert get_s3_authorization_signer() is get_s3_authorization_signer()
+
+
+def test_utils_sigv4_process_global_signer_built_first():
+    """The signer should be built even before the signed client it relies on."""
+    with mock.patch.dict("core.utils.s3._CLIENTS", clear=True):
+        assert get_s3_authorization_signer().sign("a")["Authorization"]
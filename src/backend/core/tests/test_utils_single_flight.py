@@ -0,0 +1,142 @@
+"""Test the single-flight utilities."""
+
+import threading
+from concurrent.futures import Future
+from unittest import mock
+
+from django.core.cache import cache
+
+import pytest
+
+from core.utils.single_flight import SingleFlight, cache_single_flight
+
+# -- SingleFlight --
+
+
+def test_utils_single_flight_concurrent_calls_are_coalesced():
+    """Concurrent calls for the same key should share a single execution."""
+    single_flight = SingleFlight()
+    started = threading.Event()
+    followers_waiting = threading.Semaphore(0)
+    calls = []
+
+    class WatchedFuture(Future):
+        """Future signaling when a follower starts waiting for its result."""
+
+        def result(self, timeout=None):
+            followers_waiting.release()
+            return super().result(timeout=timeout)
+
+    def func():
+        calls.append(1)
+        started.set()
+        # Only resolve once every follower is waiting for the leader's result
+        for _ in range(5):
+            followers_waiting.acquire(timeout=5)
+        return "result"
+
+    results = []
+
+    def call():
+        results.append(single_flight.do("k", func))
+
+    with mock.patch("core.utils.single_flight.Future", WatchedFuture):
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait(timeout=5)
+
+        followers = [threading.Thread(target=call) for _ in range(5)]
+        for follower in followers:
+            follower.start()
+
+        for thread in [leader, *followers]:
+            thread.join(timeout=5)
+
+    assert calls == [1]
+    assert results == ["result"] * 6
+
+
+def test_utils_single_flight_sequential_calls_are_not_coalesced():
+    """Once a call is resolved, the next call for the same key runs again."""
+    single_flight = SingleFlight()
+    func = mock.Mock(side_effect=["first", "second"])
+
+    assert single_flight.do("k", func) == "first"
+    assert single_flight.do("k", func) == "second"
+    assert func.call_count == 2
+
+
+def test_utils_single_flight_exception_is_raised_and_forgotten():
+    """An exception should be raised to the caller and not be remembered."""
+    single_flight = SingleFlight()
+
+    with pytest.raises(ValueError):
+        single_flight.do("k", mock.Mock(side_effect=ValueError("boom")))
+
+    assert single_flight.do("k", lambda: "ok") == "ok"
+
+
+# -- cache_single_flight --
+
+
+def test_utils_cache_single_flight_leader_shares_result():
+    """The leader should store its result in the cache for the next callers."""
+    func = mock.Mock(return_value={"value": 1})
+    kwargs = {"lock_timeout": 5, "wait_timeout": 1, "result_timeout": 5}
+
+    assert cache_single_flight("docs:test", func, **kwargs) == {"value": 1}
+    assert cache_single_flight("docs:test", func, **kwargs) == {"value": 1}
+
+    func.assert_called_once()
+    assert cache.get("docs:test") == {"value": 1}
+    assert not cache.has_key("docs:test:lock")
+
+
+def test_utils_cache_single_flight_result_not_shared():
+    """A result rejected by the `should_share` predicate should not be cached."""
+    func = mock.Mock(return_value={"value": 1})
+
+    cache_single_flight(
+        "docs:test",
+        func,
+        lock_timeout=5,
+        wait_timeout=1,
+        result_timeout=5,
+        should_share=lambda result: False,
+    )
+
+    assert cache.get("docs:test") is None
+
+
+def test_utils_cache_single_flight_follower_waits_for_leader():
+    """A follower should use the result published by the leader holding the lock."""
+    cache.add("docs:test:lock", 1, timeout=5)
+    func = mock.Mock(return_value="follower")
+
+    def publish(*args, **kwargs):
+        cache.set("docs:test", "leader")
+
+    with mock.patch("core.utils.single_flight.time.sleep", side_effect=publish):
+        result = cache_single_flight(
+            "docs:test", func, lock_timeout=5, wait_timeout=1, result_timeout=5
+        )
+
+    assert result == "leader"
+    func.assert_not_called()
+
+
+def test_utils_cache_single_flight_follower_fallback():
+    """A follower should call the function itself if the leader gives up."""
+    cache.add("docs:test:lock", 1, timeout=5)
+    func = mock.Mock(return_value="follower")
+
+    def release(*args, **kwargs):
+        cache.delete("docs:test:lock")
+
+    with mock.patch("core.utils.single_flight.time.sleep", side_effect=release):
+        result = cache_single_flight(
+            "docs:test", func, lock_timeout=5, wait_timeout=1, result_timeout=5
+        )
+
+    assert result == "follower"
+    func.assert_called_once()
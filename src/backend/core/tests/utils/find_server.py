@@ -0,0 +1,88 @@
+"""Local HTTP stand-in of the Find app API for tests."""
+
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FindServer:
+    """
+    Find app API served on a local port. It records the requests it receives and
+    answers them with the statuses queued in `statuses` first, then with a 200.
+    Batches of more than `max_documents` documents are answered with a 413.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.statuses = []
+        self.max_documents = None
+        self.search_results = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._get_handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        """Base URL of the server."""
+        return f"http://127.0.0.1:{self._server.server_port:d}"
+
+    def start(self):
+        """Serve requests in a thread."""
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving requests."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _get_status(self, data):
+        with self._lock:
+            if self.statuses:
+                return self.statuses.pop(0)
+        if (
+            self.max_documents is not None
+            and isinstance(data, list)
+            and len(data) > self.max_documents
+        ):
+            return 413
+        return 200
+
+    def _get_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Record the request and answer it."""
+
+            # Keep the connections alive like the Find app
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):  # pylint: disable=invalid-name
+                """Answer a POST request of the Find app API."""
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                if self.headers.get("Content-Encoding") == "gzip":
+                    body = gzip.decompress(body)
+                data = json.loads(body)
+                server.requests.append(
+                    {
+                        "path": self.path,
+                        "headers": dict(self.headers),
+                        "json": data,
+                        "client_address": self.client_address,
+                    }
+                )
+
+                status = server._get_status(data)  # pylint: disable=protected-access
+                response = json.dumps(
+                    server.search_results if self.path.endswith("/search/") else {}
+                ).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                """Do not log the requests."""
+
+        return Handler
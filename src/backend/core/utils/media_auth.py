@@ -0,0 +1,132 @@
+"""Caches of the decisions taken by the ``media-auth`` endpoint.
+
+``media-auth`` is called by the reverse proxy for every image of every page
+view. Deciding whether a user can read an attachment requires a lookup of the
+documents holding the attachment, an EXISTS query on the documents readable by
+the user and a ``head_object`` to check that the attachment is ready. Two caches
+let repeated loads of the same image skip both PostgreSQL and the object storage:
+
+- a per-attachment **ready** cache, populated when the malware detection reports
+  the file as safe (the status of an attachment never goes back to processing);
+- a short-lived **decision** cache of granted accesses, keyed by user and
+  attachment key.
+
+A decision depends on the accesses and link configuration of the documents
+holding the attachment and of their ancestors. Instead of tracking every
+decision, each document tree has a "generation" in the cache that is renewed
+when an access, the link configuration, the position or the deletion state of
+one of its documents changes. A decision records the generation of the trees it
+was computed from and is ignored as soon as one of them has changed.
+"""
+
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+TREE_PATH_LENGTH = 7  # Same as Document.steplen: the path of root documents
+
+
+def get_tree_generation_cache_key(path):
+    """Return the cache key of the generation of the tree including this path."""
+    return f"docs:media-auth-tree:{path[:TREE_PATH_LENGTH]:s}"
+
+
+def get_decision_cache_key(user, key):
+    """
+    Return the cache key of the decision for a user and an attachment key. The
+    decision for anonymous users only depends on public links so it is shared.
+    """
+    identity = str(user.id) if user.is_authenticated else "anonymous"
+    return f"docs:media-auth-decision:{identity:s}:{key:s}"
+
+
+def get_attachment_ready_cache_key(key):
+    """Return the cache key remembering that an attachment is ready."""
+    return f"docs:attachment-ready:{key:s}"
+
+
+def _renew_tree_generations(cache_keys):
+    # Generations only need to outlive the decisions computed before their renewal
+    cache.set_many(
+        {cache_key: uuid.uuid4().hex for cache_key in cache_keys},
+        timeout=2 * settings.MEDIA_AUTH_DECISION_CACHE_TIMEOUT,
+    )
+
+
+def invalidate_trees(*paths):
+    """
+    Invalidate the decisions involving documents of the trees including these paths.
+
+    Generations are renewed right away and again once the current transaction is
+    committed, so that a decision computed meanwhile from the previous state of
+    the database is not kept.
+    """
+    if not settings.MEDIA_AUTH_DECISION_CACHE_TIMEOUT:
+        return
+
+    cache_keys = {get_tree_generation_cache_key(path) for path in paths if path}
+    if not cache_keys:
+        return
+
+    _renew_tree_generations(cache_keys)
+    transaction.on_commit(lambda: _renew_tree_generations(cache_keys))
+
+
+def get_tree_generations(paths):
+    """Return the current generation of the trees including these paths."""
+    cache_keys = {get_tree_generation_cache_key(path) for path in paths}
+    generations = cache.get_many(cache_keys)
+    return {cache_key: generations.get(cache_key) for cache_key in cache_keys}
+
+
+def is_access_granted(user, key):
+    """Tell if an access to the attachment was granted and is still valid."""
+    if not settings.MEDIA_AUTH_DECISION_CACHE_TIMEOUT:
+        return False
+
+    decision = cache.get(get_decision_cache_key(user, key))
+    if decision is None:
+        return False
+
+    current_generations = cache.get_many(decision.keys())
+    return all(
+        current_generations.get(cache_key) == generation
+        for cache_key, generation in decision.items()
+    )
+
+
+def grant_access(user, key, generations):
+    """
+    Remember that an access to the attachment was granted to the user, given the
+    generations of the trees read before the decision was taken.
+    """
+    if not settings.MEDIA_AUTH_DECISION_CACHE_TIMEOUT:
+        return
+
+    cache.set(
+        get_decision_cache_key(user, key),
+        generations,
+        settings.MEDIA_AUTH_DECISION_CACHE_TIMEOUT,
+    )
+
+
+def is_attachment_ready(key):
+    """Tell if the attachment is known to be ready."""
+    return cache.get(get_attachment_ready_cache_key(key)) is not None
+
+
+def get_ready_attachments(keys):
+    """Return the subset of the attachment keys known to be ready."""
+    cache_keys = {get_attachment_ready_cache_key(key): key for key in keys}
+    return {cache_keys[cache_key] for cache_key in cache.get_many(cache_keys)}
+
+
+def mark_attachment_ready(key):
+    """Remember that the attachment is ready."""
+    cache.set(
+        get_attachment_ready_cache_key(key),
+        1,
+        settings.MEDIA_AUTH_READY_CACHE_TIMEOUT,
+    )
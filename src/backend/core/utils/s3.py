@@ -22,9 +22,14 @@ configuration (endpoint, region, signature version, credentials, TLS).
 
 import threading
 
+from django.conf import settings
 from django.core.files.storage import default_storage
 
-_LOCK = threading.Lock()
+from core.utils.sigv4 import KEY_PLACEHOLDER, S3AuthorizationSigner
+
+# Reentrant: a factory may itself get another client, e.g. the signer needs the
+# signed client
+_LOCK = threading.RLock()
 _CLIENTS = {}
 
 
@@ -50,3 +55,46 @@ def get_s3_client():
 def get_unsigned_s3_client():
     """Return a process-global unsigned S3 client, for presigning URLs."""
     return _cached("unsigned", lambda: default_storage.unsigned_connection.meta.client)
+
+
+def get_public_s3_client():
+    """
+    Return a process-global signed S3 client for presigning URLs used by browsers:
+    on ``AWS_S3_PUBLIC_ENDPOINT_URL`` when the internal endpoint is not reachable
+    from outside (e.g. ``minio:9000`` in compose), the signed client otherwise.
+    """
+
+    def build_client():
+        if not settings.AWS_S3_PUBLIC_ENDPOINT_URL:
+            return get_s3_client()
+        # pylint: disable=protected-access
+        return default_storage._create_session().client(  # noqa: SLF001
+            "s3",
+            region_name=default_storage.region_name,
+            use_ssl=default_storage.use_ssl,
+            endpoint_url=settings.AWS_S3_PUBLIC_ENDPOINT_URL,
+            config=default_storage.client_config,
+            verify=default_storage.verify,
+        )
+
+    return _cached("public", build_client)
+
+
+def get_s3_authorization_signer():
+    """Return a process-global signer of GET requests to the media bucket."""
+
+    def build_signer():
+        s3_client = get_s3_client()
+        url_template = get_unsigned_s3_client().generate_presigned_url(
+            "get_object",
+            ExpiresIn=0,
+            Params={"Bucket": default_storage.bucket_name, "Key": KEY_PLACEHOLDER},
+        )
+        return S3AuthorizationSigner(
+            # pylint: disable=protected-access
+            s3_client._request_signer._credentials,  # noqa: SLF001
+            s3_client.meta.region_name,
+            url_template,
+        )
+
+    return _cached("authorization-signer", build_signer)
@@ -0,0 +1,89 @@
+"""Debounced queue of the documents to index.
+
+Documents whose changes were recorded in the indexing journal are queued with the
+time at which they are due for indexation, in a Redis sorted set scored by due
+time. A document already queued keeps its due time: the changes of a document
+edited continuously are coalesced and indexed at the end of each countdown instead
+of being postponed forever, without delaying the other documents.
+
+Due documents are popped atomically and in batches by the indexing task, so that
+concurrent tasks never index the same document twice.
+
+Other cache backends (development and tests) keep the queue as a dict in the
+cache, without atomicity.
+"""
+
+import time
+
+from django.core.cache import cache
+
+from django_redis.cache import RedisCache
+
+QUEUE_CACHE_KEY = "docs:search-indexer:dirty-documents"
+
+# Pop the members scored up to ARGV[1], at most ARGV[2] of them
+POP_DUE_SCRIPT = """
+local members = redis.call("ZRANGEBYSCORE", KEYS[1], "-inf", ARGV[1], "LIMIT", 0, ARGV[2])
+for _, member in ipairs(members) do
+    redis.call("ZREM", KEYS[1], member)
+end
+return members
+"""
+
+
+def _get_redis_client():
+    """Return the Redis client of the cache, None if the cache is not Redis."""
+    if isinstance(cache, RedisCache):
+        return cache.client.get_client(write=True)
+    return None
+
+
+def mark_dirty(document_ids, countdown):
+    """
+    Queue documents to be indexed in `countdown` seconds, except documents already
+    queued which keep their due time.
+    """
+    due = time.time() + countdown
+    client = _get_redis_client()
+    if client is not None:
+        client.zadd(
+            cache.make_key(QUEUE_CACHE_KEY),
+            {str(document_id): due for document_id in document_ids},
+            nx=True,
+        )
+        return
+
+    queue = cache.get(QUEUE_CACHE_KEY, {})
+    for document_id in document_ids:
+        queue.setdefault(str(document_id), due)
+    cache.set(QUEUE_CACHE_KEY, queue, timeout=None)
+
+
+def pop_due(due_before, count):
+    """Remove from the queue and return the ids of at most `count` due documents."""
+    client = _get_redis_client()
+    if client is not None:
+        members = client.eval(
+            POP_DUE_SCRIPT, 1, cache.make_key(QUEUE_CACHE_KEY), due_before, count
+        )
+        return [member.decode() for member in members]
+
+    queue = cache.get(QUEUE_CACHE_KEY, {})
+    document_ids = sorted(
+        (document_id for document_id, due in queue.items() if due <= due_before),
+        key=queue.get,
+    )[:count]
+    for document_id in document_ids:
+        del queue[document_id]
+    cache.set(QUEUE_CACHE_KEY, queue, timeout=None)
+    return document_ids
+
+
+def get_next_due():
+    """Return the earliest due time of the queued documents, None if it is empty."""
+    client = _get_redis_client()
+    if client is not None:
+        first = client.zrange(cache.make_key(QUEUE_CACHE_KEY), 0, 0, withscores=True)
+        return first[0][1] if first else None
+
+    return min(cache.get(QUEUE_CACHE_KEY, {}).values(), default=None)
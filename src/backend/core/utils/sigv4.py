@@ -0,0 +1,156 @@
+"""Precomputed AWS Signature Version 4 signing of S3 GET requests.
+
+``media-auth`` signs a GET request for the attachment it authorizes on every
+call. Doing it with botocore means presigning a URL, building an ``AWSRequest``,
+freezing the credentials and instantiating an ``S3SigV4Auth`` whose
+``add_auth`` parses the URL back, normalizes headers and derives the signing
+key with four chained HMACs, although only the object key changes from one
+call to the next.
+
+The signer below keeps everything that does not depend on the object key:
+
+- the URL of the bucket (scheme, host and path prefix), computed once from the
+  unsigned client so that it follows the client's addressing style;
+- the derived signing key, cached per (date, region, service) and credentials.
+
+Each call then builds the canonical request of ``GET <path>`` directly from the
+key and computes a single HMAC on the string to sign.
+"""
+
+import hashlib
+import hmac
+from urllib.parse import quote, urlsplit
+
+from django.utils import timezone
+
+ALGORITHM = "AWS4-HMAC-SHA256"
+# SHA256 of the empty body of a GET request
+EMPTY_PAYLOAD_HASH = hashlib.sha256(b"").hexdigest()
+SIGV4_TIMESTAMP_FORMAT = "%Y%m%dT%H%M%SZ"
+# Placeholder key presigned once to find the URL template of the bucket
+KEY_PLACEHOLDER = "__key__"
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def _hmac(key, msg):
+    return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).digest()
+
+
+def _get_host(url_parts):
+    """Return the value of the "host" header, without the default port."""
+    host = url_parts.hostname
+    if ":" in host:  # IPv6
+        host = f"[{host:s}]"
+    if url_parts.port is not None and url_parts.port != DEFAULT_PORTS.get(
+        url_parts.scheme
+    ):
+        host = f"{host:s}:{url_parts.port:d}"
+    return host
+
+
+class S3AuthorizationSigner:
+    """
+    Sign GET requests of objects of a bucket with AWS Signature Version 4,
+    producing the same headers as botocore's ``S3SigV4Auth``.
+
+    Instances are thread-safe and meant to be shared by the whole process (see
+    ``core.utils.s3.get_s3_authorization_signer``).
+    """
+
+    def __init__(self, credentials, region, url_template, service="s3"):
+        """
+        Args:
+            credentials: botocore credentials, refreshable or not.
+            region (str): region of the bucket.
+            url_template (str): URL of an object whose key is ``KEY_PLACEHOLDER``.
+            service (str): name of the signed service.
+        """
+        url_parts = urlsplit(url_template)
+        self.path_prefix, _placeholder, self.path_suffix = url_parts.path.partition(
+            KEY_PLACEHOLDER
+        )
+        self.host = _get_host(url_parts)
+        self.region = region
+        self.service = service
+        self._credentials = credentials
+        self._signing_key = (None, None)
+
+    def get_frozen_credentials(self):
+        """
+        Return the current credentials, frozen on every call: refreshable credentials
+        are shared with the S3 client, which may rotate them at any time, and
+        freezing them is cheap when they do not need to be refreshed.
+        """
+        return self._credentials.get_frozen_credentials()
+
+    def get_signing_key(self, date, secret_key):
+        """Return the signing key of a date, derived once per day and credentials."""
+        cache_key = (date, self.region, self.service, secret_key)
+        cached_key, signing_key = self._signing_key
+        if cached_key == cache_key:
+            return signing_key
+
+        k_date = _hmac(f"AWS4{secret_key:s}".encode(), date)
+        k_region = _hmac(k_date, self.region)
+        k_service = _hmac(k_region, self.service)
+        signing_key = _hmac(k_service, "aws4_request")
+        # Replaced as a whole so that concurrent readers never see a mixed state
+        self._signing_key = (cache_key, signing_key)
+        return signing_key
+
+    def sign(self, key, now=None):
+        """
+        Return the headers authorizing a GET request of the object ``key``:
+        "X-Amz-Date", "X-Amz-Content-SHA256", "Authorization" and, with
+        temporary credentials, "X-Amz-Security-Token".
+        """
+        credentials = self.get_frozen_credentials()
+        timestamp = (now or timezone.now()).strftime(SIGV4_TIMESTAMP_FORMAT)
+        date = timestamp[:8]
+
+        headers = {"X-Amz-Date": timestamp}
+        canonical_headers = [
+            f"host:{self.host:s}",
+            f"x-amz-content-sha256:{EMPTY_PAYLOAD_HASH:s}",
+            f"x-amz-date:{timestamp:s}",
+        ]
+        if credentials.token:
+            headers["X-Amz-Security-Token"] = credentials.token
+            canonical_headers.append(f"x-amz-security-token:{credentials.token:s}")
+        headers["X-Amz-Content-SHA256"] = EMPTY_PAYLOAD_HASH
+        signed_headers = ";".join(
+            header.split(":", 1)[0] for header in canonical_headers
+        )
+
+        path = f"{self.path_prefix:s}{quote(key, safe='/~'):s}{self.path_suffix:s}"
+        canonical_request = "\n".join(
+            [
+                "GET",
+                path,
+                "",  # no query string
+                "\n".join(canonical_headers) + "\n",
+                signed_headers,
+                EMPTY_PAYLOAD_HASH,
+            ]
+        )
+
+        scope = f"{date:s}/{self.region:s}/{self.service:s}/aws4_request"
+        string_to_sign = "\n".join(
+            [
+                ALGORITHM,
+                timestamp,
+                scope,
+                hashlib.sha256(canonical_request.encode("utf-8")).hexdigest(),
+            ]
+        )
+        signature = hmac.new(
+            self.get_signing_key(date, credentials.secret_key),
+            string_to_sign.encode("utf-8"),
+            hashlib.sha256,
+        ).hexdigest()
+
+        headers["Authorization"] = (
+            f"{ALGORITHM:s} Credential={credentials.access_key:s}/{scope:s}, "
+            f"SignedHeaders={signed_headers:s}, Signature={signature:s}"
+        )
+        return headers
@@ -0,0 +1,112 @@
+"""Request coalescing ("single-flight") utilities.
+
+When many clients ask for the same resource at the same time (e.g. hundreds of
+clients reconnecting to the same collaboration room and all fetching the
+document content), each of them would otherwise trigger its own identical call
+to the object storage. These helpers let concurrent callers sharing the same
+key wait for a single "leader" call and reuse its result:
+
+- ``SingleFlight`` coalesces calls made by threads of the **same process**;
+- ``cache_single_flight`` coalesces calls made by **different workers** using a
+  short lock in the shared cache (Redis in production): followers wait for the
+  leader to publish its result in the cache instead of stampeding the backend.
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+
+from django.core.cache import cache
+
+
+class SingleFlight:
+    """Coalesce concurrent calls sharing the same key into a single execution."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        """
+        Call ``func`` unless a call for the same key is already in flight, in which
+        case wait for it and return its result (or raise its exception).
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            result = func()
+        except Exception as err:
+            future.set_exception(err)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            # Forget the call as soon as it is resolved: later callers must get
+            # fresh data, only concurrent ones share the result.
+            with self._lock:
+                del self._calls[key]
+
+        return result
+
+
+# pylint: disable=too-many-arguments
+def cache_single_flight(  # noqa: PLR0913
+    key,
+    func,
+    *,
+    lock_timeout,
+    wait_timeout,
+    result_timeout,
+    should_share=None,
+    poll_interval=0.05,
+):
+    """
+    Coalesce calls made by several workers for the same key through the cache.
+
+    The first caller acquires a short lock (atomic `add`), calls ``func`` and stores
+    its result in the cache under ``key`` for ``result_timeout`` seconds. Other
+    callers poll the cache for this result during at most ``wait_timeout`` seconds
+    and fall back to calling ``func`` themselves if the leader does not publish it
+    in time (leader crashed, result not shareable, etc.).
+
+    Args:
+        key (str): cache key under which the result is shared.
+        func (callable): function computing the result. It must not return None.
+        lock_timeout (int): maximum time the leader holds the lock (in seconds).
+        wait_timeout (float): maximum time a follower waits for the leader.
+        result_timeout (int): how long the result is shared (in seconds).
+        should_share (callable, optional): predicate telling if a result can be
+            stored in the cache (e.g. to avoid storing large payloads).
+        poll_interval (float): delay between two polls of a follower.
+    """
+    if (result := cache.get(key)) is not None:
+        return result
+
+    lock_key = f"{key:s}:lock"
+    if cache.add(lock_key, 1, timeout=lock_timeout):
+        try:
+            result = func()
+            if should_share is None or should_share(result):
+                cache.set(key, result, result_timeout)
+            return result
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + wait_timeout
+    while time.monotonic() < deadline:
+        time.sleep(poll_interval)
+        if (result := cache.get(key)) is not None:
+            return result
+        if not cache.has_key(lock_key):
+            # The leader is done but did not share its result
+            break
+
+    return func()
@@ -1,30 +1,226 @@
 """Yjs document conversion utilities."""
 
 import base64
+import functools
+import hashlib
+import logging
+import multiprocessing
 import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
+from django.conf import settings
+
+import configurations
 import pycrdt
-from bs4 import BeautifulSoup
+from lxml import etree
 
 from core import enums
 
+logger = logging.getLogger(__name__)
 
-def base64_yjs_to_xml(base64_string):
-    """Extract xml from base64 yjs document."""
+# Attachment urls are stored as attributes of blocks (or marks), and Yjs encodes
+# attribute values whole, as UTF-8 strings: they can be found in an update without
+# decoding it.
+MEDIA_STORAGE_URL_EXTRACT_BYTES = re.compile(
+    enums.MEDIA_STORAGE_URL_EXTRACT.pattern.encode("utf-8")
+)
+# Urls written in a text may be split between several items of an update: these
+# parts of the urls appearing more often than whole urls reveal most of them.
+MEDIA_STORAGE_URL_PARTS_BYTES = (
+    settings.MEDIA_URL.encode("utf-8"),
+    f"/{enums.ATTACHMENTS_FOLDER:s}/".encode("utf-8"),
+)
+
+# Size of the pieces of XML fed at once to the streaming parser
+XML_PARSING_CHUNK_SIZE = 64 * 1024
+
+_WORKER_POOL = None
+_WORKER_POOL_LOCK = threading.Lock()
+
+
+_MISSING = object()
+
+
+class ParsedYjsCache:
+    """
+    Process-wide memo of what is derived from yjs documents (XML, plain text,
+    attachments), so that the same content is not decoded again by each code path
+    handling it during a request or by successive tasks of a worker.
+
+    Entries are keyed by the MD5 of the base64 payload: an unchanged content hits
+    the memo whatever document or version it comes from. The total length of the
+    derived values is bounded by the YJS_PARSED_CACHE_MAX_SIZE setting, least
+    recently used contents being evicted first.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_key(base64_string):
+        """Return the key of a base64 content in the memo."""
+        return hashlib.md5(
+            base64_string.encode("utf-8"), usedforsecurity=False
+        ).hexdigest()
+
+    @staticmethod
+    def _get_value_size(value):
+        if isinstance(value, str):
+            return len(value)
+        return sum(len(item) for item in value)
+
+    def peek(self, key, name, default=None):
+        """Return the value `name` derived from the content of this key, if known."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or name not in entry:
+                return default
+            self._entries.move_to_end(key)
+            return entry[name]
+
+    def set(self, key, name, value):
+        """Remember the value `name` derived from the content of this key."""
+        max_size = settings.YJS_PARSED_CACHE_MAX_SIZE
+        value_size = self._get_value_size(value)
+        if value_size > max_size:
+            return
+
+        with self._lock:
+            entry = self._entries.setdefault(key, {})
+            self._entries.move_to_end(key)
+            if name not in entry:
+                entry[name] = value
+                self._size += value_size
+
+            while self._size > max_size:
+                _key, evicted = self._entries.popitem(last=False)
+                self._size -= sum(map(self._get_value_size, evicted.values()))
 
-    decoded_bytes = base64.b64decode(base64_string)
+    def get(self, key, name, compute):
+        """
+        Return the value `name` derived from the content of this key, calling
+        `compute` to derive it if it is not in the memo yet.
+        """
+        value = self.peek(key, name, default=_MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, name, value)
+        return value
 
+    def clear(self):
+        """Forget all the entries."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+parsed_yjs_cache = ParsedYjsCache()
+
+
+def yjs_to_xml(decoded_bytes):
+    """Extract xml from a binary yjs document."""
     doc = pycrdt.Doc()
     doc.apply_update(decoded_bytes)
     return str(doc.get("document-store", type=pycrdt.XmlFragment))
 
 
+def base64_yjs_to_xml(base64_string):
+    """Extract xml from base64 yjs document."""
+    return _get_xml(parsed_yjs_cache.get_key(base64_string), base64_string)
+
+
+def _get_xml(key, base64_string):
+    return parsed_yjs_cache.get(
+        key, "xml", lambda: yjs_to_xml(base64.b64decode(base64_string))
+    )
+
+
+class _TextRunsTarget:
+    """
+    Target of an lxml parser collecting the text nodes of an XML document in
+    document order, without building any tree.
+    """
+
+    def __init__(self):
+        self.runs = []
+        self._chunks = []
+
+    def _flush(self):
+        # lxml may split a text node in several "data" calls
+        if self._chunks:
+            self.runs.append("".join(self._chunks))
+            self._chunks = []
+
+    def start(self, _tag, _attributes):
+        """A tag opens: the current text node is complete."""
+        self._flush()
+
+    def end(self, _tag):
+        """A tag closes: the current text node is complete."""
+        self._flush()
+
+    def data(self, data):
+        """Receive a piece of a text node."""
+        self._chunks.append(data)
+
+    def close(self):
+        """End of the document."""
+        self._flush()
+
+    def pop_runs(self):
+        """Return and forget the text nodes collected so far."""
+        runs, self.runs = self.runs, []
+        return runs
+
+
+def iter_xml_text(xml_content):
+    """
+    Yield the text nodes of an XML fragment, in document order.
+
+    The fragment is fed in chunks to a streaming lxml parser whose target only
+    collects text: no tree or soup is built and text nodes are yielded as the
+    parsing goes.
+    """
+    target = _TextRunsTarget()
+    # Recover from malformed XML like BeautifulSoup did before
+    parser = etree.XMLParser(target=target, recover=True)
+    # A fragment may have several root nodes
+    parser.feed("<root>")
+    for i in range(0, len(xml_content), XML_PARSING_CHUNK_SIZE):
+        parser.feed(xml_content[i : i + XML_PARSING_CHUNK_SIZE])
+        yield from target.pop_runs()
+    parser.feed("</root>")
+    parser.close()
+    yield from target.pop_runs()
+
+
+def xml_to_text(xml_content):
+    """Extract the text of an XML fragment, text nodes being separated by a space."""
+    runs = (run.strip() for run in iter_xml_text(xml_content))
+    return " ".join(run for run in runs if run)
+
+
 def base64_yjs_to_text(base64_string):
     """Extract text from base64 yjs document."""
+    key = parsed_yjs_cache.get_key(base64_string)
+    return parsed_yjs_cache.get(
+        key, "text", lambda: xml_to_text(_get_xml(key, base64_string))
+    )
 
-    blocknote_structure = base64_yjs_to_xml(base64_string)
-    soup = BeautifulSoup(blocknote_structure, "lxml-xml")
-    return soup.get_text(separator=" ", strip=True)
+
+def _extract_attachments_tuple(content):
+    key = parsed_yjs_cache.get_key(content)
+    return parsed_yjs_cache.get(
+        key,
+        "attachments",
+        lambda: tuple(
+            re.findall(enums.MEDIA_STORAGE_URL_EXTRACT, _get_xml(key, content))
+        ),
+    )
 
 
 def extract_attachments(content):
@@ -32,5 +228,141 @@ def extract_attachments(content):
     if not content:
         return []
 
-    xml_content = base64_yjs_to_xml(content)
-    return re.findall(enums.MEDIA_STORAGE_URL_EXTRACT, xml_content)
+    return list(_extract_attachments_tuple(content))
+
+
+def extract_new_attachments(content, existing_attachments):
+    """
+    Return the media paths of a document's content that are not in the existing
+    attachments. Raises ValueError if the content is not a valid Yjs update.
+
+    The decoded update is first scanned for media urls at the byte level. When it
+    references no attachment missing from the existing ones, which is the case of
+    most content updates, the update is only parsed to be validated and the
+    document is not materialized.
+
+    A url written in a text may be split between several items of the update. The
+    document is then materialized as soon as the media url prefix or the folder of
+    attachments appears outside of whole urls. A url split both in its prefix and
+    in its folder is only found when the document is materialized for another url.
+    """
+    decoded_bytes = base64.b64decode(content)
+    keys = MEDIA_STORAGE_URL_EXTRACT_BYTES.findall(decoded_bytes)
+    candidates = {key.decode("utf-8") for key in keys}
+    is_split = any(
+        decoded_bytes.count(part) > len(keys) for part in MEDIA_STORAGE_URL_PARTS_BYTES
+    )
+    if not is_split and candidates <= set(existing_attachments):
+        pycrdt.get_state(decoded_bytes)
+        return set()
+
+    return set(extract_attachments(content)) - set(existing_attachments)
+
+
+def get_yjs_worker_pool():
+    """
+    Return the pool of processes decoding yjs documents, or None if it is disabled
+    (see the YJS_WORKER_POOL_SIZE setting) or can not be used in this process.
+    """
+    global _WORKER_POOL  # noqa: PLW0603  # pylint: disable=global-statement
+
+    # Daemonic processes, like the ones of celery's prefork pool, can not have
+    # children: documents are then decoded inline.
+    if not settings.YJS_WORKER_POOL_SIZE or multiprocessing.current_process().daemon:
+        return None
+
+    with _WORKER_POOL_LOCK:
+        if _WORKER_POOL is None:
+            _WORKER_POOL = ProcessPoolExecutor(
+                max_workers=settings.YJS_WORKER_POOL_SIZE,
+                # Spawn workers instead of forking a possibly multi-threaded server.
+                # They set Django up before decoding their first document.
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=configurations.setup,
+            )
+    return _WORKER_POOL
+
+
+def shutdown_yjs_worker_pool():
+    """Stop the processes of the pool, if any. It is started again on demand."""
+    global _WORKER_POOL  # noqa: PLW0603  # pylint: disable=global-statement
+
+    with _WORKER_POOL_LOCK:
+        if _WORKER_POOL is not None:
+            _WORKER_POOL.shutdown()
+            _WORKER_POOL = None
+
+
+def _try_derive(func, content):
+    """
+    Call `func` on a content, returning the error instead of raising it so that
+    one invalid content does not fail the derivation of a whole batch.
+    """
+    try:
+        return func(content), None
+    except Exception as err:  # noqa: BLE001  # pylint: disable=broad-exception-caught
+        return None, repr(err)
+
+
+def _derive_many(name, func, contents, empty):
+    """
+    Derive a value from each content with `func`, in the worker pool if it is
+    enabled. Values already memoized are not derived again and the values
+    derived are memoized in this process. Contents that can't be derived are
+    logged and get the `empty` value.
+    """
+    results = [empty] * len(contents)
+    indexes_by_key = {}
+    contents_by_key = {}
+    for i, content in enumerate(contents):
+        if not content:
+            continue
+        key = parsed_yjs_cache.get_key(content)
+        value = parsed_yjs_cache.peek(key, name, default=_MISSING)
+        if value is _MISSING:
+            indexes_by_key.setdefault(key, []).append(i)
+            contents_by_key[key] = content
+        else:
+            results[i] = value
+
+    if not contents_by_key:
+        return results
+
+    try_func = functools.partial(_try_derive, func)
+    pool = get_yjs_worker_pool()
+    if pool is None:
+        values = map(try_func, contents_by_key.values())
+    else:
+        chunksize = len(contents_by_key) // (4 * settings.YJS_WORKER_POOL_SIZE)
+        values = pool.map(
+            try_func, contents_by_key.values(), chunksize=max(1, chunksize)
+        )
+
+    for key, (value, error) in zip(contents_by_key, values, strict=True):
+        if error is not None:
+            logger.warning("Could not derive %s from a yjs document: %s", name, error)
+            continue
+        parsed_yjs_cache.set(key, name, value)
+        for i in indexes_by_key[key]:
+            results[i] = value
+    return results
+
+
+def base64_yjs_to_xml_many(contents):
+    """Extract the xml of several base64 yjs documents ("" for empty contents)."""
+    return _derive_many("xml", base64_yjs_to_xml, contents, "")
+
+
+def base64_yjs_to_text_many(contents):
+    """Extract the text of several base64 yjs documents ("" for empty contents)."""
+    return _derive_many("text", base64_yjs_to_text, contents, "")
+
+
+def extract_attachments_many(contents):
+    """Extract the media paths of several documents' contents."""
+    return [
+        list(attachments)
+        for attachments in _derive_many(
+            "attachments", _extract_attachments_tuple, contents, ()
+        )
+    ]
@@ -119,14 +119,43 @@ class Base(Configuration):
         environ_prefix=None,
     )
     SEARCH_INDEXER_BATCH_SIZE = values.IntegerValue(
-        default=100_000, environ_name="SEARCH_INDEXER_BATCH_SIZE", environ_prefix=None
+        default=1000, environ_name="SEARCH_INDEXER_BATCH_SIZE", environ_prefix=None
+    )
+    SEARCH_INDEXER_PUSH_MAX_SIZE = values.PositiveIntegerValue(
+        default=10 * MB,
+        environ_name="SEARCH_INDEXER_PUSH_MAX_SIZE",
+        environ_prefix=None,
+    )
+    SEARCH_INDEXER_CONTENT_WORKERS = values.PositiveIntegerValue(
+        default=8, environ_name="SEARCH_INDEXER_CONTENT_WORKERS", environ_prefix=None
+    )
+    SEARCH_INDEXER_PUSH_WORKERS = values.PositiveIntegerValue(
+        default=1, environ_name="SEARCH_INDEXER_PUSH_WORKERS", environ_prefix=None
+    )
+    SEARCH_INDEXER_PIPELINE_DEPTH = values.PositiveIntegerValue(
+        default=2, environ_name="SEARCH_INDEXER_PIPELINE_DEPTH", environ_prefix=None
+    )
+    SEARCH_INDEXER_PUSH_RETRIES = values.PositiveIntegerValue(
+        default=3, environ_name="SEARCH_INDEXER_PUSH_RETRIES", environ_prefix=None
+    )
+    SEARCH_INDEXER_PUSH_COMPRESS = values.BooleanValue(
+        default=False, environ_name="SEARCH_INDEXER_PUSH_COMPRESS", environ_prefix=None
     )
     INDEXING_URL = values.Value(
         default=None, environ_name="INDEXING_URL", environ_prefix=None
     )
+    INDEXING_DELETE_URL = values.Value(
+        default=None, environ_name="INDEXING_DELETE_URL", environ_prefix=None
+    )
     SEARCH_INDEXER_COUNTDOWN = values.IntegerValue(
         default=1, environ_name="SEARCH_INDEXER_COUNTDOWN", environ_prefix=None
     )
+    SEARCH_INDEXER_DRAIN_INTERVAL = values.PositiveIntegerValue(
+        default=60, environ_name="SEARCH_INDEXER_DRAIN_INTERVAL", environ_prefix=None
+    )
+    SEARCH_INDEXER_CLAIM_TIMEOUT = values.PositiveIntegerValue(
+        default=600, environ_name="SEARCH_INDEXER_CLAIM_TIMEOUT", environ_prefix=None
+    )
     SEARCH_INDEXER_SECRET = values.Value(
         default=None, environ_name="SEARCH_INDEXER_SECRET", environ_prefix=None
     )
@@ -136,12 +165,62 @@ class Base(Configuration):
     SEARCH_INDEXER_QUERY_LIMIT = values.PositiveIntegerValue(
         default=50, environ_name="SEARCH_INDEXER_QUERY_LIMIT", environ_prefix=None
     )
+    SEARCH_INDEXER_VISITED_CACHE_TIMEOUT = values.PositiveIntegerValue(
+        default=60 * 60,
+        environ_name="SEARCH_INDEXER_VISITED_CACHE_TIMEOUT",
+        environ_prefix=None,
+    )
+    TYPEAHEAD_MAX_RESULTS = values.PositiveIntegerValue(
+        default=10, environ_name="TYPEAHEAD_MAX_RESULTS", environ_prefix=None
+    )
+    TYPEAHEAD_MAX_CANDIDATES = values.PositiveIntegerValue(
+        default=5000, environ_name="TYPEAHEAD_MAX_CANDIDATES", environ_prefix=None
+    )
+    TYPEAHEAD_CACHE_TIMEOUT = values.PositiveIntegerValue(
+        default=60 * 10, environ_name="TYPEAHEAD_CACHE_TIMEOUT", environ_prefix=None
+    )
+    TYPEAHEAD_REFRESH_INTERVAL = values.PositiveIntegerValue(
+        default=5, environ_name="TYPEAHEAD_REFRESH_INTERVAL", environ_prefix=None
+    )
+    TYPEAHEAD_QUERY_TIMEOUT = values.PositiveIntegerValue(
+        default=200, environ_name="TYPEAHEAD_QUERY_TIMEOUT", environ_prefix=None
+    )
 
     MEDIA_AUTH_ORIGINAL_URL_HEADER = values.Value(
         default="HTTP_X_ORIGINAL_URL",
         environ_name="MEDIA_AUTH_ORIGINAL_URL_HEADER",
         environ_prefix=None,
     )
+    MEDIA_AUTH_DECISION_CACHE_TIMEOUT = values.IntegerValue(
+        60,
+        environ_name="MEDIA_AUTH_DECISION_CACHE_TIMEOUT",
+        environ_prefix=None,
+    )
+    MEDIA_AUTH_READY_CACHE_TIMEOUT = values.IntegerValue(
+        60 * 60 * 24,
+        environ_name="MEDIA_AUTH_READY_CACHE_TIMEOUT",
+        environ_prefix=None,
+    )
+    YJS_PARSED_CACHE_MAX_SIZE = values.PositiveIntegerValue(
+        32 * MB,
+        environ_name="YJS_PARSED_CACHE_MAX_SIZE",
+        environ_prefix=None,
+    )
+    YJS_WORKER_POOL_SIZE = values.PositiveIntegerValue(
+        0,
+        environ_name="YJS_WORKER_POOL_SIZE",
+        environ_prefix=None,
+    )
+    MEDIA_CHECK_BATCH_MAX_KEYS = values.PositiveIntegerValue(
+        200,
+        environ_name="MEDIA_CHECK_BATCH_MAX_KEYS",
+        environ_prefix=None,
+    )
+    ATTACHMENT_STATUS_MAX_WORKERS = values.PositiveIntegerValue(
+        8,
+        environ_name="ATTACHMENT_STATUS_MAX_WORKERS",
+        environ_prefix=None,
+    )
 
     # Static files (CSS, JavaScript, Images)
     STATIC_URL = "/static/"
@@ -179,6 +258,9 @@ class Base(Configuration):
     AWS_S3_ENDPOINT_URL = values.Value(
         environ_name="AWS_S3_ENDPOINT_URL", environ_prefix=None
     )
+    AWS_S3_PUBLIC_ENDPOINT_URL = values.Value(
+        None, environ_name="AWS_S3_PUBLIC_ENDPOINT_URL", environ_prefix=None
+    )
     AWS_S3_ACCESS_KEY_ID = SecretFileValue(
         environ_name="AWS_S3_ACCESS_KEY_ID", environ_prefix=None
     )
@@ -212,6 +294,17 @@ class Base(Configuration):
         environ_prefix=None,
     )
 
+    DOCUMENT_ATTACHMENT_UPLOAD_PART_SIZE = values.IntegerValue(
+        8 * MB,  # 8MB, parts must be at least 5MB except the last one
+        environ_name="DOCUMENT_ATTACHMENT_UPLOAD_PART_SIZE",
+        environ_prefix=None,
+    )
+    DOCUMENT_ATTACHMENT_UPLOAD_EXPIRATION = values.IntegerValue(
+        60 * 60,
+        environ_name="DOCUMENT_ATTACHMENT_UPLOAD_EXPIRATION",
+        environ_prefix=None,
+    )
+
     DOCUMENT_UNSAFE_MIME_TYPES = [
         # Executable Files
         "application/x-msdownload",
@@ -287,6 +380,31 @@ class Base(Configuration):
     )
     # Document versions
     DOCUMENT_VERSIONS_PAGE_SIZE = 50
+    DOCUMENT_VERSIONS_CATALOGUE_ENABLED = values.BooleanValue(
+        False,
+        environ_name="DOCUMENT_VERSIONS_CATALOGUE_ENABLED",
+        environ_prefix=None,
+    )
+    DOCUMENT_VERSIONS_MIN_DATETIME_CACHE_TIMEOUT = values.IntegerValue(
+        60 * 5,
+        environ_name="DOCUMENT_VERSIONS_MIN_DATETIME_CACHE_TIMEOUT",
+        environ_prefix=None,
+    )
+    DOCUMENT_VERSIONS_RETENTION_KEEP_ALL_HOURS = values.IntegerValue(
+        24,
+        environ_name="DOCUMENT_VERSIONS_RETENTION_KEEP_ALL_HOURS",
+        environ_prefix=None,
+    )
+    DOCUMENT_VERSIONS_RETENTION_HOURLY_DAYS = values.IntegerValue(
+        7,
+        environ_name="DOCUMENT_VERSIONS_RETENTION_HOURLY_DAYS",
+        environ_prefix=None,
+    )
+    DOCUMENT_VERSIONS_RETENTION_BATCH_SIZE = values.IntegerValue(
+        100,
+        environ_name="DOCUMENT_VERSIONS_RETENTION_BATCH_SIZE",
+        environ_prefix=None,
+    )
 
     # Document /all endpoint
     DOCUMENT_ALL_ENDPOINT_ENABLED = values.BooleanValue(
@@ -1119,6 +1237,20 @@ class Base(Configuration):
     CONTENT_METADATA_CACHE_TIMEOUT = values.IntegerValue(
         60 * 60 * 24, environ_name="CONTENT_METADATA_CACHE_TIMEOUT", environ_prefix=None
     )
+    CONTENT_SINGLE_FLIGHT_ENABLED = values.BooleanValue(
+        True, environ_name="CONTENT_SINGLE_FLIGHT_ENABLED", environ_prefix=None
+    )
+    CONTENT_SINGLE_FLIGHT_TIMEOUT = values.IntegerValue(
+        5, environ_name="CONTENT_SINGLE_FLIGHT_TIMEOUT", environ_prefix=None
+    )
+    CONTENT_SINGLE_FLIGHT_RESULT_TIMEOUT = values.IntegerValue(
+        2, environ_name="CONTENT_SINGLE_FLIGHT_RESULT_TIMEOUT", environ_prefix=None
+    )
+    CONTENT_SINGLE_FLIGHT_MAX_SIZE = values.IntegerValue(
+        5 * 1024 * 1024,
+        environ_name="CONTENT_SINGLE_FLIGHT_MAX_SIZE",
+        environ_prefix=None,
+    )
 
     TREEBEARD_PATH_COMPUTE_RETRY_MAX_ATTEMPTS = values.IntegerValue(
         10,
@@ -1189,6 +1321,19 @@ class Base(Configuration):
         return get_release()
 
     # pylint: disable=invalid-name
+    @property
+    def CELERY_BEAT_SCHEDULE(self):
+        """
+        Periodic tasks, run by a celery beat scheduler. Documents queued for
+        indexation are drained even if the task scheduling the next one was lost.
+        """
+        return {
+            "index-dirty-documents": {
+                "task": "core.tasks.search.dirty_documents_indexer_task",
+                "schedule": self.SEARCH_INDEXER_DRAIN_INTERVAL,
+            },
+        }
+
     @property
     def PARLER_LANGUAGES(self):
         """